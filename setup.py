@@ -19,7 +19,13 @@ setup(
         'dev': [
             'ipdb',
             'pylint',
-            'nose'
+            'nose',
+            'pyftpdlib',
+            'pyopenssl',
+            'asyncssh'
+        ],
+        'asyncio': [
+            'asyncssh'
         ],
         'test': [
             'paramiko==2.6.0'
@@ -28,6 +34,7 @@ setup(
     entry_points="""
     [console_scripts]
     tap-sftp=tap_sftp:main
+    tap-sftp-merge-states=tap_sftp.sharding:main
     """,
     packages=["tap_sftp"],
     package_data = {
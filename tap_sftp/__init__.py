@@ -6,15 +6,24 @@ from singer import metadata
 from singer import utils
 from singer_encodings.utils import is_valid_encoding
 from tap_sftp.discover import discover_streams
+from tap_sftp.profiling import log_profile_summaries, profile_stream
 from tap_sftp.sync import sync_stream
+from tap_sftp import budget
+from tap_sftp import hosts
+from tap_sftp import memory
+from tap_sftp import report
+from tap_sftp import sharding
+from tap_sftp import stats
 from tap_sftp.stats import STATS
 
-REQUIRED_CONFIG_KEYS = ["username", "port", "private_key_file", "host"]
+# the config keys of the backend of the "protocol" are checked by 'client.connection'
+REQUIRED_CONFIG_KEYS = []
 LOGGER = singer.get_logger()
 DEFAULT_ENCODING_FORMAT = "utf-8"
 
 def do_discover(config):
     LOGGER.info("Starting discover")
+    hosts.configure(config)
     # validate the encoding format
     encoding_format = config.get("encoding_format") or DEFAULT_ENCODING_FORMAT
     if not is_valid_encoding(encoding_format):
@@ -24,13 +33,26 @@ def do_discover(config):
         raise Exception("No streams found")
     catalog = {"streams": streams}
     json.dump(catalog, sys.stdout, indent=2)
+    hosts.log_wait_summary()
+    log_profile_summaries()
     LOGGER.info("Finished discover")
 
+def format_metric(value):
+    # timings are summarized in milliseconds precision
+    return round(value, 3) if isinstance(value, float) else value
+
 def stream_is_selected(mdata):
     return mdata.get((), {}).get('selected', False)
 
 def do_sync(config, catalog, state):
     LOGGER.info('Starting sync.')
+    stats.configure(config)
+    budget.start_run(config)
+    hosts.configure(config)
+    shard = sharding.get_shard(config)
+    if shard is not None:
+        LOGGER.info('Syncing shard %s of the files', shard)
+    report.start_run(config, 'sync')
 
     for stream in catalog.streams:
         stream_name = stream.tap_stream_id
@@ -38,6 +60,7 @@ def do_sync(config, catalog, state):
 
         if not stream_is_selected(mdata):
             LOGGER.info("%s: Skipping - not selected", stream_name)
+            report.write_event('stream_skipped', stream=stream_name, reason='not selected')
             continue
 
         singer.write_state(state)
@@ -45,7 +68,8 @@ def do_sync(config, catalog, state):
         singer.write_schema(stream_name, stream.schema.to_dict(), key_properties)
 
         LOGGER.info("%s: Starting sync", stream_name)
-        counter_value = sync_stream(config, state, stream)
+        with profile_stream(config, 'sync', stream_name):
+            counter_value = sync_stream(config, state, stream)
         LOGGER.info("%s: Completed sync (%s rows)", stream_name, counter_value)
 
     headers = [['table_name',
@@ -53,7 +77,7 @@ def do_sync(config, catalog, state):
                 'search pattern',
                 'file path',
                 'row count',
-                'last_modified']]
+                'last_modified'] + stats.FILE_METRICS]
 
     rows = []
 
@@ -66,12 +90,50 @@ def do_sync(config, catalog, state):
                          table_data['search_pattern'],
                          filepath,
                          file_data['row_count'],
-                         file_data['last_modified']])
+                         file_data['last_modified']] +
+                        [format_metric(file_data.get(key)) for key in stats.FILE_METRICS])
 
     LOGGER.info("\n**** Sync Summary:")
+    if stats.MODE == stats.AGGREGATE_MODE:
+        LOGGER.info("Only the %s slowest, largest and highest memory files of each table are listed",
+                    stats.TOP_FILE_COUNT)
     LOGGER.info(next(iter(headers), None))
     for row in rows:
         LOGGER.info(row)
+
+    table_headers = ['table_name', 'listing_time', 'file_count', 'row count'] + stats.FILE_METRICS
+    LOGGER.info("\n**** Table Summary:")
+    LOGGER.info(table_headers)
+    for table_name, table_data in STATS.items():
+        totals = stats.get_table_totals(table_data)
+        LOGGER.info([table_name,
+                     format_metric(table_data['listing_time']),
+                     totals['file_count'],
+                     totals['row_count']] +
+                    [format_metric(totals[key]) for key in stats.FILE_METRICS])
+
+    memory_files = [(filepath, file_data) for table_data in STATS.values()
+                    for filepath, file_data in table_data['files'].items()
+                    if file_data.get('peak_traced_memory') is not None]
+    if memory_files:
+        LOGGER.info("\n**** Memory Summary:")
+        # files with the highest peaks first
+        memory_files = sorted(memory_files, key=lambda a: a[1]['peak_traced_memory'], reverse=True)
+        for filepath, file_data in memory_files[:memory.SUMMARY_FILE_COUNT]:
+            memory.log_memory_summary(filepath, file_data)
+    backlogs = [(table_name, table_data['backlog']) for table_name, table_data in STATS.items()
+                if table_data.get('backlog')]
+    if backlogs:
+        LOGGER.info("\n**** Backlog Summary:")
+        LOGGER.info(['table_name', 'file_count', 'bytes', 'reason'])
+        for table_name, backlog in backlogs:
+            LOGGER.info([table_name, backlog['file_count'], backlog['bytes'], backlog['reason']])
+    hosts.log_wait_summary()
+    log_profile_summaries()
+    report.end_run(streams={table_name: {'listing_time': table_data['listing_time'],
+                                         'backlog': table_data.get('backlog'),
+                                         **stats.get_table_totals(table_data)}
+                            for table_name, table_data in STATS.items()})
     LOGGER.info('Done syncing.')
 
 @singer.utils.handle_top_exception(LOGGER)
@@ -0,0 +1,338 @@
+"""
+SFTP connection running on asyncssh, selected with "sftp_engine": "asyncio".
+
+paramiko waits for the reply of every request before sending the next one. Here an event
+loop in a background thread keeps many listing and read requests in flight on a single
+SSH connection, and the synchronous sync loop consumes the results through bounded queues.
+"""
+import asyncio
+import concurrent.futures
+import os
+import socket
+import stat
+import threading
+import time
+import backoff
+import singer
+from tap_sftp import client
+from tap_sftp import hosts
+from tap_sftp.concurrency import AdaptiveSemaphore, ConcurrencyController
+from tap_sftp.helper import get_number_config
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+LOGGER = singer.get_logger()
+
+# directories listed at the same time, adapted between the two to the throughput of the server
+DEFAULT_MIN_LISTING_REQUESTS = 4
+DEFAULT_MAX_LISTING_REQUESTS = 32
+# bytes asked for by every read of a file, split by asyncssh into parallel requests
+DEFAULT_READ_CHUNK_SIZE = 1024 * 1024
+# chunks read ahead of the sync loop for every open file
+DEFAULT_READ_AHEAD_CHUNKS = 4
+
+
+async def wait_for(awaitable):
+    # asyncssh returns awaitables which are not coroutines, such as the result of 'open'
+    return await awaitable
+
+
+async def gather_or_cancel(coroutines):
+    """
+    Returns the results of 'coroutines' run concurrently. When one of them fails, or the
+    caller is cancelled, the ones still running are cancelled and awaited before returning.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    if not tasks:
+        return []
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+    for task in tasks:
+        # the error of the one which failed, not the cancellation of the others
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+class AsyncFileHandle():
+    """
+    Binary file object over the chunks read from a remote file by a coroutine of the event
+    loop, which waits while 'read_ahead' chunks are not consumed yet.
+    """
+
+    def __init__(self, connection, remote_file, chunk_size, read_ahead):
+        self.connection = connection
+        self.buffer = bytearray()
+        self.eof = False
+        self.closed = False
+        self.chunks = connection.run(self.make_queue(read_ahead))
+        self.reader = asyncio.run_coroutine_threadsafe(self.read_chunks(remote_file, chunk_size), connection.loop)
+
+    async def make_queue(self, read_ahead):
+        # created on the loop it is used from
+        return asyncio.Queue(maxsize=read_ahead)
+
+    async def read_chunks(self, remote_file, chunk_size):
+        try:
+            while True:
+                chunk = await remote_file.read(chunk_size)
+                await self.chunks.put(chunk)
+                if not chunk:
+                    break
+        except Exception as e: # pylint: disable=broad-except
+            await self.chunks.put(e)
+        finally:
+            await remote_file.close()
+
+    def fill_buffer(self):
+        """ Appends the next chunk to the buffer, returns False at the end of the file. """
+        if self.eof:
+            return False
+        chunk = self.connection.run(self.chunks.get())
+        if isinstance(chunk, Exception):
+            self.eof = True
+            raise chunk
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self.fill_buffer():
+                pass
+            size = len(self.buffer)
+        else:
+            while len(self.buffer) < size and self.fill_buffer():
+                pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        searched = 0
+        while True:
+            end = self.buffer.find(b'\n', searched)
+            if end >= 0:
+                end += 1
+                break
+            searched = len(self.buffer)
+            if 0 <= size <= searched or not self.fill_buffer():
+                end = len(self.buffer)
+                break
+        if 0 <= size < end:
+            end = size
+        line = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.reader.cancel()
+
+
+class AsyncSFTPConnection(client.Connection):
+    protocol = 'SFTP'
+    capabilities = frozenset([client.CONCURRENT_READS])
+
+    def __init__(self, host, username, password=None, private_key_file=None, port=None,
+                 timeout=client.REQUEST_TIMEOUT, min_listing_requests=DEFAULT_MIN_LISTING_REQUESTS,
+                 max_listing_requests=DEFAULT_MAX_LISTING_REQUESTS, read_chunk_size=DEFAULT_READ_CHUNK_SIZE, read_ahead_chunks=DEFAULT_READ_AHEAD_CHUNKS):
+        self.loop = None
+        self.ssh = None
+        self.sftp = None
+        if asyncssh is None:
+            raise Exception("The asyncio SFTP engine requires asyncssh, install it with 'pip install asyncssh'")
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = int(port or 22)
+        self.private_key_file = private_key_file and os.path.expanduser(private_key_file)
+        self.request_timeout = client.get_request_timeout(timeout)
+        # kept for the connection, so every listing starts from the limit the previous ones reached
+        self.listing_controller = ConcurrencyController('Listing', min_listing_requests, max_listing_requests)
+        self.read_chunk_size = read_chunk_size
+        self.read_ahead_chunks = read_ahead_chunks
+
+    def run(self, awaitable, timed_out=True):
+        """
+        Awaits 'awaitable' on the event loop and returns its result, raising socket.timeout when
+        it takes longer than a request, unless 'timed_out' is False.
+        """
+        future = asyncio.run_coroutine_threadsafe(wait_for(awaitable), self.loop)
+        try:
+            return future.result(self.request_timeout if timed_out else None)
+        except (concurrent.futures.TimeoutError, asyncio.TimeoutError) as e:
+            future.cancel()
+            raise socket.timeout("Timed out after {} seconds".format(self.request_timeout)) from e
+
+    def handle_backoff(details):
+        LOGGER.warn("SSH Connection closed unexpectedly. Waiting {wait} seconds and retrying...".format(**details))
+
+    @backoff.on_exception(backoff.expo,
+                          (EOFError, ConnectionError),
+                          max_tries=6,
+                          on_backoff=handle_backoff,
+                          jitter=None,
+                          factor=2)
+    def connect(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, name='sftp-event-loop', daemon=True).start()
+        # the SSH connection and its SFTP channel
+        hosts.acquire(hosts.SESSIONS, self.host, self.port)
+        hosts.acquire(hosts.CHANNELS, self.host, self.port)
+        try:
+            self.ssh, self.sftp = self.run(self.open_sftp_client())
+        except BaseException:
+            hosts.release(hosts.CHANNELS, self.host, self.port)
+            hosts.release(hosts.SESSIONS, self.host, self.port)
+            raise
+
+    async def open_sftp_client(self):
+        ssh = await asyncssh.connect(self.host,
+                                     self.port,
+                                     username=self.username,
+                                     password=self.password,
+                                     client_keys=[self.private_key_file] if self.private_key_file else (),
+                                     known_hosts=None)
+        return ssh, await ssh.start_sftp_client()
+
+    def get_sftp(self):
+        if self.sftp is None:
+            self.connect()
+        return self.sftp
+
+    def close(self):
+        if self.ssh is not None:
+            ssh, self.ssh, self.sftp = self.ssh, None, None
+            ssh.close()
+            self.run(ssh.wait_closed())
+            hosts.release(hosts.CHANNELS, self.host, self.port)
+            hosts.release(hosts.SESSIONS, self.host, self.port)
+        if self.loop is not None:
+            loop, self.loop = self.loop, None
+            loop.call_soon_threadsafe(loop.stop)
+
+    def __del__(self):
+        self.close()
+
+    async def list_directory(self, sftp, semaphore, prefix):
+        await semaphore.acquire()
+        started_at = time.perf_counter()
+        entries = None
+        cancelled = False
+        try:
+            entries = await asyncio.wait_for(sftp.readdir(prefix), self.request_timeout)
+        except asyncio.TimeoutError as e:
+            raise socket.timeout("Timed out listing '{}' after {} seconds".format(prefix, self.request_timeout)) from e
+        except asyncssh.SFTPNoSuchFile as e:
+            raise Exception("Directory '{}' does not exist".format(prefix)) from e
+        except asyncio.CancelledError:
+            # another directory failed, this one did not
+            cancelled = True
+            raise
+        finally:
+            await semaphore.release(None if cancelled else time.perf_counter() - started_at,
+                                    items=len(entries) if entries is not None else 0,
+                                    failed=entries is None)
+
+        files = []
+        sub_directories = []
+        for entry in entries:
+            if entry.filename in ('.', '..'):
+                continue
+            path = prefix + '/' + entry.filename
+            if entry.attrs.permissions is not None and stat.S_ISDIR(entry.attrs.permissions):
+                sub_directories.append(path)
+            elif entry.attrs.size:
+                last_modified = entry.attrs.mtime
+                if last_modified is None:
+                    LOGGER.warning("Cannot read m_time for file %s, defaulting to current epoch time", path)
+                    last_modified = time.time()
+                files.append(client.FileEntry(path, last_modified, entry.attrs.size))
+
+        # list the sub directories concurrently, as many at a time as the listing controller allows,
+        # and stop listing them when one fails, before the listing is retried
+        for sub_files in await gather_or_cancel(self.list_directory(sftp, semaphore, path) for path in sub_directories):
+            files += sub_files
+        return files
+
+    async def list_files(self, sftp, prefix):
+        semaphore = AdaptiveSemaphore(self.listing_controller)
+        return await self.list_directory(sftp, semaphore, prefix)
+
+    # backoff for 60 seconds as there is possibility the request will backoff again in 'discover.get_schema'
+    @backoff.on_exception(backoff.constant,
+                          (socket.timeout),
+                          max_time=60,
+                          interval=10,
+                          jitter=None)
+    def get_files_by_prefix(self, prefix):
+        """
+        Lists "prefix" and its sub directories, with the sub directories of every directory
+        listed concurrently. Every directory is listed within the request timeout, not the
+        whole listing.
+
+        Returns a list of filepaths from the root.
+        """
+        if prefix is None or prefix == '':
+            prefix = '.'
+        return self.run(self.list_files(self.get_sftp(), prefix), timed_out=False)
+
+    def stat(self, filepath):
+        try:
+            attrs = self.run(self.get_sftp().stat(filepath))
+        except asyncssh.SFTPNoSuchFile as e:
+            raise FileNotFoundError(str(e)) from e
+        last_modified = attrs.mtime
+        if last_modified is None:
+            last_modified = time.time()
+        return client.FileEntry(filepath, last_modified, attrs.size)
+
+    def open_file_handle(self, f):
+        """ Takes a file dict {"filepath": "...", "last_modified": "...", "size": ...}
+        -> returns a handle to the file, read ahead of the sync loop.
+        -> raises OSError with appropriate logger message """
+        try:
+            remote_file = self.run(self.get_sftp().open(f["filepath"], 'rb'))
+        except asyncssh.SFTPPermissionDenied as e:
+            LOGGER.warn("Skipping %s file because you do not have enough permissions.", f["filepath"])
+            raise PermissionError(str(e)) from e
+        except asyncssh.SFTPError as e:
+            LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
+            raise OSError(str(e)) from e
+
+        return AsyncFileHandle(self, remote_file, self.read_chunk_size, self.read_ahead_chunks)
+
+
+def get_async_sftp_connection(config):
+    return AsyncSFTPConnection(config['host'],
+                               config['username'],
+                               password=config.get('password'),
+                               private_key_file=config.get('private_key_file'),
+                               port=config.get('port'),
+                               timeout=config.get('request_timeout'),
+                               min_listing_requests=int(get_number_config(
+                                   config, 'sftp_min_listing_requests', DEFAULT_MIN_LISTING_REQUESTS)),
+                               max_listing_requests=int(get_number_config(
+                                   config, 'sftp_max_listing_requests', DEFAULT_MAX_LISTING_REQUESTS)),
+                               read_chunk_size=int(get_number_config(
+                                   config, 'sftp_read_chunk_size', DEFAULT_READ_CHUNK_SIZE)),
+                               read_ahead_chunks=int(get_number_config(
+                                   config, 'sftp_read_ahead_chunks', DEFAULT_READ_AHEAD_CHUNKS)))
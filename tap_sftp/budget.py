@@ -0,0 +1,57 @@
+import time
+import singer
+from tap_sftp.helper import get_number_config
+
+LOGGER = singer.get_logger()
+
+# limits read from the config for the whole run, and from the table config for one table
+LIMIT_KEYS = ['max_files', 'max_bytes', 'max_run_time']
+
+
+class Budget():
+    """
+    Files, bytes (on the wire) and seconds a sync may spend in one invocation, unlimited
+    when not set. Checked between files modified at different times, so the files being
+    synced are always finished and bookmarked before the sync stops, and the rest of the
+    files are left to the next run. The files modified at the time of the last synced one
+    are synced past the limits, the next run would skip them.
+    """
+
+    def __init__(self, name, max_files=None, max_bytes=None, max_run_time=None):
+        self.name = name
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_run_time = max_run_time
+        self.started_at = time.monotonic()
+        self.file_count = 0
+        self.byte_count = 0
+
+    @classmethod
+    def from_config(cls, name, config):
+        return cls(name, **{key: get_number_config(config, key, None) for key in LIMIT_KEYS})
+
+    def add_file(self, byte_count):
+        self.file_count += 1
+        self.byte_count += byte_count or 0
+
+    def get_exhausted_reason(self):
+        """ Returns which limit of the budget was reached, or None while files can still be synced. """
+        if self.max_files is not None and self.file_count >= self.max_files:
+            return '{} max_files of {:g} reached'.format(self.name, self.max_files)
+        if self.max_bytes is not None and self.byte_count >= self.max_bytes:
+            return '{} max_bytes of {:g} reached'.format(self.name, self.max_bytes)
+        if self.max_run_time is not None and time.monotonic() - self.started_at >= self.max_run_time:
+            return '{} max_run_time of {:g} seconds reached'.format(self.name, self.max_run_time)
+        return None
+
+
+# budget of the whole invocation, set by 'start_run' from the config
+RUN_BUDGET = Budget('run')
+
+
+def start_run(config):
+    global RUN_BUDGET
+    RUN_BUDGET = Budget.from_config('run', config)
+    limits = {key: getattr(RUN_BUDGET, key) for key in LIMIT_KEYS if getattr(RUN_BUDGET, key) is not None}
+    if limits:
+        LOGGER.info('Limiting the run to %s', limits)
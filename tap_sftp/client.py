@@ -1,10 +1,19 @@
+import calendar
+import collections
+import ftplib
 import io
+import mmap
 import os
+import shutil
 import socket
+import ssl
+import tempfile
+import threading
 import backoff
 import paramiko
 import pytz
 import re
+import shlex
 import singer
 import stat
 import time
@@ -12,31 +21,226 @@ import gzip
 import zipfile
 from datetime import datetime
 from paramiko.ssh_exception import AuthenticationException, SSHException
+from tap_sftp import hosts
+from tap_sftp import stats
+from tap_sftp.helper import get_boolean_config
+from tap_sftp.listing import FileEntry, FilePlan
 
 # set default timeout to 300 seconds
 REQUEST_TIMEOUT = 300
+# read FTP transfers 1 MB at a time
+FTP_READ_BUFFER_SIZE = 1024 * 1024
+# zip files streamed without a seekable handle are kept in memory up to 64 MB, then on disk
+SPOOLED_FILE_MAX_SIZE = 64 * 1024 * 1024
+# copy these zip files 1 MB at a time
+SPOOL_BUFFER_SIZE = 1024 * 1024
+# read local files 1 MB at a time
+LOCAL_READ_BUFFER_SIZE = 1024 * 1024
+# files logged by name when files are found, the others are only counted
+LOGGED_FILE_COUNT = 10
+# read the output of 'find' 64 KB at a time
+FIND_READ_SIZE = 64 * 1024
+# last lines of the errors of 'find' kept to be logged
+FIND_ERROR_LINES = 10
 
 LOGGER = singer.get_logger()
 
-class SFTPConnection():
-    def __init__(self, host, username, password=None, private_key_file=None, port=None, timeout=REQUEST_TIMEOUT):
+# errors of requests worth retrying, connections wrapping libraries with their own
+# timeout errors raise them as 'socket.timeout'
+TRANSIENT_ERRORS = (socket.timeout,)
+
+# capabilities of the connections
+# the file handles are seekable, otherwise zip files are spooled to a seekable file
+SEEKABLE_HANDLES = 'seekable_handles'
+# several files can be open for reading at the same time
+CONCURRENT_READS = 'concurrent_reads'
+
+def get_request_timeout(timeout):
+    if timeout and float(timeout):
+        # set the request timeout for the requests
+        # if value is 0,"0", "" or None then it will set default to default to 300.0 seconds if not passed in config.
+        return float(timeout)
+    # set the default timeout of 300 seconds
+    return REQUEST_TIMEOUT
+
+def handle_file_backoff(details):
+    f = details['kwargs']['f'] if 'f' in details['kwargs'] else details['args'][1]
+    stats.add_retry(f['filepath'])
+
+def spool_file(file_handle, buffer_size):
+    """ Copies a streamed file to a seekable temporary file, kept in memory up to 'SPOOLED_FILE_MAX_SIZE'. """
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=SPOOLED_FILE_MAX_SIZE)
+    shutil.copyfileobj(file_handle, spooled_file, buffer_size)
+    spooled_file.seek(0)
+    return spooled_file
+
+def parse_find_output(chunks):
+    """ Yields the file dicts of the '<size> <epoch mtime> <path>\\0' entries printed by 'find' in 'chunks'. """
+    pending = b''
+    for chunk in chunks:
+        entries = (pending + chunk).split(b'\0')
+        pending = entries.pop()
+        for entry in entries:
+            size, last_modified, filepath = entry.decode('utf-8', 'surrogateescape').split(' ', 2)
+            yield FileEntry(filepath, float(last_modified), int(size))
+
+def read_errors(stderr, errors):
+    """ Keeps the last lines of 'stderr' in 'errors' until it ends or times out. """
+    try:
+        for line in stderr:
+            errors.append(line)
+    except socket.timeout:
+        pass
+
+class Connection():
+    """
+    Storage backend the tap reads files from. A backend implements:
+
+    - 'get_files_by_prefix' or 'iter_files': the 'FileEntry' or file dicts {"filepath": "...", "last_modified": ..., "size": ...}
+      of the non empty files under a directory and its sub directories, 'iter_files' may leave out
+      files not modified since 'modified_since' or not matching 'search_pattern'
+    - 'stat': the file dict of a single file, raising FileNotFoundError when it does not exist
+    - 'get_file_handle': a binary file object opened for reading, raising OSError when it cannot be read,
+      or 'open_file_handle' for a backend without SEEKABLE_HANDLES: the zip files it opens are
+      then copied to a seekable file by 'get_file_handle', as they are read from their end
+    - 'close'
+
+    and lists what else it supports in 'capabilities'. Backends are created by 'connection'
+    from the "protocol" in the config, see 'register_backend'.
+    """
+    protocol = None
+    capabilities = frozenset()
+
+    def get_files_by_prefix(self, prefix):
+        raise NotImplementedError()
+
+    def iter_files(self, prefix, modified_since=None, search_pattern=None):
+        return iter(self.get_files_by_prefix(prefix))
+
+    def stat(self, filepath):
+        raise NotImplementedError()
+
+    def open_file_handle(self, f):
+        raise NotImplementedError()
+
+    # retry 5 times for timeout error
+    @backoff.on_exception(backoff.expo,
+                        (socket.timeout),
+                        max_tries=5,
+                        on_backoff=handle_file_backoff,
+                        factor=2)
+    def get_file_handle(self, f):
+        """ Takes a file dict {"filepath": "...", "last_modified": "...", "size": ...}
+        -> returns the handle of 'open_file_handle', zip files are downloaded to a spooled
+           temporary file when the handles are not seekable.
+        -> raises OSError with appropriate logger message """
+        file_handle = self.open_file_handle(f)
+        if SEEKABLE_HANDLES in self.capabilities or not f["filepath"].endswith('.zip'):
+            return file_handle
+
+        try:
+            return spool_file(file_handle, SPOOL_BUFFER_SIZE)
+        finally:
+            file_handle.close()
+
+    def close(self):
+        pass
+
+    def get_files(self, prefix, search_pattern, modified_since=None):
+        """ Returns the files of 'plan_files' as a list sorted in increasing order of "last_modified". """
+        return list(self.plan_files(prefix, search_pattern, modified_since))
+
+    # a timeout restarts the listing, backoff for 60 seconds as there is possibility the
+    # request will backoff again in 'discover.get_schema'
+    @backoff.on_exception(backoff.constant,
+                          TRANSIENT_ERRORS,
+                          max_time=60,
+                          interval=10,
+                          jitter=None)
+    def plan_files(self, prefix, search_pattern, modified_since=None, spill_threshold=None, spill_dir=None,
+                   shard=None):
+        """
+        Returns a 'FilePlan' of the files under "prefix" matching "search_pattern" and modified
+        since 'modified_since', and in 'shard' when the sync is sharded. The files are filtered
+        while they are listed, so only these candidates are kept, and past 'spill_threshold'
+        of them the plan spills to disk.
+        """
+        matcher = re.compile(search_pattern)
+        modified_since_time = modified_since.timestamp() if modified_since is not None else None
+        file_count = 0
+        matching_count = 0
+        shard_count = 0
+        plan = FilePlan(spill_threshold, spill_dir)
+        try:
+            for f in self.iter_files(prefix, modified_since, search_pattern):
+                file_count += 1
+                if not matcher.search(f["filepath"]):
+                    continue
+                matching_count += 1
+                # the files are summarized below, only the first ones are logged by name
+                if matching_count <= LOGGED_FILE_COUNT:
+                    LOGGER.info("Found file: %s", f['filepath'])
+                if shard is not None:
+                    if not shard.contains(f["filepath"]):
+                        continue
+                    shard_count += 1
+                if not isinstance(f, FileEntry):
+                    f = FileEntry.from_dict(f)
+                if modified_since_time is None or f.mtime > modified_since_time:
+                    plan.add(f)
+        except Exception:
+            plan.close()
+            raise
+
+        # 'iter_files' can leave out the files not modified since 'modified_since' and the ones not
+        # matching, so finding none of them is the usual incremental run without new files
+        log_no_files = LOGGER.warning if modified_since is None else LOGGER.info
+        since = '' if modified_since is None else ' modified since {}'.format(modified_since)
+        if file_count:
+            LOGGER.info('Found %s files in "%s"', file_count, prefix)
+        else:
+            log_no_files('Found no files%s on specified %s server at "%s"', since, self.protocol, prefix)
+
+        if matching_count:
+            LOGGER.info('Found %s files in "%s" matching "%s"%s', matching_count, prefix, search_pattern,
+                        ', the first {} are listed above'.format(LOGGED_FILE_COUNT)
+                        if matching_count > LOGGED_FILE_COUNT else '')
+        else:
+            log_no_files('Found no files%s on specified %s server at "%s" matching "%s"',
+                         since, self.protocol, prefix, search_pattern)
+
+        if shard is not None:
+            LOGGER.info('%s of them in shard %s', shard_count, shard)
+        if modified_since is not None:
+            LOGGER.info('%s of them modified since %s', len(plan), modified_since)
+        if plan.runs:
+            LOGGER.info('Spilled the plan of %s files to %s sorted runs on disk', len(plan), len(plan.runs))
+        return plan
+
+    def get_files_matching_pattern(self, files, pattern):
+        """ Takes a file dict {"filepath": "...", "last_modified": "..."} and a regex pattern string, and returns files matching that pattern. """
+        matcher = re.compile(pattern)
+        return [f for f in files if matcher.search(f["filepath"])]
+
+class SFTPConnection(Connection):
+    protocol = 'SFTP'
+    capabilities = frozenset([SEEKABLE_HANDLES, CONCURRENT_READS])
+
+    def __init__(self, host, username, password=None, private_key_file=None, port=None, timeout=REQUEST_TIMEOUT,
+                 find_listing=False):
         self.host = host
         self.username = username
         self.password = password
         self.port = int(port)or 22
         self.__active_connection = False
+        # list files with 'find' over an exec channel, until the server refuses it
+        self.find_listing = find_listing
         self.key = None
         if private_key_file:
             key_path = os.path.expanduser(private_key_file)
             self.key = paramiko.RSAKey.from_private_key_file(key_path)
 
-        if timeout and float(timeout):
-            # set the request timeout for the requests
-            # if value is 0,"0", "" or None then it will set default to default to 300.0 seconds if not passed in config.
-            self.request_timeout = float(timeout)
-        else:
-            # set the default timeout of 300 seconds
-            self.request_timeout = REQUEST_TIMEOUT
+        self.request_timeout = get_request_timeout(timeout)
 
     def handle_backoff(details):
         LOGGER.warn("SSH Connection closed unexpectedly. Waiting {wait} seconds and retrying...".format(**details))
@@ -51,17 +255,25 @@ class SFTPConnection():
                           factor=2)
     def __try_connect(self):
         if not self.__active_connection:
+            # the SSH connection and its SFTP channel
+            hosts.acquire(hosts.SESSIONS, self.host, self.port)
+            hosts.acquire(hosts.CHANNELS, self.host, self.port)
             try:
-                self.transport = paramiko.Transport((self.host, self.port))
-                self.transport.use_compression(True)
-                self.transport.connect(username = self.username, password = self.password, hostkey = None, pkey = self.key)
-                self.sftp = paramiko.SFTPClient.from_transport(self.transport)
-            except (AuthenticationException, SSHException) as ex:
-                self.transport.close()
-                self.transport = paramiko.Transport((self.host, self.port))
-                self.transport.use_compression(True)
-                self.transport.connect(username= self.username, password = self.password, hostkey = None, pkey = None)
-                self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+                try:
+                    self.transport = paramiko.Transport((self.host, self.port))
+                    self.transport.use_compression(True)
+                    self.transport.connect(username = self.username, password = self.password, hostkey = None, pkey = self.key)
+                    self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+                except (AuthenticationException, SSHException) as ex:
+                    self.transport.close()
+                    self.transport = paramiko.Transport((self.host, self.port))
+                    self.transport.use_compression(True)
+                    self.transport.connect(username= self.username, password = self.password, hostkey = None, pkey = None)
+                    self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+            except BaseException:
+                hosts.release(hosts.CHANNELS, self.host, self.port)
+                hosts.release(hosts.SESSIONS, self.host, self.port)
+                raise
             self.__active_connection = True
             # get 'socket' to set the timeout
             socket = self.sftp.get_channel()
@@ -94,6 +306,8 @@ class SFTPConnection():
             self.sftp.close()
             self.transport.close()
             self.__active_connection = False
+            hosts.release(hosts.CHANNELS, self.host, self.port)
+            hosts.release(hosts.SESSIONS, self.host, self.port)
 
     def match_files_for_table(self, files, table_name, search_pattern):
         LOGGER.info("Searching for files for table '%s', matching pattern: %s", table_name, table_pattern)
@@ -140,42 +354,134 @@ class SFTPConnection():
 
                 # NB: SFTP specifies path characters to be '/'
                 #     https://tools.ietf.org/html/draft-ietf-secsh-filexfer-13#section-6
-                files.append({"filepath": prefix + '/' + file_attr.filename,
-                              "last_modified": datetime.utcfromtimestamp(last_modified).replace(tzinfo=pytz.UTC)})
+                files.append(FileEntry(prefix + '/' + file_attr.filename, last_modified, file_attr.st_size))
 
         return files
 
-    def get_files(self, prefix, search_pattern, modified_since=None):
-        files = self.get_files_by_prefix(prefix)
-        if files:
-            LOGGER.info('Found %s files in "%s"', len(files), prefix)
-        else:
-            LOGGER.warning('Found no files on specified SFTP server at "%s"', prefix)
+    def iter_files(self, prefix, modified_since=None, search_pattern=None):
+        if self.find_listing:
+            files = self.find_files(prefix, modified_since)
+            if files is not None:
+                return iter(files)
+        return self.walk_files(prefix, modified_since, search_pattern)
 
-        matching_files = self.get_files_matching_pattern(files, search_pattern)
+    def walk_files(self, prefix, modified_since=None, search_pattern=None):
+        """
+        Yields the files under "prefix" while its directories are read, a page of entries at a
+        time with 'listdir_iter', instead of holding the entries of whole directories. Files not
+        modified since 'modified_since' or not matching 'search_pattern' are skipped before a
+        file dict is made for them.
+        """
+        if prefix is None or prefix == '':
+            prefix = '.'
+        matcher = re.compile(search_pattern) if search_pattern else None
+        modified_since = modified_since.timestamp() if modified_since is not None else None
 
-        if matching_files:
-            LOGGER.info('Found %s files in "%s" matching "%s"', len(matching_files), prefix, search_pattern)
-        else:
-            LOGGER.warning('Found no files on specified SFTP server at "%s" matching "%s"', prefix, search_pattern)
+        directories = [prefix]
+        while directories:
+            directory = directories.pop()
+            # the pages of a directory are read ahead, so the sub directories are only
+            # listed once it is done, their requests would take the replies of its pages
+            try:
+                for file_attr in self.sftp.listdir_iter(directory):
+                    filepath = directory + '/' + file_attr.filename
+                    if stat.S_ISDIR(file_attr.st_mode):
+                        directories.append(filepath)
+                        continue
+                    if file_attr.st_size == 0:
+                        continue
+                    if matcher and not matcher.search(filepath):
+                        continue
+
+                    last_modified = file_attr.st_mtime
+                    if last_modified is None:
+                        LOGGER.warning("Cannot read m_time for file %s, defaulting to current epoch time", filepath)
+                        last_modified = time.time()
+                    f = FileEntry(filepath, last_modified, file_attr.st_size)
+                    if modified_since is not None and f.mtime <= modified_since:
+                        continue
+                    yield f
+            except FileNotFoundError as e:
+                raise Exception("Directory '{}' does not exist".format(directory)) from e
 
-        for f in matching_files:
-            LOGGER.info("Found file: %s", f['filepath'])
+    def find_files(self, prefix, modified_since=None):
+        """
+        Lists the files under "prefix" by running 'find' on the server, which is much faster than
+        walking the directories over SFTP. Files not modified since 'modified_since' are left out
+        by 'find' already.
+
+        Returns None when the server does not allow running 'find', for the SFTP walk to be used.
+        """
+        if prefix is None or prefix == '':
+            prefix = '.'
 
+        command = "find {} -type f -size +0c".format(shlex.quote(prefix))
         if modified_since is not None:
-            matching_files = [f for f in matching_files if f["last_modified"] > modified_since]
+            # seconds are truncated, 'get_files' filters on the exact time
+            command += " -newermt @{}".format(int(modified_since.timestamp()))
+        # paths go last and entries end with NUL, as paths can contain spaces and new lines
+        command += " -printf '%s %T@ %p\\0'"
 
-        # sort files in increasing order of "last_modified"
-        sorted_files = sorted(matching_files, key = lambda x: (x['last_modified']).timestamp())
-        return sorted_files
+        self.__try_connect()
+        # the SFTP channel of the connection is still open, so do not wait for a channel held by it
+        if not hosts.acquire(hosts.CHANNELS, self.host, self.port, timeout=0):
+            LOGGER.info("No channel of %s:%s is free to run 'find', listing files over SFTP.", self.host, self.port)
+            return None
+
+        try:
+            try:
+                channel = self.transport.open_session()
+                channel.settimeout(self.request_timeout)
+                channel.exec_command(command)
+            except SSHException as e:
+                LOGGER.warning("Running 'find' on the server is not allowed (%s), listing files over SFTP.", e)
+                self.find_listing = False
+                return None
+
+            # the errors are read while the output is, so a lot of them cannot fill the window of the channel
+            errors = collections.deque(maxlen=FIND_ERROR_LINES)
+            errors_reader = threading.Thread(target=read_errors, args=(channel.makefile_stderr('rb'), errors), daemon=True)
+            errors_reader.start()
+            try:
+                files = list(parse_find_output(iter(lambda: channel.recv(FIND_READ_SIZE), b'')))
+                exit_status = channel.recv_exit_status()
+                errors_reader.join(self.request_timeout)
+            except socket.timeout:
+                # 'find' prints nothing while it goes through directories without a matching file,
+                # which can take longer than a request on large trees
+                LOGGER.warning("'find' printed nothing for %s seconds, listing files over SFTP.", self.request_timeout)
+                self.find_listing = False
+                return None
+            finally:
+                channel.close()
+            error = b''.join(errors).decode('utf-8', 'replace').strip()
+        finally:
+            hosts.release(hosts.CHANNELS, self.host, self.port)
+
+        if exit_status != 0:
+            # such as a shell restricted to SFTP, a 'find' without '-newermt' or an unreadable directory
+            LOGGER.warning("'find' failed on the server with exit status %s (%s), listing files over SFTP.",
+                           exit_status, error)
+            self.find_listing = False
+            return None
+
+        return files
+
+    def stat(self, filepath):
+        file_attr = self.sftp.stat(filepath)
+        last_modified = file_attr.st_mtime
+        if last_modified is None:
+            last_modified = time.time()
+        return FileEntry(filepath, last_modified, file_attr.st_size)
 
     # retry 5 times for timeout error
     @backoff.on_exception(backoff.expo,
                         (socket.timeout),
                         max_tries=5,
+                        on_backoff=handle_file_backoff,
                         factor=2)
     def get_file_handle(self, f):
-        """ Takes a file dict {"filepath": "...", "last_modified": "..."}
+        """ Takes a file dict {"filepath": "...", "last_modified": "...", "size": ...}
         -> returns a handle to the file.
         -> raises error with appropriate logger message """
         try:
@@ -187,15 +493,434 @@ class SFTPConnection():
                 LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
             raise
 
-    def get_files_matching_pattern(self, files, pattern):
-        """ Takes a file dict {"filepath": "...", "last_modified": "..."} and a regex pattern string, and returns files matching that pattern. """
-        matcher = re.compile(pattern)
-        return [f for f in files if matcher.search(f["filepath"])]
+class FTPFileHandle():
+    """
+    Streams a file over the data connection of a RETR command, read through a large
+    buffer. Must be closed before the control connection can be used again.
+    """
+
+    def __init__(self, ftp, filepath, buffer_size):
+        self.ftp = ftp
+        # listings switch the connection to ASCII, so set the binary type for every transfer
+        self.ftp.voidcmd('TYPE I')
+        self.data_connection = ftp.transfercmd('RETR ' + filepath)
+        self.file = self.data_connection.makefile('rb', buffering=buffer_size)
+        self.closed = False
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def readline(self, size=-1):
+        return self.file.readline(size)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.file.close()
+        self.data_connection.close()
+        try:
+            self.ftp.voidresp()
+        except ftplib.error_temp:
+            # "426 Transfer aborted" when the file was not read until the end
+            pass
+
+class FTPConnection(Connection):
+    protocol = 'FTP'
+
+    def __init__(self, host, username, password=None, port=None, timeout=REQUEST_TIMEOUT,
+                 read_buffer_size=FTP_READ_BUFFER_SIZE):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = int(port or 21)
+        self.request_timeout = get_request_timeout(timeout)
+        self.read_buffer_size = read_buffer_size
+        self._ftp = None
+        # only one transfer at a time can run on the control connection
+        self.transfer = None
+
+    def make_client(self):
+        return ftplib.FTP()
+
+    def handle_backoff(details):
+        LOGGER.warn("FTP Connection closed unexpectedly. Waiting {wait} seconds and retrying...".format(**details))
+
+    @backoff.on_exception(backoff.expo,
+                          (EOFError, ConnectionError),
+                          max_tries=6,
+                          on_backoff=handle_backoff,
+                          jitter=None,
+                          factor=2)
+    def connect(self):
+        ftp = self.make_client()
+        ftp.connect(self.host, self.port, timeout=self.request_timeout)
+        self.login(ftp)
+        ftp.set_pasv(True)
+        self._ftp = ftp
+
+    def login(self, ftp):
+        ftp.login(self.username, self.password or '')
+
+    @property
+    def ftp(self):
+        """ The control connection, reused for every listing and transfer. """
+        if self._ftp is None:
+            self.connect()
+        self.finish_transfer()
+        return self._ftp
+
+    def finish_transfer(self):
+        if self.transfer is None:
+            return
+        transfer, self.transfer = self.transfer, None
+        try:
+            transfer.close()
+        except ftplib.all_errors:
+            LOGGER.warning("Could not end the transfer of the previous file, reconnecting.")
+            self.close()
+
+    def close(self):
+        if self._ftp is not None:
+            ftp, self._ftp = self._ftp, None
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+    def __del__(self):
+        self.close()
+
+    def list_directory(self, path):
+        try:
+            # consume the listing before the control connection is used for anything else
+            return list(self.ftp.mlsd(path, facts=['type', 'size', 'modify']))
+        except ftplib.error_perm as e:
+            # 500 and 502 are replied to unknown or not implemented commands
+            if str(e)[:3] in ('500', '502'):
+                raise Exception("The FTP server does not support MLSD, which is required to list files") from e
+            raise Exception("Directory '{}' does not exist".format(path)) from e
+
+    def get_last_modified(self, filepath, facts):
+        """ Returns the epoch time of the "modify" fact. """
+        modify = facts.get('modify')
+        if modify:
+            # YYYYMMDDHHMMSS[.sss] in UTC
+            return calendar.timegm(time.strptime(modify[:14], '%Y%m%d%H%M%S'))
+        LOGGER.warning("Cannot read modify time for file %s, defaulting to current epoch time", filepath)
+        return time.time()
+
+    # backoff for 60 seconds as there is possibility the request will backoff again in 'discover.get_schema'
+    @backoff.on_exception(backoff.constant,
+                          (socket.timeout),
+                          max_time=60,
+                          interval=10,
+                          jitter=None)
+    def get_files_by_prefix(self, prefix):
+        """
+        Lists "prefix" and its sub directories with MLSD, which returns the type, size and
+        modification time of all the entries of a directory in a single command.
+
+        Returns a list of filepaths from the root.
+        """
+        files = []
+
+        if prefix is None or prefix == '':
+            prefix = '.'
+
+        for name, facts in self.list_directory(prefix):
+            entry_type = facts.get('type', '').lower()
+            if entry_type == 'dir':
+                files += self.get_files_by_prefix(prefix + '/' + name)
+            elif entry_type == 'file':
+                if int(facts.get('size', 0)) == 0:
+                    continue
+
+                files.append(FileEntry(prefix + '/' + name,
+                                       self.get_last_modified(prefix + '/' + name, facts),
+                                       int(facts['size'])))
+
+        return files
+
+    def stat(self, filepath):
+        try:
+            # "250-Listing <path>", " type=file;size=...;modify=...; <path>", "250 End"
+            response = self.ftp.sendcmd('MLST ' + filepath)
+        except ftplib.error_perm as e:
+            raise FileNotFoundError(str(e)) from e
+        facts_line = response.splitlines()[1].strip()
+        facts = {}
+        for fact in facts_line.partition(' ')[0].rstrip(';').split(';'):
+            key, _, value = fact.partition('=')
+            facts[key.lower()] = value
+        return FileEntry(filepath, self.get_last_modified(filepath, facts), int(facts.get('size', 0)))
+
+    def open_file_handle(self, f):
+        """ Takes a file dict {"filepath": "...", "last_modified": "...", "size": ...}
+        -> returns a handle streaming the file over a data connection.
+        -> raises OSError with appropriate logger message """
+        ftp = self.ftp
+        try:
+            self.transfer = FTPFileHandle(ftp, f["filepath"], self.read_buffer_size)
+        except ftplib.error_perm as e:
+            if "Permission denied" in str(e):
+                LOGGER.warn("Skipping %s file because you do not have enough permissions.", f["filepath"])
+                raise PermissionError(str(e)) from e
+            LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
+            raise OSError(str(e)) from e
+
+        return self.transfer
+
+class SessionReuseFTP_TLS(ftplib.FTP_TLS):
+    """
+    FTP_TLS resuming the TLS session of the control connection on every data connection,
+    so transfers do not pay for a full handshake. Servers such as vsftpd with
+    "require_ssl_reuse" refuse data connections which do not resume it.
+    """
+
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = ftplib.FTP.ntransfercmd(self, cmd, rest)
+        if self._prot_p:
+            conn = self.context.wrap_socket(conn,
+                                            server_hostname=self.host,
+                                            session=self.sock.session)
+        return conn, size
+
+class ImplicitFTP_TLS(SessionReuseFTP_TLS):
+    """ FTP_TLS for implicit FTPS, where the control connection is wrapped in TLS as soon as it is opened. """
+
+    @property
+    def sock(self):
+        return self._sock
+
+    @sock.setter
+    def sock(self, value):
+        if value is not None and not isinstance(value, ssl.SSLSocket):
+            value = self.context.wrap_socket(value, server_hostname=self.host)
+        self._sock = value
+
+class FTPSConnection(FTPConnection):
+    protocol = 'FTPS'
+
+    def __init__(self, host, username, password=None, port=None, timeout=REQUEST_TIMEOUT,
+                 implicit=False, ca_file=None, verify_certificate=True):
+        # implicit FTPS listens on port 990 by default
+        super().__init__(host, username, password=password, port=port or (990 if implicit else 21), timeout=timeout)
+        self.implicit = implicit
+        self.context = ssl.create_default_context(cafile=ca_file)
+        if not verify_certificate:
+            self.context.check_hostname = False
+            self.context.verify_mode = ssl.CERT_NONE
+
+    def make_client(self):
+        if self.implicit:
+            return ImplicitFTP_TLS(context=self.context)
+        return SessionReuseFTP_TLS(context=self.context)
+
+    def login(self, ftp):
+        # sends AUTH TLS first for explicit FTPS
+        super().login(ftp)
+        # encrypt the data connections too
+        ftp.prot_p()
+
+class MmapFileHandle():
+    """ Reads a local file through a read-only memory map, without copying it through a read buffer. """
+
+    def __init__(self, file):
+        self.file = file
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.map, 'madvise'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def read(self, size=-1):
+        return self.map.read(size)
+
+    def readline(self, size=-1):
+        return self.map.readline(size)
+
+    def __iter__(self):
+        return iter(self.map.readline, b'')
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.map.seek(offset, whence)
+        return self.map.tell()
+
+    def tell(self):
+        return self.map.tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+class LocalConnection(Connection):
+    """
+    Reads files of the local file system, such as an NFS mount on the tap host, without
+    going through an SSH server.
+    """
+    protocol = 'local'
+    capabilities = frozenset([SEEKABLE_HANDLES, CONCURRENT_READS])
+
+    def __init__(self, read_buffer_size=LOCAL_READ_BUFFER_SIZE, use_mmap=False):
+        self.read_buffer_size = read_buffer_size
+        self.use_mmap = use_mmap
+
+    def get_files_by_prefix(self, prefix):
+        """
+        Lists "prefix" and its sub directories with 'os.scandir', whose entries come with
+        their type and cache their stat result.
+
+        Returns a list of filepaths from the root.
+        """
+        return list(self.iter_files(prefix))
+
+    def iter_files(self, prefix, modified_since=None, search_pattern=None):
+        """
+        Yields the files under "prefix" while its directories are read, one directory at a
+        time. Symbolic links to directories are not followed, so a link to a parent cannot
+        make the walk loop. Files not modified since 'modified_since' or not matching
+        'search_pattern' are skipped before a file dict is made for them.
+        """
+        if prefix is None or prefix == '':
+            prefix = '.'
+        matcher = re.compile(search_pattern) if search_pattern else None
+        modified_since = modified_since.timestamp() if modified_since is not None else None
+
+        directories = [prefix]
+        while directories:
+            directory = directories.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        filepath = directory + '/' + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(filepath)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if matcher and not matcher.search(filepath):
+                            continue
+
+                        file_stat = entry.stat()
+                        if file_stat.st_size == 0:
+                            continue
+                        f = FileEntry(filepath, file_stat.st_mtime, file_stat.st_size)
+                        if modified_since is not None and f.mtime <= modified_since:
+                            continue
+                        yield f
+            except (FileNotFoundError, NotADirectoryError) as e:
+                raise Exception("Directory '{}' does not exist".format(directory)) from e
+
+    def stat(self, filepath):
+        file_stat = os.stat(filepath)
+        return FileEntry(filepath, file_stat.st_mtime, file_stat.st_size)
+
+    def get_file_handle(self, f):
+        """ Takes a file dict {"filepath": "...", "last_modified": "...", "size": ...}
+        -> returns a handle to the file, memory mapped when "local_use_mmap" is set.
+        -> raises error with appropriate logger message """
+        try:
+            file = open(f["filepath"], 'rb', buffering=self.read_buffer_size)
+        except OSError as e:
+            if isinstance(e, PermissionError):
+                LOGGER.warn("Skipping %s file because you do not have enough permissions.", f["filepath"])
+            else:
+                LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
+            raise
+
+        # empty files cannot be mapped
+        if not self.use_mmap or os.fstat(file.fileno()).st_size == 0:
+            return file
+        return MmapFileHandle(file)
+
+class MemoryConnection(Connection):
+    """
+    Serves files held in memory, {filepath: (data, last_modified epoch time)}, so benchmarks
+    and tests can run the tap without the variance of a network or a disk.
+    """
+    protocol = 'memory'
+    capabilities = frozenset([SEEKABLE_HANDLES, CONCURRENT_READS])
+
+    def __init__(self, files):
+        self.files = files
+
+    def get_files_by_prefix(self, prefix):
+        if prefix is None or prefix == '':
+            prefix = '.'
+        directory = prefix.rstrip('/') + '/'
+        return [FileEntry(filepath, last_modified, len(data))
+                for filepath, (data, last_modified) in self.files.items()
+                if filepath.startswith(directory) and data]
+
+    def stat(self, filepath):
+        if filepath not in self.files:
+            raise FileNotFoundError("No such file: {}".format(filepath))
+        data, last_modified = self.files[filepath]
+        return FileEntry(filepath, last_modified, len(data))
+
+    def get_file_handle(self, f):
+        if f["filepath"] not in self.files:
+            LOGGER.warn("Skipping %s file because it is unable to be read.", f["filepath"])
+            raise FileNotFoundError("No such file: {}".format(f["filepath"]))
+        return io.BytesIO(self.files[f["filepath"]][0])
+
+# protocol -> function creating the connection from the config
+BACKENDS = {}
+# config keys each backend needs, by protocol
+REQUIRED_CONFIG_KEYS = {}
+
+def register_backend(protocol, factory, required_config_keys=()):
+    """
+    Makes "protocol" in the config create connections with 'factory(config)', the config
+    must have the 'required_config_keys' of the backend.
+    """
+    BACKENDS[protocol] = factory
+    REQUIRED_CONFIG_KEYS[protocol] = list(required_config_keys)
 
 def connection(config):
+    protocol = (config.get('protocol') or 'sftp').lower()
+    if protocol not in BACKENDS:
+        raise Exception("Unknown protocol - {}. Enter one of {}".format(protocol, list(BACKENDS)))
+    singer.utils.check_config(config, REQUIRED_CONFIG_KEYS[protocol])
+    return BACKENDS[protocol](config)
+
+def get_sftp_connection(config):
+    engine = (config.get('sftp_engine') or 'paramiko').lower()
+    if engine == 'asyncio':
+        # imported here as asyncssh is optional
+        from tap_sftp.async_sftp import get_async_sftp_connection
+        return get_async_sftp_connection(config)
+    if engine != 'paramiko':
+        raise Exception("Unknown SFTP engine - {}. Enter one of ['paramiko', 'asyncio']".format(engine))
     return SFTPConnection(config['host'],
                           config['username'],
                           password=config.get('password'),
                           private_key_file=config.get('private_key_file'),
                           port=config.get('port'),
-                          timeout=config.get('request_timeout'))
+                          timeout=config.get('request_timeout'),
+                          find_listing=get_boolean_config(config, 'sftp_find_listing'))
+
+# a password can be set instead of the private key
+register_backend('sftp', get_sftp_connection, required_config_keys=['username', 'port', 'host'])
+register_backend('ftp', lambda config: FTPConnection(config['host'],
+                                                     config['username'],
+                                                     password=config.get('password'),
+                                                     port=config.get('port'),
+                                                     timeout=config.get('request_timeout')),
+                 required_config_keys=['username', 'host'])
+register_backend('ftps', lambda config: FTPSConnection(config['host'],
+                                                       config['username'],
+                                                       password=config.get('password'),
+                                                       port=config.get('port'),
+                                                       timeout=config.get('request_timeout'),
+                                                       implicit=get_boolean_config(config, 'ftps_implicit'),
+                                                       ca_file=config.get('ftps_ca_file'),
+                                                       verify_certificate=get_boolean_config(
+                                                           config, 'ftps_verify_certificate', True)),
+                 required_config_keys=['username', 'host'])
+register_backend('local', lambda config: LocalConnection(use_mmap=get_boolean_config(config, 'local_use_mmap')))
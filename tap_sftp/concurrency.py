@@ -0,0 +1,104 @@
+"""
+Adaptive limit of the operations kept in flight against a server.
+
+The limit starts at the floor and is evaluated once per window of completed operations:
+it is raised by one while the throughput of the windows keeps improving, lowered by one
+when the latency grows past 'LATENCY_FACTOR' times the lowest latency seen, and halved
+when operations fail (timeouts, channels the server refused to open...), never going
+below the floor or above the ceiling. After lowering it, the best throughput is measured
+again from the lowered limit, so the limit rises again once the server recovers.
+"""
+import asyncio
+import time
+import singer
+
+LOGGER = singer.get_logger()
+
+# throughput of a window over the best one to count as an improvement
+IMPROVEMENT_FACTOR = 1.1
+# average latency of a window over the lowest one to back off
+LATENCY_FACTOR = 2.0
+
+
+class ConcurrencyController():
+    """ Decides how many operations named 'name' are kept in flight, from 'floor' to 'ceiling'. """
+
+    def __init__(self, name, floor, ceiling, clock=time.perf_counter):
+        self.name = name
+        self.floor = max(1, min(floor, ceiling))
+        self.ceiling = max(ceiling, self.floor)
+        self.limit = self.floor
+        self.clock = clock
+        self.best_throughput = 0
+        self.lowest_latency = None
+        self.start_window()
+
+    def start_window(self):
+        self.window_started_at = self.clock()
+        self.window_count = 0
+        self.window_items = 0
+        self.window_latency = 0
+        self.window_failures = 0
+
+    def record(self, latency, items=1, failed=False):
+        """ Records a completed operation, which read 'items' (entries, bytes...) in 'latency' seconds. """
+        self.window_count += 1
+        self.window_latency += latency
+        if failed:
+            self.window_failures += 1
+        else:
+            self.window_items += items
+        # a window is one round of operations at the current limit
+        if self.window_count >= self.limit:
+            self.evaluate()
+
+    def evaluate(self):
+        elapsed = self.clock() - self.window_started_at
+        throughput = self.window_items / elapsed if elapsed > 0 else 0
+        latency = self.window_latency / self.window_count
+        if self.window_failures:
+            self.set_limit(self.limit // 2, '{} of {} operations failed'.format(self.window_failures, self.window_count))
+            self.best_throughput = 0
+        elif self.lowest_latency is not None and latency > LATENCY_FACTOR * self.lowest_latency:
+            self.set_limit(self.limit - 1, 'latency rose to {:.3f}s from {:.3f}s'.format(latency, self.lowest_latency))
+            self.best_throughput = 0
+            # halfway to the latency of the window, so a server which stays slower stops lowering the limit
+            self.lowest_latency = (self.lowest_latency + latency) / 2
+        else:
+            if throughput > IMPROVEMENT_FACTOR * self.best_throughput:
+                self.set_limit(self.limit + 1, 'throughput improved to {:.1f}/s'.format(throughput))
+            self.best_throughput = max(self.best_throughput, throughput)
+            self.lowest_latency = latency if self.lowest_latency is None else min(self.lowest_latency, latency)
+        self.start_window()
+
+    def set_limit(self, limit, reason):
+        limit = max(self.floor, min(limit, self.ceiling))
+        if limit == self.limit:
+            return
+        LOGGER.info('%s concurrency %s -> %s, %s', self.name, self.limit, limit, reason)
+        self.limit = limit
+
+
+class AdaptiveSemaphore():
+    """
+    Semaphore of an event loop letting up to the current limit of 'controller' coroutines in,
+    must be created on the loop it is used from.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.controller.limit)
+            self.in_flight += 1
+
+    async def release(self, latency, items=1, failed=False):
+        """ Releases the slot of an operation, recorded by the controller unless 'latency' is None, as for a cancelled one. """
+        async with self.condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self.controller.record(latency, items, failed)
+            self.condition.notify_all()
@@ -1,11 +1,12 @@
 import json
-import socket
 import backoff
 import singer
 
 from singer_encodings import json_schema
 from singer import metadata
 from tap_sftp import client
+from tap_sftp import memory
+from tap_sftp.profiling import profile_stream
 
 LOGGER= singer.get_logger()
 
@@ -17,7 +18,13 @@ def discover_streams(config, encoding_format):
 
     tables = json.loads(config['tables'])
     for table_spec in tables:
-        schema, stream_md = get_schema(conn, table_spec, encoding_format)
+        sample_metrics = {}
+        sample_label = 'sampling of {}'.format(table_spec['table_name'])
+        with profile_stream(config, 'discover', table_spec['table_name']), \
+             memory.track_memory(config, sample_label, sample_metrics):
+            schema, stream_md = get_schema(conn, table_spec, encoding_format)
+        if sample_metrics:
+            memory.log_memory_summary(sample_label, sample_metrics)
 
         streams.append(
             {
@@ -33,7 +40,7 @@ def discover_streams(config, encoding_format):
 # backoff for 60 seconds as the request will again backoff again
 # in 'client.get_files_by_prefix' when 'Timeout' error occurs
 @backoff.on_exception(backoff.constant,
-                      (socket.timeout),
+                      client.TRANSIENT_ERRORS,
                       max_time=60,
                       interval=10,
                       jitter=None)
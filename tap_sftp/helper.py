@@ -20,3 +20,50 @@ def write_record(stream_name, record, stream_alias=None, time_extracted=None, en
     write_message(RecordMessage(stream=(stream_alias or stream_name),
                                 record=record,
                                 time_extracted=time_extracted), ensure_ascii=ensure_ascii)
+
+
+def format_records(stream_name, records, stream_alias=None, time_extracted=None, ensure_ascii=True):
+    """
+    Format a batch of records for the given stream as the lines of their messages.
+
+    """
+    stream = stream_alias or stream_name
+    return ''.join(format_message(RecordMessage(stream=stream,
+                                                record=record,
+                                                time_extracted=time_extracted),
+                                  ensure_ascii=ensure_ascii) + '\n'
+                   for record in records)
+
+
+def write_lines(lines):
+    if lines:
+        sys.stdout.write(lines)
+        sys.stdout.flush()
+
+
+def write_records(stream_name, records, stream_alias=None, time_extracted=None, ensure_ascii=True):
+    """
+    Write a batch of records for the given stream, with a single write.
+
+    """
+    write_lines(format_records(stream_name, records, stream_alias=stream_alias, time_extracted=time_extracted,
+                               ensure_ascii=ensure_ascii))
+
+
+def get_number_config(config, key, default):
+    """
+    Returns the number set for 'key' in the config, which can be passed as an integer,
+    a float or a string. Falls back to 'default' if the value is 0, "0", "" or None.
+    """
+    value = (config or {}).get(key)
+    if value and float(value):
+        return float(value)
+    return default
+
+
+def get_boolean_config(config, key, default=False):
+    """ Returns the boolean set for 'key' in the config, which can be passed as a boolean or a string. """
+    value = (config or {}).get(key)
+    if value is None or value == '':
+        return default
+    return value is True or str(value).lower() == 'true'
@@ -0,0 +1,220 @@
+"""
+Limits of the SSH connections and channels opened to every (host, port).
+
+With "max_sessions_per_host" and "max_channels_per_host" in the config, a connection waits
+for a free session and channel of its host before connecting, and the waiters are let in
+the order they came. Every slot of a host is a lock file in "host_limits_dir", held with
+'flock', so the limits and the queue are shared by all the tap processes of the machine,
+such as the shards of a sync, as servers enforce MaxSessions and MaxStartups per client.
+A slot is freed by the system when its process dies.
+
+The SFTP channel of a connection holds one of the channels of its host, so with
+"max_channels_per_host": 1 there is never a channel left for "sftp_find_listing" and the
+files are listed over SFTP.
+"""
+import fcntl
+import os
+import re
+import tempfile
+import threading
+import time
+import singer
+from singer import metrics
+from tap_sftp.helper import get_boolean_config, get_number_config
+
+LOGGER = singer.get_logger()
+
+SESSIONS = 'sessions'
+CHANNELS = 'channels'
+LIMIT_KEYS = {SESSIONS: 'max_sessions_per_host', CHANNELS: 'max_channels_per_host'}
+
+# directory of the lock files of the slots, shared by the tap processes of the machine
+DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'tap-sftp-hosts')
+# seconds between two tries to take a slot held by another connection
+POLL_INTERVAL = 0.1
+
+# limits set by 'configure', None when unlimited
+LIMITS = {SESSIONS: None, CHANNELS: None}
+LOCK_DIR = DEFAULT_LOCK_DIR
+
+# SlotLimiter of every (kind, host, port) opened in the run
+LIMITERS = {}
+LIMITERS_LOCK = threading.Lock()
+
+
+class SlotLimiter():
+    """
+    Lets up to 'limit' holders in, across threads and processes: every slot is a lock file
+    in 'directory', held with 'flock' on its own file description. The waiters are queued
+    fairly: every waiter takes a ticket, a file of its arrival time held with 'flock' in the
+    queue directory of the host, and only the waiter of the oldest ticket takes a free slot.
+    The ticket of a waiter whose process died is not held anymore, and is dropped.
+    """
+
+    def __init__(self, directory, kind, host, port, limit):
+        self.limit = limit
+        name = re.sub(r'[^\w.-]', '_', '{}_{}_{}'.format(host, port, kind))
+        self.paths = [os.path.join(directory, '{}.{}.lock'.format(name, slot)) for slot in range(limit)]
+        self.queue_dir = os.path.join(directory, name + '.queue')
+        os.makedirs(self.queue_dir, exist_ok=True)
+        # lock files of the slots held by this process
+        self.held = []
+        self.lock = threading.Lock()
+        # notified when a slot is released or a waiter leaves the queue in this process, the
+        # ones of other processes are seen by polling
+        self.changed = threading.Condition()
+        self.acquired_count = 0
+        self.waited_count = 0
+        self.wait_time = 0
+        self.max_wait_time = 0
+
+    def try_acquire(self):
+        for path in self.paths:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            with self.lock:
+                self.held.append(lock_file)
+            return True
+        return False
+
+    def get_tickets(self):
+        return sorted(name for name in os.listdir(self.queue_dir) if name.endswith('.ticket'))
+
+    def take_ticket(self):
+        """ Returns the name and the held file of a new ticket, after the ones of the waiters already queued. """
+        name = '{:020d}.{}.{}.ticket'.format(time.time_ns(), os.getpid(), threading.get_ident())
+        # held before it is renamed into the queue, so it is never seen as the ticket of a dead process
+        ticket_file = open(os.path.join(self.queue_dir, name + '.new'), 'a')
+        fcntl.flock(ticket_file, fcntl.LOCK_EX)
+        os.rename(ticket_file.name, os.path.join(self.queue_dir, name))
+        return name, ticket_file
+
+    def drop_ticket(self, name, ticket_file):
+        try:
+            os.remove(os.path.join(self.queue_dir, name))
+        except FileNotFoundError:
+            pass
+        fcntl.flock(ticket_file, fcntl.LOCK_UN)
+        ticket_file.close()
+
+    def is_first(self, ticket):
+        """ Returns whether 'ticket' is the oldest ticket of a live waiter. """
+        for name in self.get_tickets():
+            if name == ticket:
+                return True
+            try:
+                ticket_file = open(os.path.join(self.queue_dir, name), 'rb')
+            except FileNotFoundError:
+                continue
+            with ticket_file:
+                try:
+                    fcntl.flock(ticket_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                # not held, the waiter left the queue or its process died
+                self.drop_ticket(name, ticket_file)
+        return False
+
+    def acquire(self, timeout=None):
+        """ Returns the seconds waited for a slot, or None when no slot was free within 'timeout'. """
+        started_at = time.perf_counter()
+        # a free slot is only taken right away when nobody is queued for it
+        if not self.get_tickets() and self.try_acquire():
+            with self.lock:
+                self.acquired_count += 1
+            return 0
+        if timeout == 0:
+            return None
+
+        ticket = self.take_ticket()
+        try:
+            while not (self.is_first(ticket[0]) and self.try_acquire()):
+                waited = time.perf_counter() - started_at
+                if timeout is not None and waited >= timeout:
+                    return None
+                with self.changed:
+                    self.changed.wait(POLL_INTERVAL if timeout is None else min(POLL_INTERVAL, timeout - waited))
+        finally:
+            self.drop_ticket(*ticket)
+            with self.changed:
+                self.changed.notify_all()
+
+        waited = time.perf_counter() - started_at
+        with self.lock:
+            self.acquired_count += 1
+            self.waited_count += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return waited
+
+    def release(self):
+        # the slots are interchangeable, any of the held ones is released
+        with self.lock:
+            if not self.held:
+                return
+            lock_file = self.held.pop()
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+        with self.changed:
+            self.changed.notify_all()
+
+
+def configure(config):
+    global LIMITERS, LOCK_DIR
+    for kind, key in LIMIT_KEYS.items():
+        limit = get_number_config(config, key, None)
+        LIMITS[kind] = int(limit) if limit is not None else None
+    LOCK_DIR = config.get('host_limits_dir') or DEFAULT_LOCK_DIR
+    with LIMITERS_LOCK:
+        LIMITERS = {}
+    if LIMITS[CHANNELS] == 1 and get_boolean_config(config, 'sftp_find_listing'):
+        LOGGER.warning('"max_channels_per_host" of 1 leaves no channel to run \'find\' next to the SFTP channel, '
+                       'files are listed over SFTP.')
+
+
+def get_limiter(kind, host, port):
+    if LIMITS[kind] is None:
+        return None
+    with LIMITERS_LOCK:
+        if (kind, host, port) not in LIMITERS:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            LIMITERS[(kind, host, port)] = SlotLimiter(LOCK_DIR, kind, host, port, LIMITS[kind])
+        return LIMITERS[(kind, host, port)]
+
+
+def acquire(kind, host, port, timeout=None):
+    """
+    Waits for a free slot of 'kind' on the host, for at most 'timeout' seconds, logging the time
+    waited as a 'host_wait_time' metric. Returns False when no slot was free in time.
+    """
+    limiter = get_limiter(kind, host, port)
+    if limiter is None:
+        return True
+    waited = limiter.acquire(timeout)
+    if waited is None:
+        return False
+    if waited:
+        LOGGER.info('Waited %.3f seconds for one of the %s %s of %s:%s', waited, limiter.limit, kind, host, port)
+        metrics.log(LOGGER, metrics.Point('timer', 'host_wait_time', waited,
+                                          {'host': host, 'port': port, 'limit': kind}))
+    return True
+
+
+def release(kind, host, port):
+    limiter = get_limiter(kind, host, port)
+    if limiter is not None:
+        limiter.release()
+
+
+def log_wait_summary():
+    if not LIMITERS:
+        return
+    LOGGER.info("\n**** Host Limits Summary:")
+    LOGGER.info(['host', 'port', 'limit', 'max', 'acquired', 'waited', 'wait_time', 'max_wait_time'])
+    for (kind, host, port), limiter in sorted(LIMITERS.items(), key=lambda a: (a[0][1], a[0][2], a[0][0])):
+        LOGGER.info([host, port, kind, limiter.limit, limiter.acquired_count, limiter.waited_count,
+                     round(limiter.wait_time, 3), round(limiter.max_wait_time, 3)])
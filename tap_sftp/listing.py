@@ -0,0 +1,144 @@
+"""
+Files listed by the connections, and the plan of the files to sync in 'last_modified'
+order which spills to sorted runs on disk when it grows past a threshold.
+"""
+import heapq
+import math
+import struct
+import tempfile
+from datetime import datetime
+from operator import attrgetter
+import pytz
+
+# candidates kept in memory before they are sorted and spilled to disk
+DEFAULT_SPILL_THRESHOLD = 500000
+# runs spilled to disk are read back 64 KB at a time
+RUN_READ_BUFFER_SIZE = 64 * 1024
+# mtime, size and length of the path of an entry in a run, followed by the path
+RUN_RECORD = struct.Struct('<dqI')
+
+
+def round_to_microseconds(timestamp):
+    """
+    Rounds an epoch time to whole microseconds as 'datetime' does, so comparing the rounded
+    floats gives the same result as comparing the datetimes of the bookmarks.
+    """
+    fraction, seconds = math.modf(timestamp)
+    return (int(seconds) * 1000000 + round(fraction * 1000000)) / 1000000
+
+
+class FileEntry():
+    """
+    A listed file, read like the file dict {"filepath": "...", "last_modified": ..., "size": ...}.
+    Only the epoch time of the modification is kept, the datetime is made when "last_modified"
+    is read, so listings of many files take less memory and sort and filter on floats.
+    """
+    __slots__ = ('filepath', 'mtime', 'size')
+
+    KEYS = ('filepath', 'last_modified', 'size')
+
+    def __init__(self, filepath, mtime, size=None):
+        self.filepath = filepath
+        self.mtime = round_to_microseconds(mtime)
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, f):
+        return cls(f["filepath"], f["last_modified"].timestamp(), f.get("size"))
+
+    @property
+    def last_modified(self):
+        return datetime.utcfromtimestamp(self.mtime).replace(tzinfo=pytz.UTC)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def __eq__(self, other):
+        if isinstance(other, FileEntry):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return 'FileEntry({!r}, {!r}, {!r})'.format(self.filepath, self.mtime, self.size)
+
+
+def write_run(run_file, entries):
+    for f in entries:
+        path = f.filepath.encode('utf-8', 'surrogateescape')
+        run_file.write(RUN_RECORD.pack(f.mtime, -1 if f.size is None else f.size, len(path)))
+        run_file.write(path)
+
+
+def read_run(run_file):
+    run_file.seek(0)
+    while True:
+        header = run_file.read(RUN_RECORD.size)
+        if not header:
+            return
+        mtime, size, path_length = RUN_RECORD.unpack(header)
+        filepath = run_file.read(path_length).decode('utf-8', 'surrogateescape')
+        f = FileEntry(filepath, mtime, None if size == -1 else size)
+        # already rounded when the entry was listed
+        f.mtime = mtime
+        yield f
+
+
+class FilePlan():
+    """
+    The files to sync, iterated in increasing order of 'last_modified', the listing order
+    breaking ties. Past 'spill_threshold' candidates, the candidates are sorted and written
+    to a temporary run file, and iterating merges the runs, so the plan of a backfill over
+    millions of files holds at most 'spill_threshold' entries in memory.
+    """
+
+    def __init__(self, spill_threshold=None, spill_dir=None):
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.candidates = []
+        self.runs = []
+        self.count = 0
+
+    def add(self, f):
+        self.candidates.append(f)
+        self.count += 1
+        if self.spill_threshold and len(self.candidates) >= self.spill_threshold:
+            self.spill()
+
+    def spill(self):
+        run_file = tempfile.TemporaryFile(dir=self.spill_dir, buffering=RUN_READ_BUFFER_SIZE)
+        self.candidates.sort(key=attrgetter('mtime'))
+        write_run(run_file, self.candidates)
+        run_file.flush()
+        self.runs.append(run_file)
+        self.candidates = []
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def __iter__(self):
+        self.candidates.sort(key=attrgetter('mtime'))
+        if not self.runs:
+            return iter(self.candidates)
+        # merge keeps the order of the runs for equal times, the candidates were listed last
+        return heapq.merge(*[read_run(run_file) for run_file in self.runs], self.candidates,
+                           key=attrgetter('mtime'))
+
+    def close(self):
+        for run_file in self.runs:
+            run_file.close()
+        self.runs = []
+        self.candidates = []
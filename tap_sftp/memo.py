@@ -0,0 +1,119 @@
+"""
+Memoized parsing of the datetime and number values of the records.
+
+Columns of timestamps, amounts or ids often repeat the same values over millions of rows.
+'MemoTransformer' keeps the result of parsing every string in a bounded LRU cache of its
+column, and stops caching a column whose values do not repeat enough to pay for it.
+"""
+import collections
+import singer
+from singer import Transformer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_CACHE_SIZE = 4096
+# a cache is disabled when its hit rate stays under 'MIN_HIT_RATE' for 'LOW_HIT_RATE_WINDOWS'
+# windows of 'HIT_RATE_WINDOW' lookups in a row
+MIN_HIT_RATE = 0.2
+HIT_RATE_WINDOW = 1000
+LOW_HIT_RATE_WINDOWS = 3
+
+
+class ParseCache():
+    """ LRU cache of the results of parsing the strings of a column, up to 'size' of them. """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.results = collections.OrderedDict()
+        self.enabled = True
+        self.lookups = 0
+        self.hits = 0
+        self.window_lookups = 0
+        self.window_hits = 0
+        self.low_hit_rate_windows = 0
+
+    def get(self, value, parse):
+        """ Returns the result of 'parse(value)', from the cache when 'value' was parsed already. """
+        if not self.enabled:
+            return parse(value)
+        self.lookups += 1
+        self.window_lookups += 1
+        try:
+            result = self.results[value]
+            self.results.move_to_end(value)
+            self.hits += 1
+            self.window_hits += 1
+        except KeyError:
+            result = parse(value)
+            self.results[value] = result
+            if len(self.results) > self.size:
+                self.results.popitem(last=False)
+        if self.window_lookups >= HIT_RATE_WINDOW:
+            self.end_window()
+        return result
+
+    def end_window(self):
+        if self.window_hits / self.window_lookups < MIN_HIT_RATE:
+            self.low_hit_rate_windows += 1
+        else:
+            self.low_hit_rate_windows = 0
+        self.window_lookups = 0
+        self.window_hits = 0
+        if self.low_hit_rate_windows >= LOW_HIT_RATE_WINDOWS:
+            LOGGER.info('Disabling the parse cache of %s, its hit rate stayed under %s%%',
+                        self.name, MIN_HIT_RATE * 100)
+            self.enabled = False
+            self.results.clear()
+
+    def get_hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0
+
+
+class MemoTransformer(Transformer):
+    """
+    'Transformer' of a stream caching the datetime, integer and number parsing of the string
+    values of every column, the other values are transformed as usual.
+    """
+
+    def __init__(self, stream_name, cache_size=DEFAULT_CACHE_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.stream_name = stream_name
+        self.cache_size = cache_size
+        self.caches = {}
+
+    def get_cache(self, path, kind):
+        key = (tuple(path), kind)
+        cache = self.caches.get(key)
+        if cache is None:
+            name = '{}.{} ({})'.format(self.stream_name, '.'.join(map(str, path)), kind)
+            cache = self.caches[key] = ParseCache(name, self.cache_size)
+        return cache
+
+    def _transform(self, data, typ, schema, path):
+        # the pre hook could change the value, so it is not cached
+        if isinstance(data, str) and typ != 'null' and not self.pre_hook:
+            if schema.get('format') == 'date-time':
+                kind = 'date-time'
+            elif typ in ('integer', 'number') and schema.get('format') != 'singer.decimal':
+                kind = typ
+            else:
+                kind = None
+            if kind is not None:
+                # the results are (success, value) tuples of immutable values, safe to share
+                return self.get_cache(path, kind).get(
+                    data, lambda value: Transformer._transform(self, value, typ, schema, path))
+        return super()._transform(data, typ, schema, path)
+
+    def get_cache_counts(self):
+        """ Returns the lookups, hits and whether it is still enabled of every cache, by name. """
+        return {cache.name: (cache.lookups, cache.hits, cache.enabled) for cache in self.caches.values()}
+
+    def log_cache_summary(self):
+        log_cache_summary(self.get_cache_counts())
+
+
+def log_cache_summary(cache_counts):
+    for name, (lookups, hits, enabled) in cache_counts.items():
+        LOGGER.info('Parse cache of %s: %s lookups, %.1f%% hits%s', name, lookups,
+                    hits / lookups * 100 if lookups else 0, '' if enabled else ', disabled')
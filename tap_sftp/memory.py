@@ -0,0 +1,126 @@
+import contextlib
+import os
+import resource
+import threading
+import tracemalloc
+import singer
+from tap_sftp.helper import get_boolean_config, get_number_config
+
+LOGGER = singer.get_logger()
+
+DEFAULT_MEMORY_SAMPLE_INTERVAL = 0.1
+DEFAULT_TOP_ALLOCATIONS = 5
+# number of files with the highest peaks detailed in the sync summary
+SUMMARY_FILE_COUNT = 10
+MB = 1024 * 1024
+
+
+def is_memory_tracking_enabled(config):
+    return get_boolean_config(config, 'track_memory')
+
+
+def get_rss():
+    """ Returns the current resident set size in bytes, or the peak one where /proc is not available. """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # kilobytes on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler():
+    """
+    Samples the RSS and the memory traced by tracemalloc from a background thread. A
+    snapshot is taken whenever the traced memory reaches a new peak, so the top
+    allocation sites are the ones alive at the peak and not the ones left at the end.
+    Logs a warning with 'label' once when the RSS passes 'soft_limit' bytes.
+    """
+
+    def __init__(self, label, interval, soft_limit=None):
+        self.label = label
+        self.interval = interval
+        self.soft_limit = soft_limit
+        self.peak_rss = 0
+        self.peak_traced = 0
+        self.peak_snapshot = None
+        self.limit_exceeded = False
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self.run, name='tap-sftp-memory', daemon=True)
+
+    def start(self):
+        self.sample()
+        self.sampler.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.sampler.join()
+        self.sample()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = get_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        if self.soft_limit and rss > self.soft_limit and not self.limit_exceeded:
+            self.limit_exceeded = True
+            LOGGER.warning('Memory soft limit of %.1f MB exceeded (RSS %.1f MB) while processing "%s".',
+                           self.soft_limit / MB, rss / MB, self.label)
+
+        traced, _ = tracemalloc.get_traced_memory()
+        if traced > self.peak_traced:
+            # snapshots are expensive, only take a new one when the peak grew by more than 10%
+            if self.peak_snapshot is None or traced > self.peak_traced * 1.1:
+                self.peak_snapshot = tracemalloc.take_snapshot()
+            self.peak_traced = traced
+
+    def get_top_allocations(self, top):
+        if self.peak_snapshot is None:
+            return []
+        statistics = self.peak_snapshot.statistics('lineno')[:top]
+        return ['{} ({:.1f} MB in {} blocks)'.format(stat.traceback[0], stat.size / MB, stat.count)
+                for stat in statistics]
+
+
+@contextlib.contextmanager
+def track_memory(config, label, file_metrics):
+    """
+    Records the peak RSS, the peak traced memory and the top allocation sites of the
+    body of the context in 'file_metrics' when the "track_memory" config is set.
+    """
+    if not is_memory_tracking_enabled(config):
+        yield
+        return
+
+    soft_limit_mb = get_number_config(config, 'memory_soft_limit_mb', None)
+    sampler = MemorySampler(label,
+                            get_number_config(config, 'memory_sample_interval', DEFAULT_MEMORY_SAMPLE_INTERVAL),
+                            soft_limit_mb * MB if soft_limit_mb else None)
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+        file_metrics['peak_rss'] = sampler.peak_rss
+        file_metrics['peak_traced_memory'] = max(traced_peak, sampler.peak_traced)
+        file_metrics['top_allocations'] = sampler.get_top_allocations(
+            int(get_number_config(config, 'memory_top_allocations', DEFAULT_TOP_ALLOCATIONS)))
+
+
+def log_memory_summary(label, file_metrics):
+    LOGGER.info('Memory of "%s": peak RSS %.1f MB, peak traced %.1f MB',
+                label, file_metrics['peak_rss'] / MB, file_metrics['peak_traced_memory'] / MB)
+    for allocation in file_metrics['top_allocations']:
+        LOGGER.info('    %s', allocation)
@@ -0,0 +1,145 @@
+import collections
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import singer
+from tap_sftp.helper import get_number_config
+
+LOGGER = singer.get_logger()
+
+PROFILERS = ['cprofile', 'sampling']
+DEFAULT_PROFILE_DIR = 'profiles'
+DEFAULT_SAMPLE_INTERVAL = 0.01
+DEFAULT_PROFILE_TOP = 20
+
+# hot frames of every profiled stream, logged at the end of the run
+PROFILE_SUMMARIES = []
+
+
+class SamplingProfiler():
+    """
+    Low overhead profiler which samples the stack of the profiled thread every
+    'interval' seconds from a background thread. It does not hook function calls,
+    so it is safe to leave on for big runs. The samples are written in the collapsed
+    stack format ("frame;frame;frame count") that flame graph tools read.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.thread_id = None
+        self.stop_event = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.sampler = threading.Thread(target=self.run, name='tap-sftp-sampler', daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.sampler.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id) # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, code.co_filename, frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        with open(path, 'w') as collapsed_file:
+            for stack, count in self.stacks.most_common():
+                collapsed_file.write('{} {}\n'.format(';'.join(stack), count))
+
+    def get_hot_frames(self, top):
+        total = sum(self.stacks.values())
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+
+        lines = ['{} samples'.format(total)]
+        for frame, count in leaves.most_common(top):
+            lines.append('{:6.1%} {}'.format(count / total, frame))
+        return '\n'.join(lines)
+
+
+class CProfiler():
+    """ Deterministic profiler, more precise than the sampling one but with a higher overhead. """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def dump_stats(self, path):
+        self.profiler.dump_stats(path)
+
+    def get_hot_frames(self, top):
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('tottime').print_stats(top)
+        return output.getvalue()
+
+
+def get_profiler_name(config):
+    profiler_name = config.get('profile')
+    if not profiler_name:
+        return None
+    # "profile": true selects the deterministic profiler
+    if profiler_name is True or str(profiler_name).lower() == 'true':
+        return 'cprofile'
+    if profiler_name not in PROFILERS:
+        raise Exception("Unknown profiler - {}. Enter one of {}".format(profiler_name, PROFILERS))
+    return profiler_name
+
+
+@contextlib.contextmanager
+def profile_stream(config, mode, stream_name):
+    """
+    Profiles the body of the context for one stream when the "profile" config is set,
+    and writes the profile to "<profile_dir>/<mode>-<stream_name>.(prof|collapsed)".
+    """
+    profiler_name = get_profiler_name(config)
+    if not profiler_name:
+        yield
+        return
+
+    if profiler_name == 'sampling':
+        profiler = SamplingProfiler(get_number_config(config, 'profile_sample_interval', DEFAULT_SAMPLE_INTERVAL))
+        extension = 'collapsed'
+    else:
+        profiler = CProfiler()
+        extension = 'prof'
+
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+
+        profile_dir = config.get('profile_dir') or DEFAULT_PROFILE_DIR
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, '{}-{}.{}'.format(mode, stream_name, extension))
+        profiler.dump_stats(path)
+        LOGGER.info('Wrote %s profile of "%s" to %s', profiler_name, stream_name, path)
+
+        top = int(get_number_config(config, 'profile_top', DEFAULT_PROFILE_TOP))
+        PROFILE_SUMMARIES.append((mode, stream_name, profiler.get_hot_frames(top)))
+
+
+def log_profile_summaries():
+    for mode, stream_name, hot_frames in PROFILE_SUMMARIES:
+        LOGGER.info("\n**** Profile of %s for %s:\n%s", mode, stream_name, hot_frames)
+    PROFILE_SUMMARIES.clear()
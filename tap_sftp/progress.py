@@ -0,0 +1,91 @@
+import time
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+# log a heartbeat every 60 seconds by default while a file is synced
+DEFAULT_PROGRESS_INTERVAL = metrics.DEFAULT_LOG_INTERVAL
+
+
+class FileProgress():
+    """
+    Logs throughput heartbeats while a file is synced, so long files do not go silent
+    between "Syncing file" and the end of the file.
+
+    with FileProgress(table_name, f, file_metrics) as progress:
+        for row in rows:
+            # Do stuff...
+            progress.increment()
+
+    Every 'interval' seconds this emits the 'record_count' counter along with gauges for
+    records/sec, wire and decompressed bytes/sec, the percentage of the file read (from
+    the "size" returned by the listing) and the estimated seconds left. The whole file
+    is timed with a 'file_sync_duration' timer.
+    """
+
+    def __init__(self, table_name, f, file_metrics, interval=DEFAULT_PROGRESS_INTERVAL):
+        self.filepath = f['filepath']
+        self.file_size = f.get('size')
+        self.file_metrics = file_metrics
+        self.interval = interval
+        self.tags = {'table': table_name, 'file': self.filepath}
+        self.counter = metrics.Counter(metrics.Metric.record_count, dict(self.tags), log_interval=interval)
+        self.timer = metrics.Timer('file_sync_duration', dict(self.tags))
+        self.record_count = 0
+        self.last_heartbeat = None
+
+    def __enter__(self):
+        self.counter.__enter__()
+        self.timer.__enter__()
+        self.last_heartbeat = (time.time(), 0, 0, 0)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.counter.__exit__(exc_type, exc_value, traceback)
+        self.timer.__exit__(exc_type, exc_value, traceback)
+
+    def increment(self, amount=1):
+        self.record_count += amount
+        self.counter.increment(amount)
+        if time.time() - self.last_heartbeat[0] >= self.interval:
+            self.heartbeat()
+
+    def get_percent_done(self, wire_bytes):
+        if not self.file_size:
+            return None
+        return min(100.0 * wire_bytes / self.file_size, 100.0)
+
+    def get_eta(self, wire_bytes, wire_bytes_per_second):
+        if not self.file_size or not wire_bytes_per_second:
+            return None
+        return max(self.file_size - wire_bytes, 0) / wire_bytes_per_second
+
+    def heartbeat(self):
+        now = time.time()
+        last_time, last_records, last_wire_bytes, last_decompressed_bytes = self.last_heartbeat
+        wire_bytes = self.file_metrics['wire_bytes']
+        decompressed_bytes = self.file_metrics['decompressed_bytes']
+        elapsed = now - last_time
+
+        wire_bytes_per_second = (wire_bytes - last_wire_bytes) / elapsed
+        gauges = {
+            'records_per_second': (self.record_count - last_records) / elapsed,
+            'wire_bytes_per_second': wire_bytes_per_second,
+            'decompressed_bytes_per_second': (decompressed_bytes - last_decompressed_bytes) / elapsed,
+            'percent_done': self.get_percent_done(wire_bytes),
+            'eta_seconds': self.get_eta(wire_bytes, wire_bytes_per_second)
+        }
+        for metric, value in gauges.items():
+            if value is not None:
+                metrics.log(LOGGER, metrics.Point('gauge', metric, value, self.tags))
+
+        LOGGER.info('Syncing file "%s": %s records, %.1f records/sec, %.1f wire bytes/sec, %s done, ETA %s.',
+                    self.filepath,
+                    self.record_count,
+                    gauges['records_per_second'],
+                    gauges['wire_bytes_per_second'],
+                    'unknown' if gauges['percent_done'] is None else '{:.1f}%'.format(gauges['percent_done']),
+                    'unknown' if gauges['eta_seconds'] is None else '{:.0f}s'.format(gauges['eta_seconds']))
+
+        self.last_heartbeat = (now, self.record_count, wire_bytes, decompressed_bytes)
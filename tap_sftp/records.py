@@ -0,0 +1,125 @@
+"""
+Rows of the CSV files turned into the records of a stream.
+
+Only the columns kept by the 'Transformer', the selected ones of the schema, are taken
+from the rows of the CSV reader, so the other columns are neither put in a dict,
+transformed nor serialized. The rows are then handled in batches, transformed one batch
+at a time and written with a single write per batch.
+"""
+import itertools
+from singer import metadata
+from singer_encodings.csv_helper import SDC_EXTRA_COLUMN
+from singer_encodings.json_schema import SDC_SOURCE_FILE_COLUMN, SDC_SOURCE_LINENO_COLUMN
+
+# rows transformed and written together
+DEFAULT_BATCH_SIZE = 100
+
+
+def is_selected(mdata, column):
+    """ Same rule as 'Transformer.filter_data_by_metadata' for the column of a flat record. """
+    breadcrumb = ('properties', column)
+    if metadata.get(mdata, breadcrumb, 'inclusion') == 'automatic':
+        return True
+    return (metadata.get(mdata, breadcrumb, 'selected') is not False
+            and metadata.get(mdata, breadcrumb, 'inclusion') != 'unsupported')
+
+
+def get_selected_columns(schema, mdata):
+    """ Returns the columns of 'schema' the 'Transformer' keeps, the others would be removed from the records. """
+    return {column for column in schema.get('properties', {}) if is_selected(mdata, column)}
+
+
+def project_schema(schema, columns):
+    """ Returns 'schema' with only the properties in 'columns'. """
+    return {**schema, 'properties': {column: column_schema
+                                     for column, column_schema in schema.get('properties', {}).items()
+                                     if column in columns}}
+
+
+def project_rows(reader, columns):
+    """
+    Yields the rows of the 'csv.DictReader' 'reader' with only the values of 'columns', built
+    from the lists of its underlying 'csv.reader' so the other values are never put in a dict.
+    Rows are the same as the ones of the 'DictReader' otherwise: blank lines are skipped,
+    missing values are None and the values past the headers go in '_sdc_extra'. All the
+    rows of the 'DictReader' are yielded when 'columns' is None.
+    """
+    if columns is None:
+        yield from reader
+        return
+    fieldnames = reader.fieldnames
+    if fieldnames is None:
+        # empty file
+        return
+    # the last of duplicate headers wins, as in the 'DictReader'
+    indexes = {name: index for index, name in enumerate(fieldnames) if name in columns}
+    projection = list(indexes.items())
+    header_count = len(fieldnames)
+    with_extra = SDC_EXTRA_COLUMN in columns
+
+    for values in reader.reader:
+        if not values:
+            continue
+        value_count = len(values)
+        if value_count >= header_count:
+            row = {name: values[index] for name, index in projection}
+        else:
+            row = {name: values[index] if index < value_count else reader.restval for name, index in projection}
+        if with_extra and value_count > header_count:
+            row[SDC_EXTRA_COLUMN] = values[header_count:]
+        yield row
+
+
+def get_custom_columns(columns):
+    """ Returns which of the columns added by the tap to every record are selected. """
+    return SDC_SOURCE_FILE_COLUMN in columns, SDC_SOURCE_LINENO_COLUMN in columns
+
+
+def get_projection(stream):
+    """
+    Returns the selected columns of 'stream', the schema of these columns, the metadata to
+    transform the records with and which custom columns are selected.
+
+    A schema without properties, such as the empty one discovered for a table without files
+    yet, has no columns to select: the columns are None, so the rows are kept whole, and the
+    records are transformed with the metadata of the stream.
+    """
+    schema = stream.schema.to_dict()
+    mdata = metadata.to_map(stream.metadata)
+    if 'properties' not in schema:
+        return None, schema, mdata, True, True
+    columns = get_selected_columns(schema, mdata)
+    return (columns, project_schema(schema, columns), None) + get_custom_columns(columns)
+
+
+def iter_batches(rows, batch_size):
+    """ Yields lists of up to 'batch_size' of 'rows', in order. """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def add_custom_columns(batch, filepath, first_lineno, with_source_file, with_source_lineno):
+    """ Adds the selected custom columns to the rows of 'batch', the first of them being at line 'first_lineno'. """
+    for lineno, row in enumerate(batch, first_lineno):
+        if with_source_file:
+            row[SDC_SOURCE_FILE_COLUMN] = filepath
+        if with_source_lineno:
+            row[SDC_SOURCE_LINENO_COLUMN] = lineno
+    return batch
+
+
+def iter_record_batches(rows, batch_size, filepath, first_lineno, with_source_file, with_source_lineno):
+    """ Yields the batches of 'rows' with their custom columns, the first row being at line 'first_lineno'. """
+    lineno = first_lineno
+    for batch in iter_batches(rows, batch_size):
+        add_custom_columns(batch, filepath, lineno, with_source_file, with_source_lineno)
+        lineno += len(batch)
+        yield batch
+
+
+def transform_batch(transformer, batch, schema, mdata=None):
+    return [transformer.transform(row, schema, mdata) for row in batch]
@@ -0,0 +1,51 @@
+import json
+from datetime import datetime, timezone
+import singer
+
+LOGGER = singer.get_logger()
+
+# file object of the run report, set by 'start_run' when the "run_report_path" config is set
+REPORT = None
+
+# The run report is a JSON Lines file, one event per line, flushed as soon as it is
+# written so a crashed run still leaves everything up to the crash behind:
+#
+# {"event": "run_started", "time": "...", "mode": "sync"}
+# {"event": "stream_started", "time": "...", "stream": "table_1", "bookmark": "2018-01-01T00:00:00+00:00"}
+# {"event": "file_synced", "time": "...", "stream": "table_1", "filepath": "folder1/file_1.csv",
+#  "row_count": 50, "retries": 0, "bookmark": "2018-10-04T08:00:00+00:00", "wire_bytes": 2048, ...}
+# {"event": "file_skipped", "time": "...", "stream": "table_1", "filepath": "folder1/file_2.csv",
+#  "reason": "Permission denied"}
+# {"event": "stream_completed", "time": "...", "stream": "table_1", "row_count": 50,
+#  "bookmark_before": "2018-01-01T00:00:00+00:00", "bookmark_after": "2018-10-04T08:00:00+00:00",
+#  "backlog": {"file_count": 1200, "bytes": 52428800, "reason": "run max_files of 1000 reached"}}
+# {"event": "stream_skipped", "time": "...", "stream": "table_2", "reason": "not selected"}
+# {"event": "run_completed", "time": "...", "streams": {"table_1": {...table totals...}}}
+
+
+def start_run(config, mode):
+    global REPORT
+    report_path = (config or {}).get('run_report_path')
+    if not report_path:
+        return
+    REPORT = open(report_path, 'a')
+    LOGGER.info('Writing run report to %s', report_path)
+    write_event('run_started', mode=mode)
+
+
+def write_event(event, **fields):
+    if REPORT is None:
+        return
+    line = {'event': event, 'time': datetime.now(timezone.utc).isoformat(), **fields}
+    # datetimes and decimals are written as strings
+    REPORT.write(json.dumps(line, default=str) + '\n')
+    REPORT.flush()
+
+
+def end_run(**fields):
+    global REPORT
+    if REPORT is None:
+        return
+    write_event('run_completed', **fields)
+    REPORT.close()
+    REPORT = None
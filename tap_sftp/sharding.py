@@ -0,0 +1,73 @@
+"""
+Splits the files of every stream between several tap processes.
+
+With "shard_count": N and "shard_index": 0 to N - 1 in the config, each process only syncs
+the files whose path hashes to its index, so N processes started with the same catalog
+sync disjoint parts of the files and together all of them. Every shard keeps its own state
+file, passed back to the same shard on its next run.
+
+To change the number of shards, or to go back to a single process, the states of the
+shards are merged into one state which is then passed to every new shard:
+
+    $ tap-sftp-merge-states state_0.json state_1.json state_2.json > state.json
+
+The merged bookmark of a stream is the earliest bookmark of the shards, and the stream
+has no bookmark if a shard has none, so no file is missed. The files modified between the
+earliest and the latest bookmark of the shards are synced again by the next run.
+"""
+import argparse
+import json
+import sys
+import zlib
+from singer import utils
+from tap_sftp.helper import get_number_config
+
+
+class Shard():
+    """ The files of shard 'index' out of 'count', assigned by a stable hash of their path. """
+
+    def __init__(self, index, count):
+        if count < 1 or not 0 <= index < count:
+            raise Exception("Invalid shard - {} of {}. Enter a shard_index from 0 to shard_count - 1".format(index, count))
+        self.index = index
+        self.count = count
+
+    def contains(self, filepath):
+        # crc32 is the same across processes and Python versions, unlike 'hash'
+        return zlib.crc32(filepath.encode('utf-8', 'surrogateescape')) % self.count == self.index
+
+    def __str__(self):
+        return '{} of {}'.format(self.index, self.count)
+
+
+def get_shard(config):
+    """ Returns the 'Shard' set by the "shard_index" and "shard_count" config, or None when not sharded. """
+    shard_count = int(get_number_config(config, 'shard_count', 1))
+    if shard_count == 1:
+        return None
+    return Shard(int(get_number_config(config, 'shard_index', 0)), shard_count)
+
+
+def merge_states(states):
+    """ Merges the states of the shards of a sync, keeping the earliest bookmark of every stream. """
+    stream_names = {stream_name for state in states for stream_name in state.get('bookmarks', {})}
+    bookmarks = {}
+    for stream_name in sorted(stream_names):
+        modified_since = [state.get('bookmarks', {}).get(stream_name, {}).get('modified_since') for state in states]
+        if None in modified_since:
+            continue
+        bookmarks[stream_name] = {'modified_since': min(modified_since, key=utils.strptime_to_utc)}
+    return {'bookmarks': bookmarks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merges the state files of the shards of a sync into one state.')
+    parser.add_argument('states', nargs='+', help='state files of the shards')
+    args = parser.parse_args()
+
+    states = []
+    for state_path in args.states:
+        with open(state_path) as state_file:
+            states.append(json.load(state_file))
+    json.dump(merge_states(states), sys.stdout, indent=2)
+    sys.stdout.write('\n')
@@ -1,43 +1,287 @@
+import heapq
+import time
+import singer
+from singer import metrics
+from tap_sftp.helper import get_number_config
+
+LOGGER = singer.get_logger()
+
 STATS = {}
 
+# retries of the files being synced, moved to their stats once they are done
+RETRIES = {}
+
+# "full" keeps the stats of every synced file, "aggregate" keeps running totals per table and
+# only the stats of the top files, so the stats stay bounded on runs over many small files
+FULL_MODE = 'full'
+AGGREGATE_MODE = 'aggregate'
+STATS_MODES = [FULL_MODE, AGGREGATE_MODE]
+DEFAULT_TOP_FILE_COUNT = 10
+
+MODE = FULL_MODE
+TOP_FILE_COUNT = DEFAULT_TOP_FILE_COUNT
+
 # example = {
 #     '<table_name>': {
 #         'search_prefix': 'folder1',
 #         'search_pattern': 'file.*.csv'
+#         'listing_time': 0.52,
 #         'files': {
 #             '<filepath>': {
 #                 'row_count': 100,
-#                 'last_modified': '10-03-2018T5:00:00'
+#                 'last_modified': '10-03-2018T5:00:00',
+#                 'retries': 0,
+#                 'time_to_first_byte': 0.04,
+#                 'wire_bytes': 2048,
+#                 'decompressed_bytes': 8192,
+#                 'download_time': 0.11,
+#                 'decompress_time': 0.02,
+#                 'parse_time': 0.05,
+#                 'transform_time': 0.07,
+#                 'serialize_time': 0.03,
+#                 'peak_rss': 52428800,
+#                 'peak_traced_memory': 10485760,
+#                 'top_allocations': ['/usr/lib/python3.8/zipfile.py:925 (8.0 MB in 3 blocks)', ...]
 #             },
 #             'folder1/file_1.csv': {
 #                 'row_count': 50,
-#                 'last_modified': '10-04-2018T8:00:00'
+#                 'last_modified': '10-04-2018T8:00:00',
+#                 ...
 #             }
 #         }
 #     }
 # }
+#
+# In the "aggregate" mode, 'files' only holds the slowest, largest and highest memory files of
+# the table, and the table also has:
+#         'totals': {'file_count': 2, 'row_count': 150, 'wire_bytes': 4096, ...},
+#         'top_files': {'slowest': [(0.28, '<filepath>'), ...], 'largest': [...], 'highest_memory': [...]},
+#         'last_file': ('<filepath>', {...file data...})
+#
+# When the budget of the run or of the table is exhausted, the files left to the next run are counted in:
+#         'backlog': {'file_count': 1200, 'bytes': 52428800, 'reason': 'run max_files of 1000 reached'}
+
+# byte counters and stage timings (in seconds) recorded for every synced file
+BYTE_COUNTERS = ['wire_bytes', 'decompressed_bytes']
+STAGE_TIMINGS = ['download_time', 'decompress_time', 'parse_time', 'transform_time', 'serialize_time']
+# peaks (in bytes) only recorded when the "track_memory" config is set
+MEMORY_PEAKS = ['peak_rss', 'peak_traced_memory']
+FILE_METRICS = ['time_to_first_byte'] + BYTE_COUNTERS + STAGE_TIMINGS + MEMORY_PEAKS
+
+
+def new_file_metrics():
+    file_metrics = {key: 0 for key in BYTE_COUNTERS + STAGE_TIMINGS}
+    for key in ['time_to_first_byte'] + MEMORY_PEAKS:
+        file_metrics[key] = None
+    return file_metrics
+
+
+class MeteredStream():
+    """
+    Wraps a binary file-like object and records the bytes read from it and the
+    time spent reading into 'file_metrics'. When 'opened_at' is passed, the delay
+    between it and the first non-empty read is recorded as 'time_to_first_byte'.
+    """
+
+    def __init__(self, stream, file_metrics, bytes_key, time_key, opened_at=None):
+        self.stream = stream
+        self.file_metrics = file_metrics
+        self.bytes_key = bytes_key
+        self.time_key = time_key
+        self.opened_at = opened_at
+
+    def _record(self, data, started_at):
+        finished_at = time.perf_counter()
+        self.file_metrics[self.time_key] += finished_at - started_at
+        if data:
+            self.file_metrics[self.bytes_key] += len(data)
+            if self.opened_at is not None:
+                self.file_metrics['time_to_first_byte'] = finished_at - self.opened_at
+                self.opened_at = None
+        return data
+
+    def read(self, size=-1):
+        started_at = time.perf_counter()
+        return self._record(self.stream.read(size), started_at)
+
+    def readline(self, size=-1):
+        started_at = time.perf_counter()
+        return self._record(self.stream.readline(size), started_at)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __getattr__(self, name):
+        # 'seek', 'tell', 'seekable', 'close', ... are passed to the wrapped stream
+        return getattr(self.stream, name)
+
+
+def finalize_file_metrics(file_metrics, loop_time):
+    """
+    Derives the exclusive time of the decompress and parse stages. Until then 'decompress_time'
+    holds all the time spent reading decompressed data (download included) and 'loop_time' is
+    the time spent iterating the rows of the file (reading, transform and serialize included).
+    """
+    read_time = file_metrics['decompress_time']
+    file_metrics['decompress_time'] = max(read_time - file_metrics['download_time'], 0)
+    file_metrics['parse_time'] = max(loop_time - read_time
+                                     - file_metrics['transform_time']
+                                     - file_metrics['serialize_time'], 0)
+    return file_metrics
+
+
+def configure(config):
+    """
+    Sets the mode of the stats from the "stats_mode" config, "full" by default, and the
+    number of files kept per ranking in the "aggregate" mode from "stats_top_files".
+    """
+    global MODE, TOP_FILE_COUNT
+    mode = (config or {}).get('stats_mode') or FULL_MODE
+    if mode not in STATS_MODES:
+        raise Exception("Unknown stats mode - {}. Enter one of {}".format(mode, STATS_MODES))
+    MODE = mode
+    TOP_FILE_COUNT = int(get_number_config(config, 'stats_top_files', DEFAULT_TOP_FILE_COUNT))
+
 
+def get_file_time(file_data):
+    return sum(file_data.get(key) or 0 for key in STAGE_TIMINGS)
 
-def add_file_data(table_spec, filepath, last_modified, row_count):
+# the files kept in the "aggregate" mode are the top ones of each of these rankings
+TOP_FILE_RANKINGS = {
+    'slowest': get_file_time,
+    'largest': lambda file_data: file_data.get('wire_bytes'),
+    'highest_memory': lambda file_data: file_data.get('peak_traced_memory'),
+}
+
+
+def add_retry(filepath):
+    global RETRIES
+    RETRIES[filepath] = RETRIES.get(filepath, 0) + 1
+
+def pop_retries(filepath):
+    global RETRIES
+    return RETRIES.pop(filepath, 0)
+
+def add_file_data(table_spec, filepath, last_modified, row_count, file_metrics=None):
     table_name = table_spec['table_name']
     global STATS
-    if STATS.get(table_name):
-        STATS[table_name]['files'][filepath] = {
-            'last_modified': last_modified,
-            'row_count': row_count
-        }
+    if not STATS.get(table_name):
+        initialize_table_stats(table_spec)
+
+    file_data = {
+        'last_modified': last_modified,
+        'row_count': row_count,
+        'retries': pop_retries(filepath),
+        **(file_metrics or new_file_metrics())
+    }
+    if MODE == AGGREGATE_MODE:
+        add_to_aggregates(STATS[table_name], filepath, file_data)
     else:
+        STATS[table_name]['files'][filepath] = file_data
+    if file_metrics:
+        log_file_metrics(table_name, filepath, file_metrics)
+
+def add_to_aggregates(table_data, filepath, file_data):
+    """
+    Adds a file to the running totals of the table and keeps its stats only while it ranks
+    in the top 'TOP_FILE_COUNT' files of one of the 'TOP_FILE_RANKINGS'.
+    """
+    table_data.setdefault('totals', new_table_totals())
+    add_to_totals(table_data['totals'], file_data)
+    # the last file is kept until the next one is added, so its stats can still be reported
+    table_data['last_file'] = (filepath, file_data)
+
+    top_files = table_data.setdefault('top_files', {ranking: [] for ranking in TOP_FILE_RANKINGS})
+    evicted = set()
+    for ranking, get_value in TOP_FILE_RANKINGS.items():
+        value = get_value(file_data)
+        if value is None:
+            continue
+        # min-heaps, the file ranking last is popped when there are too many
+        heapq.heappush(top_files[ranking], (value, filepath))
+        if len(top_files[ranking]) > TOP_FILE_COUNT:
+            evicted.add(heapq.heappop(top_files[ranking])[1])
+
+    table_data['files'][filepath] = file_data
+    for evicted_filepath in evicted:
+        if not any(f == evicted_filepath for ranked in top_files.values() for _, f in ranked):
+            table_data['files'].pop(evicted_filepath, None)
+
+def get_file_data(table_name, filepath):
+    table_data = STATS.get(table_name, {})
+    file_data = table_data.get('files', {}).get(filepath)
+    if file_data is None and table_data.get('last_file', (None,))[0] == filepath:
+        file_data = table_data['last_file'][1]
+    return file_data
+
+def add_backlog_file(table_spec, f, reason):
+    """ Counts a file left to the next run as the budget of the run or of the table was exhausted. """
+    global STATS
+    if not STATS.get(table_spec['table_name']):
         initialize_table_stats(table_spec)
 
-        STATS[table_name]['files'][filepath] = {
-            'last_modified': last_modified,
-            'row_count': row_count
-        }
+    backlog = STATS[table_spec['table_name']].setdefault('backlog', {'file_count': 0, 'bytes': 0, 'reason': reason})
+    backlog['file_count'] += 1
+    backlog['bytes'] += f.get('size') or 0
+
+def get_backlog(table_name):
+    return STATS.get(table_name, {}).get('backlog')
+
+def add_listing_time(table_spec, listing_time):
+    global STATS
+    if not STATS.get(table_spec['table_name']):
+        initialize_table_stats(table_spec)
+
+    STATS[table_spec['table_name']]['listing_time'] = listing_time
 
 def initialize_table_stats(table_spec):
     global STATS
     STATS[table_spec['table_name']] = {
         'search_prefix': table_spec['search_prefix'],
         'search_pattern': table_spec['search_pattern'],
+        'listing_time': 0,
         'files': {}
     }
+
+def new_table_totals():
+    totals = {'file_count': 0, 'row_count': 0}
+    for key in FILE_METRICS:
+        totals[key] = 0
+    return totals
+
+def add_to_totals(totals, file_data):
+    totals['file_count'] += 1
+    totals['row_count'] += file_data['row_count']
+    for key in FILE_METRICS:
+        if key in MEMORY_PEAKS:
+            totals[key] = max(totals[key], file_data.get(key) or 0)
+        else:
+            totals[key] += file_data.get(key) or 0
+
+def get_table_totals(table_data):
+    """ Sums the row count and every file metric over the files of a table, memory peaks are maxed. """
+    if 'totals' in table_data:
+        # running totals of the "aggregate" mode
+        return dict(table_data['totals'])
+    totals = new_table_totals()
+    for file_data in table_data['files'].values():
+        add_to_totals(totals, file_data)
+    return totals
+
+def log_file_metrics(table_name, filepath, file_metrics):
+    """ Emits the stage timings and byte counters of a file as Singer metric messages. """
+    tags = {'table': table_name, 'file': filepath}
+    for key in BYTE_COUNTERS:
+        metrics.log(LOGGER, metrics.Point('counter', key, file_metrics[key], tags))
+    for key in ['time_to_first_byte'] + STAGE_TIMINGS:
+        if file_metrics[key] is not None:
+            metrics.log(LOGGER, metrics.Point('timer', key, file_metrics[key], tags))
+    for key in MEMORY_PEAKS:
+        if file_metrics[key] is not None:
+            metrics.log(LOGGER, metrics.Point('gauge', key, file_metrics[key], tags))
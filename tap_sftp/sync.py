@@ -1,21 +1,31 @@
 import json
-import socket
+import time
 import backoff
 import codecs
 import singer
-from singer import metadata, utils, Transformer
+from singer import metrics, utils, Transformer
+from tap_sftp import budget
 from tap_sftp import client
+from tap_sftp import listing
+from tap_sftp import memo
+from tap_sftp import memory
+from tap_sftp import records
+from tap_sftp import report
+from tap_sftp import sharding
 from tap_sftp import stats
-from tap_sftp.helper import write_record
-from singer_encodings import csv
+from tap_sftp import workers
+from tap_sftp.helper import get_boolean_config, get_number_config, write_lines, write_records
+from tap_sftp.progress import FileProgress, DEFAULT_PROGRESS_INTERVAL
+from singer_encodings import compression, csv
 
 LOGGER = singer.get_logger()
 DEFAULT_ENCODING_FORMAT = "utf-8"
+DECOMPRESSED_FILE_NAME = "decompressed.csv"
 
 def sync_stream(config, state, stream):
     table_name = stream.tap_stream_id
-    modified_since = utils.strptime_to_utc(singer.get_bookmark(state, table_name, 'modified_since') or
-                                           config['start_date'])
+    bookmark = singer.get_bookmark(state, table_name, 'modified_since')
+    modified_since = utils.strptime_to_utc(bookmark or config['start_date'])
 
     LOGGER.info('Syncing table "%s".', table_name)
     LOGGER.info('Getting files modified since %s.', modified_since)
@@ -24,72 +34,203 @@ def sync_stream(config, state, stream):
     table_spec = [c for c in json.loads(config["tables"]) if c["table_name"]==table_name]
     if len(table_spec) == 0:
         LOGGER.info("No table configuration found for '%s', skipping stream", table_name)
+        report.write_event('stream_skipped', stream=table_name, reason='no table configuration found')
         return 0
     if len(table_spec) > 1:
         LOGGER.info("Multiple table configurations found for '%s', skipping stream", table_name)
+        report.write_event('stream_skipped', stream=table_name, reason='multiple table configurations found')
         return 0
     table_spec = table_spec[0]
-
-    files = conn.get_files(table_spec["search_prefix"],
-                           table_spec["search_pattern"],
-                           modified_since)
+    report.write_event('stream_started', stream=table_name, bookmark=bookmark, modified_since=modified_since)
+    # the listing counts in the run time of the table
+    table_budget = budget.Budget.from_config('table', table_spec)
+
+    with metrics.Timer('listing_time', {'table': table_name}) as timer:
+        files = conn.plan_files(table_spec["search_prefix"],
+                                table_spec["search_pattern"],
+                                modified_since,
+                                spill_threshold=int(get_number_config(config, 'planner_spill_threshold',
+                                                                      listing.DEFAULT_SPILL_THRESHOLD)),
+                                spill_dir=config.get('planner_spill_dir'),
+                                shard=sharding.get_shard(config))
+    stats.add_listing_time(table_spec, timer.elapsed())
 
     LOGGER.info('Found %s files to be synced.', len(files))
 
     records_streamed = 0
     if not files:
+        report.write_event('stream_completed', stream=table_name, row_count=0, file_count=0,
+                           bookmark_before=bookmark, bookmark_after=bookmark)
+        conn.close()
         return records_streamed
 
+    try:
+        records_streamed = sync_files(config, state, stream, conn, table_spec, files, table_budget)
+    finally:
+        files.close()
+        # frees the session of the host for the next streams
+        conn.close()
+
+    LOGGER.info('Wrote %s records for table "%s".', records_streamed, table_name)
+    report.write_event('stream_completed', stream=table_name, row_count=records_streamed, file_count=len(files),
+                       bookmark_before=bookmark,
+                       bookmark_after=singer.get_bookmark(state, table_name, 'modified_since'),
+                       backlog=stats.get_backlog(table_name))
+
+    return records_streamed
+
+def sync_files(config, state, stream, conn, table_spec, files, table_budget=None):
+    """
+    Syncs 'files' in order, writing the bookmark of the stream after every file. Once the
+    budget of the table or of the run is exhausted, the rest of the files are only counted
+    in the backlog of the table, to be synced by the next run from the bookmark.
+    """
+    table_name = stream.tap_stream_id
+    records_streamed = 0
+    table_budget = table_budget or budget.Budget.from_config('table', table_spec)
+    exhausted_reason = None
+
     # Get the value of "encoding_format" from the configuration, defaulting to "DEFAULT_ENCODING_FORMAT"
     encoding_format = config.get("encoding_format") or DEFAULT_ENCODING_FORMAT
 
-    for f in files:
-        records_streamed += sync_file(conn, f, stream, table_spec, encoding_format)
-        state = singer.write_bookmark(state, table_name, 'modified_since', f['last_modified'].isoformat())
-        singer.write_state(state)
+    # worker processes transforming and serializing the records, when enabled
+    pool = workers.get_transform_pool(config, stream)
 
-    LOGGER.info('Wrote %s records for table "%s".', records_streamed, table_name)
+    # parse caches shared by all the files of the stream, the workers have their own
+    transformer = None
+    if pool is None and get_boolean_config(config, 'memoize_parsing', True):
+        transformer = memo.MemoTransformer(table_name, int(get_number_config(config, 'parse_cache_size',
+                                                                             memo.DEFAULT_CACHE_SIZE)))
+
+    # the next run only syncs the files modified after the bookmark, so the sync can only stop
+    # once all the files modified at the time of the bookmark are synced
+    last_modified = None
+
+    try:
+        for f in files:
+            if not exhausted_reason and (last_modified is None or f['last_modified'] > last_modified):
+                exhausted_reason = (table_budget.get_exhausted_reason()
+                                    or budget.RUN_BUDGET.get_exhausted_reason())
+            if exhausted_reason:
+                stats.add_backlog_file(table_spec, f, exhausted_reason)
+                continue
+
+            records_streamed += sync_file(conn, f, stream, table_spec, encoding_format, config, transformer, pool)
+            last_modified = f['last_modified']
+            state = singer.write_bookmark(state, table_name, 'modified_since', f['last_modified'].isoformat())
+            singer.write_state(state)
+
+            file_data = stats.get_file_data(table_name, f['filepath'])
+            if file_data is not None:
+                report.write_event('file_synced', stream=table_name, filepath=f['filepath'],
+                                   bookmark=f['last_modified'].isoformat(), **file_data)
+            wire_bytes = file_data['wire_bytes'] if file_data is not None else 0
+            table_budget.add_file(wire_bytes)
+            budget.RUN_BUDGET.add_file(wire_bytes)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if pool is not None:
+        pool.log_cache_summary()
+    elif transformer is not None:
+        transformer.log_cache_summary()
+
+    if exhausted_reason:
+        backlog = stats.get_backlog(table_name)
+        LOGGER.info('Stopped syncing table "%s", %s. %s files (%s bytes) are left for the next run.',
+                    table_name, exhausted_reason, backlog['file_count'], backlog['bytes'])
 
     return records_streamed
 
+def get_row_iterators(file_handle, options, encoding_format, file_metrics):
+    """
+    Same as 'singer_encodings.csv.get_row_iterators' with 'infer_compression', except that
+    every decompressed stream is metered so the bytes after decompression can be counted.
+    """
+    for decompressed in compression.infer(file_handle, options['file_name']):
+        # 'decompress_time' includes the download until 'stats.finalize_file_metrics' is called
+        metered = stats.MeteredStream(decompressed, file_metrics, 'decompressed_bytes', 'decompress_time')
+        # the stream is already decompressed, so give the reader a name it will not try to decompress again
+        readers = csv.get_row_iterators(metered,
+                                        options={**options, 'file_name': DECOMPRESSED_FILE_NAME},
+                                        infer_compression=True,
+                                        encoding_format=encoding_format)
+        yield from readers
+
+def get_file_arg(details):
+    """ Returns the file dict 'f' a function retried by backoff was called with. """
+    return details['kwargs']['f'] if 'f' in details['kwargs'] else details['args'][1]
+
+def handle_backoff(details):
+    filepath = get_file_arg(details)['filepath']
+    LOGGER.warning('Timed out syncing file "%s". Waiting %s seconds and retrying...', filepath, details['wait'])
+    stats.add_retry(filepath)
+
 # retry 5 times for timeout error
 @backoff.on_exception(backoff.expo,
-                      (socket.timeout),
+                      client.TRANSIENT_ERRORS,
                       max_tries=5,
+                      on_backoff=handle_backoff,
                       factor=2)
-def sync_file(conn, f, stream, table_spec, encoding_format):
+def sync_file(conn, f, stream, table_spec, encoding_format, config=None, transformer=None, pool=None):
     LOGGER.info('Syncing file "%s".', f["filepath"])
+    progress_interval = get_number_config(config, 'progress_interval', DEFAULT_PROGRESS_INTERVAL)
+    batch_size = int(get_number_config(config, 'record_batch_size', records.DEFAULT_BATCH_SIZE))
 
+    file_metrics = stats.new_file_metrics()
+    opened_at = time.perf_counter()
     try:
         file_handle = conn.get_file_handle(f)
-    except OSError:
+    except OSError as e:
+        report.write_event('file_skipped', stream=table_spec.get('table_name'), filepath=f['filepath'],
+                           retries=stats.pop_retries(f['filepath']), reason=str(e) or type(e).__name__)
         return 0
+    file_handle = stats.MeteredStream(file_handle, file_metrics, 'wire_bytes', 'download_time', opened_at=opened_at)
 
     # Add file_name to opts and flag infer_compression to support gzipped files
     opts = {'key_properties': table_spec['key_properties'],
             'delimiter': table_spec['delimiter'],
             'file_name': f['filepath']}
 
-    readers = csv.get_row_iterators(file_handle, options=opts, infer_compression=True, encoding_format=encoding_format)
+    readers = get_row_iterators(file_handle, opts, encoding_format, file_metrics)
 
     records_synced = 0
 
-    for reader in readers:
-        with Transformer() as transformer:
-            for row in reader:
-                custom_columns = {
-                    '_sdc_source_file': f["filepath"],
-
-                    # index zero, +1 for header row
-                    '_sdc_source_lineno': records_synced + 2
-                }
-                rec = {**row, **custom_columns}
-
-                to_write = transformer.transform(rec, stream.schema.to_dict(), metadata.to_map(stream.metadata))
-
-                write_record(stream.tap_stream_id, to_write, ensure_ascii=False)
-                records_synced += 1
-
-    stats.add_file_data(table_spec, f['filepath'], f['last_modified'], records_synced)
+    loop_started_at = time.perf_counter()
+    with memory.track_memory(config, f['filepath'], file_metrics), \
+         FileProgress(table_spec.get('table_name'), f, file_metrics, progress_interval) as progress:
+        for reader in readers:
+            # the columns deselected in the metadata are left out of the rows already, so the
+            # records are transformed against the schema of the selected columns only
+            columns, schema, mdata, with_source_file, with_source_lineno = records.get_projection(stream)
+            # index zero, +1 for header row
+            batches = records.iter_record_batches(records.project_rows(reader, columns), batch_size, f["filepath"],
+                                                  records_synced + 2, with_source_file, with_source_lineno)
+
+            if pool is not None:
+                # the time spent in the workers, over the time of the loop
+                for lines, count, transform_time, serialize_time in pool.imap(batches):
+                    write_lines(lines)
+                    file_metrics['transform_time'] += transform_time
+                    file_metrics['serialize_time'] += serialize_time
+                    records_synced += count
+                    progress.increment(count)
+                continue
+
+            with (transformer or Transformer()) as row_transformer:
+                for batch in batches:
+                    started_at = time.perf_counter()
+                    to_write = records.transform_batch(row_transformer, batch, schema, mdata)
+                    transformed_at = time.perf_counter()
+
+                    write_records(stream.tap_stream_id, to_write, ensure_ascii=False)
+                    file_metrics['transform_time'] += transformed_at - started_at
+                    file_metrics['serialize_time'] += time.perf_counter() - transformed_at
+                    records_synced += len(batch)
+                    progress.increment(len(batch))
+
+    stats.finalize_file_metrics(file_metrics, time.perf_counter() - loop_started_at)
+    stats.add_file_data(table_spec, f['filepath'], f['last_modified'], records_synced, file_metrics)
 
     return records_synced
@@ -0,0 +1,124 @@
+"""
+Transform and serialization of the records of a stream in a pool of processes.
+
+With "transform_workers": N in the config, the batches of rows read by the sync loop are
+sent to N worker processes, which transform them and serialize them to the lines of their
+RECORD messages, and the lines are written in the order the rows were read. The schema of
+the stream is sent to every worker once, when the worker starts, and the batches only
+carry their rows. The counts of the parse caches of the workers come back with their
+batches, to be logged once the stream is synced.
+
+The workers are started from a fork server, not forked from the sync process, as the
+sync process runs other threads (event loop, memory sampler...) when the pool starts.
+"""
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from singer import Transformer
+from singer.transform import SchemaMismatch
+from tap_sftp import memo
+from tap_sftp import records
+from tap_sftp.helper import format_records, get_boolean_config, get_number_config
+
+# batches sent to the pool ahead of the one written, per worker
+PENDING_BATCHES_PER_WORKER = 2
+
+# state of a worker process, set once by 'initialize_worker'
+WORKER = {}
+
+
+def initialize_worker(stream_name, schema, mdata, cache_size):
+    WORKER['stream_name'] = stream_name
+    WORKER['schema'] = schema
+    WORKER['mdata'] = mdata
+    WORKER['transformer'] = memo.MemoTransformer(stream_name, cache_size) if cache_size else Transformer()
+
+
+def get_cache_counts():
+    transformer = WORKER['transformer']
+    return transformer.get_cache_counts() if isinstance(transformer, memo.MemoTransformer) else {}
+
+
+def transform_and_serialize(batch):
+    """
+    Returns the lines of the records of 'batch', the row count, the transform and serialize
+    times, and the process id of the worker with the counts of its parse caches.
+    """
+    started_at = time.perf_counter()
+    try:
+        to_write = records.transform_batch(WORKER['transformer'], batch, WORKER['schema'], WORKER['mdata'])
+    except SchemaMismatch as e:
+        # 'SchemaMismatch' cannot be rebuilt from its message when sent back to the sync process
+        raise Exception(str(e)) from None
+    transformed_at = time.perf_counter()
+    lines = format_records(WORKER['stream_name'], to_write, ensure_ascii=False)
+    return (lines, len(batch), transformed_at - started_at, time.perf_counter() - transformed_at,
+            (os.getpid(), get_cache_counts()))
+
+
+def get_mp_context():
+    # the fork server is not available on every platform
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class TransformPool():
+    """ Pool of 'worker_count' processes transforming and serializing the batches of a stream. """
+
+    def __init__(self, stream, worker_count, cache_size=None):
+        _, schema, mdata, _, _ = records.get_projection(stream)
+        self.max_pending = PENDING_BATCHES_PER_WORKER * worker_count
+        # latest counts of the parse caches of every worker, by process id
+        self.cache_counts = {}
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=worker_count,
+                                                               mp_context=get_mp_context(),
+                                                               initializer=initialize_worker,
+                                                               initargs=(stream.tap_stream_id, schema, mdata, cache_size))
+
+    def get_result(self, future):
+        *result, (pid, cache_counts) = future.result()
+        self.cache_counts[pid] = cache_counts
+        return tuple(result)
+
+    def imap(self, batches):
+        """
+        Yields the results of 'transform_and_serialize' for 'batches' in their order, with at
+        most 'max_pending' batches in the pool so the rows are not read much ahead.
+        """
+        pending = collections.deque()
+        try:
+            for batch in batches:
+                pending.append(self.executor.submit(transform_and_serialize, batch))
+                if len(pending) >= self.max_pending:
+                    yield self.get_result(pending.popleft())
+            while pending:
+                yield self.get_result(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def log_cache_summary(self):
+        """ Logs the parse caches of the stream, summed over the workers. """
+        totals = {}
+        for cache_counts in self.cache_counts.values():
+            for name, (lookups, hits, enabled) in cache_counts.items():
+                total_lookups, total_hits, any_enabled = totals.get(name, (0, 0, False))
+                totals[name] = (total_lookups + lookups, total_hits + hits, any_enabled or enabled)
+        memo.log_cache_summary(totals)
+
+
+def get_transform_pool(config, stream):
+    """ Returns a 'TransformPool' when the "transform_workers" config is set, None otherwise. """
+    worker_count = int(get_number_config(config, 'transform_workers', 0))
+    if not worker_count:
+        return None
+    cache_size = None
+    if get_boolean_config(config, 'memoize_parsing', True):
+        cache_size = int(get_number_config(config, 'parse_cache_size', memo.DEFAULT_CACHE_SIZE))
+    return TransformPool(stream, worker_count, cache_size)
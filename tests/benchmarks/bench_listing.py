@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the memory and time taken to plan a sync over a large listing.
+
+Holds the same synthetic listing as the file dicts the connections used to return, with
+a tz-aware datetime per file, and as 'client.FileEntry', then filters and sorts them the
+way 'Connection.get_files' does for each representation.
+
+    $ pip install -e .
+    $ python tests/benchmarks/bench_listing.py --files 1000000 --output bench_listing.json
+"""
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytz
+
+from tap_sftp import client
+
+START_TIME = 1577836800
+MODIFIED_SINCE = datetime(2020, 6, 1, tzinfo=pytz.UTC)
+
+
+def generate_listing(file_count, seed=0):
+    """ Yields (filepath, epoch mtime, size) of files modified in random order over a year. """
+    rand = random.Random(seed)
+    for file_number in range(file_count):
+        yield ('/data/dir_{}/file_{}.csv'.format(file_number % 100, file_number),
+               START_TIME + rand.random() * 365 * 86400,
+               rand.randint(1, 10 * 1024 * 1024))
+
+
+def get_file_dict(filepath, mtime, size):
+    """ The file dict the connections returned before 'client.FileEntry'. """
+    return {"filepath": filepath,
+            "last_modified": datetime.utcfromtimestamp(mtime).replace(tzinfo=pytz.UTC),
+            "size": size}
+
+
+def plan_dicts(files):
+    files = [f for f in files if f["last_modified"] > MODIFIED_SINCE]
+    return sorted(files, key=lambda x: (x['last_modified']).timestamp())
+
+
+def plan_entries(files):
+    modified_since = MODIFIED_SINCE.timestamp()
+    files = [f for f in files if f.mtime > modified_since]
+    return sorted(files, key=lambda f: f.mtime)
+
+
+REPRESENTATIONS = {
+    'dict': (get_file_dict, plan_dicts),
+    'file_entry': (client.FileEntry, plan_entries),
+}
+
+
+def bench_representation(name, file_count):
+    make_file, plan = REPRESENTATIONS[name]
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    files = [make_file(*listed) for listed in generate_listing(file_count)]
+    build_time = time.perf_counter() - started_at
+    listing_bytes = tracemalloc.get_traced_memory()[0]
+
+    started_at = time.perf_counter()
+    planned = plan(files)
+    plan_time = time.perf_counter() - started_at
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'representation': name,
+            'file_count': file_count,
+            'planned_count': len(planned),
+            'listing_bytes': listing_bytes,
+            'bytes_per_file': listing_bytes / file_count,
+            'peak_bytes': peak_bytes,
+            'build_time': build_time,
+            'plan_time': plan_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=1000000, help='files in the listing')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    results = []
+    print('{:<12} {:>14} {:>12} {:>14} {:>10} {:>10}'.format(
+        'listing', 'listing MB', 'bytes/file', 'peak MB', 'build s', 'plan s'))
+    for name in REPRESENTATIONS:
+        result = bench_representation(name, args.files)
+        results.append(result)
+        print('{representation:<12} {:>14.1f} {bytes_per_file:>12.0f} {:>14.1f} {build_time:>10.3f} {plan_time:>10.3f}'.format(
+            result['listing_bytes'] / 1024 / 1024, result['peak_bytes'] / 1024 / 1024, **result))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the record hot path, without any network.
+
+Drives 'sync.sync_file' with an in-memory file handle (patched in the same way as
+tests/unittests/test_timeout.py) and 'helper.write_record' with a null stdout, over
+narrow and wide schemas, string-heavy and datetime-heavy columns and different
+encodings. Reports the per-row cost of the parse, transform and serialize stages
+from the timings 'sync_file' records in 'stats.STATS'.
+
+    $ pip install -e .
+    $ python tests/benchmarks/bench_record_path.py --rows 20000 --output bench_record_path.json
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from unittest import mock
+
+from singer import metadata
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+from singer_encodings import json_schema
+
+from tap_sftp import client, helper, memo, stats, sync, workers
+
+SHAPES = {
+    # name: (column count, kind of the columns)
+    'narrow-string': (5, 'string'),
+    'narrow-datetime': (5, 'datetime'),
+    'wide-string': (100, 'string'),
+    'wide-datetime': (100, 'datetime'),
+    # timestamps repeating every 1000 rows, as the parse caches of 'memo.MemoTransformer' expect
+    'wide-repeated-datetime': (100, 'repeated-datetime'),
+}
+ENCODINGS = ['utf-8', 'latin_1', 'utf-16']
+TABLE_NAME = 'bench'
+
+
+class NullWriter(io.TextIOBase):
+    def write(self, s):
+        return len(s)
+
+
+def get_csv_bytes(shape, row_count, encoding):
+    column_count, kind = SHAPES[shape]
+    headers = ['id'] + ['col_{}'.format(i) for i in range(column_count - 1)]
+    start = datetime(2020, 1, 1)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(headers)
+    for row_id in range(row_count):
+        if kind == 'datetime':
+            values = [(start + timedelta(minutes=row_id + i)).isoformat() for i in range(column_count - 1)]
+        elif kind == 'repeated-datetime':
+            values = [(start + timedelta(minutes=row_id % 1000 + i)).isoformat() for i in range(column_count - 1)]
+        else:
+            values = ['välue {} of row {}'.format(i, row_id) for i in range(column_count - 1)]
+        writer.writerow([row_id] + values)
+    return output.getvalue().encode(encoding)
+
+
+def get_stream(shape, data, encoding):
+    """ Builds the catalog entry the same way discovery would, from a sample of the file. """
+    conn = mock.Mock()
+    conn.get_file_handle.side_effect = lambda f: io.BytesIO(data)
+    conn.get_files.return_value = [{'filepath': '/bench/file.csv', 'last_modified': datetime(2020, 1, 1)}]
+    table_spec = get_table_spec(shape)
+    schema = json_schema.get_schema_for_table(conn, table_spec, encoding)
+    return CatalogEntry(tap_stream_id=TABLE_NAME,
+                        stream=TABLE_NAME,
+                        schema=Schema.from_dict(schema),
+                        metadata=metadata.get_standard_metadata(schema, key_properties=['id']))
+
+
+def get_table_spec(shape):
+    column_count, kind = SHAPES[shape]
+    table_spec = {'table_name': TABLE_NAME,
+                  'search_prefix': '/bench',
+                  'search_pattern': 'file.csv',
+                  'key_properties': ['id'],
+                  'delimiter': ','}
+    if kind in ('datetime', 'repeated-datetime'):
+        # discovery only types a column as date-time when it is overridden
+        table_spec['date_overrides'] = ['col_{}'.format(i) for i in range(column_count - 1)]
+    return table_spec
+
+
+def bench_sync_file(shape, encoding, row_count, memoize=False, worker_count=0):
+    data = get_csv_bytes(shape, row_count, encoding)
+    stream = get_stream(shape, data, encoding)
+    f = {'filepath': '/bench/file.csv', 'last_modified': datetime(2020, 1, 1), 'size': len(data)}
+    conn = client.SFTPConnection('10.0.0.1', 'username', port='22')
+
+    stats.STATS.clear()
+    with mock.patch('tap_sftp.client.SFTPConnection.get_file_handle', return_value=io.BytesIO(data)), \
+         redirect_stdout(NullWriter()):
+        started_at = time.perf_counter()
+        transformer = memo.MemoTransformer(TABLE_NAME) if memoize else None
+        pool = workers.get_transform_pool({'transform_workers': worker_count, 'memoize_parsing': memoize}, stream)
+        try:
+            rows = sync.sync_file(conn, f, stream, get_table_spec(shape), encoding, transformer=transformer, pool=pool)
+        finally:
+            if pool is not None:
+                pool.close()
+        total_time = time.perf_counter() - started_at
+
+    file_data = stats.STATS[TABLE_NAME]['files'][f['filepath']]
+    result = {'shape': shape, 'encoding': encoding, 'rows': rows, 'bytes': len(data),
+              'total_us_per_row': total_time / rows * 1e6}
+    for stage in ['download_time', 'decompress_time', 'parse_time', 'transform_time', 'serialize_time']:
+        result[stage.replace('_time', '_us_per_row')] = file_data[stage] / rows * 1e6
+    return result
+
+
+def bench_write_record(shape, row_count):
+    column_count, kind = SHAPES[shape]
+    value = datetime(2020, 1, 1).isoformat() if kind == 'datetime' else 'välue'
+    record = {'col_{}'.format(i): value for i in range(column_count)}
+
+    with redirect_stdout(NullWriter()):
+        started_at = time.perf_counter()
+        for _ in range(row_count):
+            helper.write_record(TABLE_NAME, record, ensure_ascii=False)
+        total_time = time.perf_counter() - started_at
+    return {'shape': shape, 'rows': row_count, 'us_per_row': total_time / row_count * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows per benchmark')
+    parser.add_argument('--shapes', nargs='+', default=list(SHAPES), choices=list(SHAPES))
+    parser.add_argument('--encodings', nargs='+', default=ENCODINGS)
+    parser.add_argument('--memoize', action='store_true', help="parse with the caches of 'memo.MemoTransformer'")
+    parser.add_argument('--workers', type=int, default=0, help="transform and serialize in a pool of processes")
+    parser.add_argument('--output', help='JSON file the results are written to')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    results = {'sync_file': [], 'write_record': []}
+    print('{:<18} {:<9} {:>10} {:>10} {:>10} {:>10}  (us/row)'.format(
+        'sync_file', 'encoding', 'parse', 'transform', 'serialize', 'total'))
+    for shape, encoding in itertools.product(args.shapes, args.encodings):
+        result = bench_sync_file(shape, encoding, args.rows, args.memoize, args.workers)
+        results['sync_file'].append(result)
+        print('{shape:<18} {encoding:<9} {parse_us_per_row:>10.2f} {transform_us_per_row:>10.2f} '
+              '{serialize_us_per_row:>10.2f} {total_us_per_row:>10.2f}'.format(**result))
+
+    print('\n{:<18} {:>10}  (us/row)'.format('write_record', 'total'))
+    for shape in args.shapes:
+        result = bench_write_record(shape, args.rows)
+        results['write_record'].append(result)
+        print('{shape:<18} {us_per_row:>10.2f}'.format(**result))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
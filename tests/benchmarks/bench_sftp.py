@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Self-contained end to end benchmark of discovery and sync.
+
+Generates synthetic CSV, gzip and zip corpora of different sizes, file counts and
+directory depths, serves each one from an in-process SFTP server and runs the tap
+against it. Every scenario runs in a fresh process so its peak RSS can be measured.
+
+With "--backends memory" the corpus is loaded into an in-memory connection instead,
+which takes the network and the SSH encryption out of the measurements.
+
+    $ pip install -e .
+    $ python tests/benchmarks/bench_sftp.py --output bench.json
+    $ python tests/benchmarks/bench_sftp.py --output bench_new.json --compare bench.json
+
+NB: the SFTP server runs in the benchmarking process, so the peak RSS only covers the tap.
+"""
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import string
+import sys
+import tempfile
+import time
+import zipfile
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from sftp_server import LocalSFTPServer
+
+FORMATS = ['csv', 'gz', 'zip']
+BACKENDS = ['sftp', 'memory']
+DEFAULT_ROWS = [1000, 100000]
+DEFAULT_FILE_COUNTS = [1, 100]
+DEFAULT_DEPTHS = [0, 3]
+SEARCH_PREFIX = '/data'
+TABLE_NAME = 'bench'
+
+
+class NullWriter(io.TextIOBase):
+    """ Stands in for stdout and only counts what the tap writes. """
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, s):
+        self.bytes_written += len(s)
+        return len(s)
+
+
+def generate_rows(row_count, seed):
+    rand = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    for row_id in range(row_count):
+        yield [row_id,
+               ''.join(rand.choices(string.ascii_letters, k=12)),
+               rand.randint(0, 1000000),
+               round(rand.random() * 1000, 4),
+               (start + timedelta(seconds=row_id)).isoformat()]
+
+
+def get_csv_bytes(row_count, seed):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['id', 'name', 'quantity', 'price', 'updated_at'])
+    writer.writerows(generate_rows(row_count, seed))
+    return output.getvalue().encode('utf-8')
+
+
+def generate_corpus(root_dir, file_format, rows_per_file, file_count, depth):
+    """ Writes 'file_count' files spread over directories nested 'depth' levels deep. Returns the corpus size. """
+    corpus_bytes = 0
+    for file_number in range(file_count):
+        # spread the files over the leaves of a binary directory tree
+        dirs = ['dir_{}'.format((file_number >> level) & 1) for level in range(depth)]
+        directory = os.path.join(root_dir, SEARCH_PREFIX.lstrip('/'), *dirs)
+        os.makedirs(directory, exist_ok=True)
+
+        data = get_csv_bytes(rows_per_file, file_number)
+        name = 'file_{}.csv'.format(file_number)
+        if file_format == 'gz':
+            name += '.gz'
+            data = gzip.compress(data)
+        elif file_format == 'zip':
+            name = 'file_{}.zip'.format(file_number)
+            output = io.BytesIO()
+            with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                zip_file.writestr('file_{}.csv'.format(file_number), data)
+            data = output.getvalue()
+
+        with open(os.path.join(directory, name), 'wb') as corpus_file:
+            corpus_file.write(data)
+        corpus_bytes += len(data)
+    return corpus_bytes
+
+
+def get_config(port):
+    return {
+        'host': '127.0.0.1',
+        'port': port,
+        'username': 'bench',
+        'password': 'bench',
+        'start_date': '2000-01-01T00:00:00Z',
+        'tables': json.dumps([{
+            'table_name': TABLE_NAME,
+            'search_prefix': SEARCH_PREFIX,
+            'search_pattern': r'file_\d+\.(csv|csv\.gz|zip)$',
+            'key_properties': ['id'],
+            'delimiter': ','
+        }])
+    }
+
+
+def load_corpus(root_dir):
+    """ Returns the files of the corpus as {filepath: (data, last_modified)} for 'client.MemoryConnection'. """
+    files = {}
+    for directory, _, names in os.walk(root_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as corpus_file:
+                files['/' + os.path.relpath(path, root_dir)] = (corpus_file.read(), os.stat(path).st_mtime)
+    return files
+
+
+def run_tap(config, results, memory_root_dir=None):
+    """ Runs discovery and sync in the current process and puts the measurements in 'results'. """
+    # imported here so only the child process pays for importing the tap
+    from singer import metadata
+    from singer.catalog import Catalog
+    import tap_sftp
+    from tap_sftp import client, stats
+
+    logging.disable(logging.INFO)
+
+    if memory_root_dir:
+        files = load_corpus(memory_root_dir)
+        client.register_backend('memory', lambda config: client.MemoryConnection(files))
+
+    discover_output = io.StringIO()
+    started_at = time.perf_counter()
+    with redirect_stdout(discover_output):
+        tap_sftp.do_discover(config)
+    discover_time = time.perf_counter() - started_at
+
+    catalog = json.loads(discover_output.getvalue())
+    for stream in catalog['streams']:
+        mdata = metadata.to_map(stream['metadata'])
+        mdata = metadata.write(mdata, (), 'selected', True)
+        stream['metadata'] = metadata.to_list(mdata)
+
+    null_writer = NullWriter()
+    started_at = time.perf_counter()
+    with redirect_stdout(null_writer):
+        tap_sftp.do_sync(config, Catalog.from_dict(catalog), {})
+    sync_time = time.perf_counter() - started_at
+
+    totals = stats.get_table_totals(stats.STATS[TABLE_NAME])
+    results.put({
+        'discover_time': discover_time,
+        'sync_time': sync_time,
+        'listing_time': stats.STATS[TABLE_NAME]['listing_time'],
+        'record_count': totals['row_count'],
+        'file_count': totals['file_count'],
+        'wire_bytes': totals['wire_bytes'],
+        'decompressed_bytes': totals['decompressed_bytes'],
+        'output_bytes': null_writer.bytes_written,
+        # kilobytes on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+
+def run_child(config, memory_root_dir=None):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_tap, args=(config, results, memory_root_dir))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return None
+    return results.get()
+
+
+def run_scenario(backend, file_format, rows_per_file, file_count, depth):
+    with tempfile.TemporaryDirectory() as root_dir:
+        corpus_bytes = generate_corpus(root_dir, file_format, rows_per_file, file_count, depth)
+        if backend == 'memory':
+            result = run_child({**get_config(None), 'protocol': 'memory'}, memory_root_dir=root_dir)
+        else:
+            with LocalSFTPServer(root_dir) as server:
+                result = run_child(get_config(server.port))
+        if result is None:
+            raise Exception("Benchmark of {}-{}-{}rows-{}files-depth{} failed".format(
+                backend, file_format, rows_per_file, file_count, depth))
+
+    result.update({
+        'backend': backend,
+        'format': file_format,
+        'rows_per_file': rows_per_file,
+        'file_count': file_count,
+        'depth': depth,
+        'corpus_bytes': corpus_bytes,
+        'records_per_second': result['record_count'] / result['sync_time'],
+        'mb_per_second': result['decompressed_bytes'] / result['sync_time'] / 1024 / 1024,
+    })
+    return result
+
+
+def get_scenario_name(result):
+    name = '{format}-{rows_per_file}rows-{file_count}files-depth{depth}'.format(**result)
+    # keep the names of the SFTP scenarios comparable with results of earlier versions
+    if result['backend'] != 'sftp':
+        name = result['backend'] + '-' + name
+    return name
+
+
+def compare(results, previous_path):
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)['scenarios']
+
+    print('{:<40} {:>14} {:>14} {:>14}'.format('scenario', 'records/sec', 'MB/sec', 'peak RSS'))
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        changes = []
+        for key in ['records_per_second', 'mb_per_second', 'peak_rss_kb']:
+            changes.append('{:+.1%}'.format(result[key] / previous[name][key] - 1))
+        print('{:<40} {:>14} {:>14} {:>14}'.format(name, *changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='JSON file the results are written to')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare the results with')
+    parser.add_argument('--backends', nargs='+', default=['sftp'], choices=BACKENDS)
+    parser.add_argument('--formats', nargs='+', default=FORMATS, choices=FORMATS)
+    parser.add_argument('--rows', nargs='+', type=int, default=DEFAULT_ROWS, help='rows per file')
+    parser.add_argument('--files', nargs='+', type=int, default=DEFAULT_FILE_COUNTS, help='file counts')
+    parser.add_argument('--depths', nargs='+', type=int, default=DEFAULT_DEPTHS, help='directory depths')
+    args = parser.parse_args()
+
+    # the tap does not close its connections, which the server logs as resets
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+
+    results = {}
+    for scenario in itertools.product(args.backends, args.formats, args.rows, args.files, args.depths):
+        result = run_scenario(*scenario)
+        name = get_scenario_name(result)
+        results[name] = result
+        print('{:<40} {:>12.0f} records/sec {:>8.2f} MB/sec {:>8.3f}s listing {:>8} KB peak RSS'.format(
+            name, result['records_per_second'], result['mb_per_second'],
+            result['listing_time'], result['peak_rss_kb']))
+
+    with open(args.output, 'w') as output_file:
+        json.dump({'created_at': datetime.utcnow().isoformat(),
+                   'python': sys.version,
+                   'scenarios': results}, output_file, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
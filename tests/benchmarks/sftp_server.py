@@ -0,0 +1,119 @@
+"""
+In-process SFTP server serving a local directory, so the tap can be benchmarked
+end to end without the dockerized server from bin/test-server.
+
+    with LocalSFTPServer(root_dir) as server:
+        config = {'host': server.host, 'port': server.port, ...}
+"""
+import os
+import socket
+import threading
+import paramiko
+
+
+class StubServer(paramiko.ServerInterface):
+    """ Accepts any username and password. """
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class StubSFTPHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class StubSFTPServer(paramiko.SFTPServerInterface):
+    """ Read-only SFTP server rooted at 'root_dir'. """
+
+    def __init__(self, server, *args, root_dir=None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root_dir = root_dir
+
+    def _realpath(self, path):
+        return os.path.join(self.root_dir, self.canonicalize(path).lstrip('/'))
+
+    def list_folder(self, path):
+        path = self._realpath(path)
+        try:
+            attributes = []
+            for filename in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, filename)))
+                attr.filename = filename
+                attributes.append(attr)
+            return attributes
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._realpath(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        try:
+            readfile = open(self._realpath(path), 'rb')
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = StubSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = readfile
+        return handle
+
+
+class LocalSFTPServer():
+    """ Serves 'root_dir' over SFTP on a free port of 127.0.0.1 from a background thread. """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.host = '127.0.0.1'
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, 0))
+        self.port = self.sock.getsockname()[1]
+        self.transports = []
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    def __enter__(self):
+        self.sock.listen(100)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+    def serve(self):
+        while True:
+            try:
+                client_sock, _ = self.sock.accept()
+            except OSError:
+                # the listening socket was closed
+                return
+            transport = paramiko.Transport(client_sock)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, StubSFTPServer, root_dir=self.root_dir)
+            transport.start_server(server=StubServer())
+            self.transports.append(transport)
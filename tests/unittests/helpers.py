@@ -0,0 +1,67 @@
+""" Fixtures shared by the unit tests. """
+import os
+import threading
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+from singer import metadata
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+from tap_sftp import listing
+
+TABLE_SPEC = {
+    "table_name": "test_table",
+    "search_prefix": "/root",
+    "search_pattern": "file.*",
+    "key_properties": ["id"],
+    "delimiter": ","
+}
+CSV_DATA = b"id,name\n1,a\n2,b\n3,c\n"
+
+def get_stream(deselected=()):
+    schema = {"type": "object", "properties": {"id": {"type": ["null", "integer", "string"]},
+                                               "name": {"type": ["null", "string"]},
+                                               "amount": {"type": ["null", "number", "string"]},
+                                               "_sdc_extra": {"type": "array", "items": {"type": "string"}},
+                                               "_sdc_source_file": {"type": "string"},
+                                               "_sdc_source_lineno": {"type": "integer"}}}
+    mdata = metadata.to_map(metadata.get_standard_metadata(schema, key_properties=["id"]))
+    for column in deselected:
+        mdata = metadata.write(mdata, ("properties", column), "selected", False)
+    return CatalogEntry(tap_stream_id="test_table",
+                        stream="test_table",
+                        schema=Schema.from_dict(schema),
+                        metadata=metadata.to_list(mdata))
+
+def get_plan(files):
+    plan = listing.FilePlan()
+    for f in files:
+        plan.add(listing.FileEntry.from_dict(f))
+    return plan
+
+def write_file(root_dir, path, data, mtime=None):
+    path = os.path.join(root_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime:
+        os.utime(path, (mtime, mtime))
+
+class LocalFTPServer():
+    """ pyftpdlib server serving 'root_dir' from a background thread. """
+
+    def __init__(self, root_dir, handler=FTPHandler):
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("username", "password", root_dir, perm="elr")
+        handler.authorizer = authorizer
+        self.server = FTPServer(("127.0.0.1", 0), handler)
+        self.port = self.server.address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"timeout": 0.1})
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.close_all()
+        self.thread.join()
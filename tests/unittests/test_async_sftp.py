@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+import io
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from datetime import datetime
+import asyncssh
+import pytz
+from singer_encodings import csv
+from tap_sftp import client
+from .helpers import CSV_DATA, write_file
+
+class LocalAsyncSFTPServer():
+    """ asyncssh SFTP server chrooted to 'root_dir', accepting any password, running on its own event loop. """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+
+    async def listen(self):
+        return await asyncssh.listen('127.0.0.1', 0,
+                                     server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+                                     server_factory=PasswordServer,
+                                     sftp_factory=lambda chan: asyncssh.SFTPServer(chan, chroot=self.root_dir.encode()))
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(self.listen(), self.loop).result()
+        self.port = self.server.get_port()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+class PasswordServer(asyncssh.SSHServer):
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return True
+
+class TestAsyncSFTPConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        write_file(self.root_dir.name, "export/file1.csv", CSV_DATA, mtime=1577836800)
+        write_file(self.root_dir.name, "export/nested/file2.csv.gz", gzip.compress(CSV_DATA), mtime=1577923200)
+        zip_data = io.BytesIO()
+        with zipfile.ZipFile(zip_data, "w") as zip_file:
+            zip_file.writestr("file3.csv", CSV_DATA)
+        write_file(self.root_dir.name, "export/file3.zip", zip_data.getvalue(), mtime=1578009600)
+        write_file(self.root_dir.name, "export/empty.csv", b"")
+        self.server = LocalAsyncSFTPServer(self.root_dir.name).__enter__()
+        self.conn = client.connection({"sftp_engine": "asyncio",
+                                       "host": "127.0.0.1",
+                                       "port": self.server.port,
+                                       "username": "username",
+                                       "password": "password",
+                                       # small chunks so the files are read in several of them
+                                       "sftp_read_chunk_size": 7,
+                                       "sftp_read_ahead_chunks": 2})
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.__exit__(None, None, None)
+        self.root_dir.cleanup()
+
+    def test_get_files_by_prefix(self):
+        files = sorted(self.conn.get_files_by_prefix("/export"), key=lambda f: f["filepath"])
+
+        self.assertEqual([f["filepath"] for f in files],
+                         ["/export/file1.csv", "/export/file3.zip", "/export/nested/file2.csv.gz"])
+        self.assertEqual(files[0]["last_modified"], datetime(2020, 1, 1, tzinfo=pytz.UTC))
+        self.assertEqual(files[0]["size"], len(CSV_DATA))
+
+    def test_listing_longer_than_a_request(self):
+        sftp = self.conn.get_sftp()
+        readdir = sftp.readdir
+
+        async def slow_readdir(path):
+            await asyncio.sleep(0.3)
+            return await readdir(path)
+
+        sftp.readdir = slow_readdir
+        self.conn.request_timeout = 0.5
+
+        # the nested directory is listed after its parent, 0.6 seconds in total
+        self.assertEqual(len(self.conn.get_files_by_prefix("/export")), 3)
+
+    def test_listing_stopped_when_a_directory_fails(self):
+        for name in ("slow1", "slow2"):
+            write_file(self.root_dir.name, "export/{}/file.csv".format(name), CSV_DATA)
+        sftp = self.conn.get_sftp()
+        readdir = sftp.readdir
+        finished = []
+
+        async def failing_readdir(path):
+            if path == "/export/nested":
+                raise asyncssh.SFTPNoSuchFile("gone")
+            if path != "/export":
+                await asyncio.sleep(0.2)
+            entries = await readdir(path)
+            finished.append(path)
+            return entries
+
+        sftp.readdir = failing_readdir
+
+        with self.assertRaises(Exception) as context:
+            self.conn.get_files_by_prefix("/export")
+        time.sleep(0.4)
+
+        self.assertEqual(str(context.exception), "Directory '/export/nested' does not exist")
+        # the other directories were not listed after the failure
+        self.assertEqual(finished, ["/export"])
+        self.assertEqual(self.conn.listing_controller.window_count, 2)
+
+    def test_missing_directory(self):
+        with self.assertRaises(Exception) as context:
+            self.conn.get_files_by_prefix("/missing")
+
+        self.assertEqual(str(context.exception), "Directory '/missing' does not exist")
+
+    def test_stat(self):
+        self.assertEqual(self.conn.stat("/export/file1.csv")["size"], len(CSV_DATA))
+        with self.assertRaises(FileNotFoundError):
+            self.conn.stat("/export/missing.csv")
+
+    def test_read_files(self):
+        for f in self.conn.get_files_by_prefix("/export"):
+            file_handle = self.conn.get_file_handle(f)
+            rows = []
+            for reader in csv.get_row_iterators(file_handle, options={"file_name": f["filepath"]}, infer_compression=True):
+                rows += list(reader)
+            file_handle.close()
+
+            self.assertEqual(rows, [{"id": "1", "name": "a"},
+                                    {"id": "2", "name": "b"},
+                                    {"id": "3", "name": "c"}])
+
+    def test_read_and_readline(self):
+        file_handle = self.conn.get_file_handle({"filepath": "/export/file1.csv"})
+
+        self.assertEqual(file_handle.readline(), b"id,name\n")
+        self.assertEqual(file_handle.read(3), b"1,a")
+        self.assertEqual(file_handle.readline(2), b"\n")
+        self.assertEqual(file_handle.read(), b"2,b\n3,c\n")
+        self.assertEqual(file_handle.read(), b"")
+        file_handle.close()
+
+    def test_file_closed_before_the_end(self):
+        file_handle = self.conn.get_file_handle({"filepath": "/export/file1.csv"})
+        file_handle.readline()
+        file_handle.close()
+
+        # the connection is still usable
+        self.assertEqual(len(self.conn.get_files_by_prefix("/export")), 3)
+
+    def test_unreadable_file(self):
+        with self.assertRaises(OSError):
+            self.conn.get_file_handle({"filepath": "/export/missing.csv"})
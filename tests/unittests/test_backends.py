@@ -0,0 +1,110 @@
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from tap_sftp import client, stats, sync
+from .helpers import CSV_DATA, TABLE_SPEC, get_stream
+
+FILES = {
+    "/root/file1.csv": (CSV_DATA, 1577836800),
+    "/root/nested/file2.csv": (CSV_DATA, 1577923200),
+    "/root/empty.csv": (b"", 1577923200),
+    "/other/file3.csv": (CSV_DATA, 1577923200),
+}
+
+class TestMemoryConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = client.MemoryConnection(FILES)
+
+    def test_iter_files(self):
+        files = sorted(self.conn.iter_files("/root"), key=lambda f: f["filepath"])
+
+        self.assertEqual(files, [
+            {"filepath": "/root/file1.csv", "last_modified": datetime(2020, 1, 1, tzinfo=pytz.UTC), "size": len(CSV_DATA)},
+            {"filepath": "/root/nested/file2.csv", "last_modified": datetime(2020, 1, 2, tzinfo=pytz.UTC), "size": len(CSV_DATA)}
+        ])
+
+    def test_stat(self):
+        self.assertEqual(self.conn.stat("/root/file1.csv")["last_modified"], datetime(2020, 1, 1, tzinfo=pytz.UTC))
+        with self.assertRaises(FileNotFoundError):
+            self.conn.stat("/root/missing.csv")
+
+    def test_get_file_handle(self):
+        self.assertEqual(self.conn.get_file_handle({"filepath": "/root/file1.csv"}).read(), CSV_DATA)
+        with self.assertRaises(OSError):
+            self.conn.get_file_handle({"filepath": "/root/missing.csv"})
+
+    def test_capabilities(self):
+        self.assertIn(client.SEEKABLE_HANDLES, self.conn.capabilities)
+        self.assertNotIn(client.CONCURRENT_READS, client.FTPConnection.capabilities)
+
+class StreamedConnection(client.Connection):
+    """ Backend whose handles are not seekable, such as the FTP one. """
+
+    def __init__(self, files):
+        self.files = files
+        self.handles = []
+
+    def open_file_handle(self, f):
+        file_handle = mock.Mock(wraps=io.BytesIO(self.files[f["filepath"]]))
+        file_handle.seekable.return_value = False
+        self.handles.append(file_handle)
+        return file_handle
+
+class TestFileHandles(unittest.TestCase):
+
+    def test_zip_files_spooled(self):
+        conn = StreamedConnection({"/root/file.zip": b"zip data", "/root/file.csv": CSV_DATA})
+
+        file_handle = conn.get_file_handle({"filepath": "/root/file.zip"})
+
+        self.assertTrue(file_handle.seekable())
+        self.assertEqual(file_handle.read(), b"zip data")
+        conn.handles[0].close.assert_called_once()
+        # the other files are streamed
+        self.assertIs(conn.get_file_handle({"filepath": "/root/file.csv"}), conn.handles[1])
+
+    def test_seekable_handles_not_spooled(self):
+        conn = StreamedConnection({"/root/file.zip": b"zip data"})
+        conn.capabilities = frozenset([client.SEEKABLE_HANDLES])
+
+        self.assertIs(conn.get_file_handle({"filepath": "/root/file.zip"}), conn.handles[0])
+
+class TestRegisterBackend(unittest.TestCase):
+
+    def tearDown(self):
+        client.BACKENDS.pop("memory", None)
+
+    def test_unknown_protocol(self):
+        with self.assertRaises(Exception) as context:
+            client.connection({"protocol": "memory"})
+
+        self.assertEqual(str(context.exception),
+                         "Unknown protocol - memory. Enter one of ['sftp', 'ftp', 'ftps', 'local']")
+
+    def test_required_config_keys(self):
+        # the keys of the SSH connection are not needed by the other backends
+        self.assertIsInstance(client.connection({"protocol": "local"}), client.LocalConnection)
+        self.assertIsInstance(client.connection({"protocol": "ftp", "host": "10.0.0.1", "username": "username"}),
+                              client.FTPConnection)
+
+        with self.assertRaises(Exception) as context:
+            client.connection({"host": "10.0.0.1", "username": "username"})
+
+        self.assertEqual(str(context.exception), "Config is missing required keys: ['port']")
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_sync_from_registered_backend(self, mocked_stdout):
+        stats.STATS.clear()
+        client.register_backend("memory", lambda config: client.MemoryConnection(FILES))
+        config = {"protocol": "memory",
+                  "start_date": "2019-01-01T00:00:00Z",
+                  "tables": json.dumps([TABLE_SPEC])}
+
+        records_streamed = sync.sync_stream(config, {}, get_stream())
+
+        self.assertEqual(records_streamed, 6)
+        self.assertEqual(sorted(stats.STATS["test_table"]["files"]), ["/root/file1.csv", "/root/nested/file2.csv"])
@@ -0,0 +1,108 @@
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from tap_sftp import budget, client, stats, sync
+from .helpers import CSV_DATA, TABLE_SPEC, get_plan, get_stream
+
+FILES = [{"filepath": "/root/file{}.csv".format(i),
+          "last_modified": datetime(2020, 1, i, tzinfo=pytz.UTC),
+          "size": len(CSV_DATA)} for i in range(1, 6)]
+
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+@mock.patch("tap_sftp.client.connection")
+class TestBudget(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+
+    def tearDown(self):
+        budget.start_run({})
+
+    def sync(self, mocked_connection, config=None, table_spec=None):
+        conn = mocked_connection.return_value
+        conn.plan_files.return_value = get_plan(FILES)
+        conn.get_file_handle.side_effect = lambda f: io.BytesIO(CSV_DATA)
+        budget.start_run(config or {})
+        state = {}
+        sync.sync_stream({"start_date": "2019-01-01T00:00:00Z",
+                          "tables": json.dumps([{**TABLE_SPEC, **(table_spec or {})}])}, state, get_stream())
+        return conn, state
+
+    def test_run_max_files(self, mocked_connection, mocked_stdout):
+        conn, state = self.sync(mocked_connection, config={"max_files": "2"})
+
+        self.assertEqual(conn.get_file_handle.call_count, 2)
+        # the next run starts after the last synced file
+        self.assertEqual(state["bookmarks"]["test_table"]["modified_since"], "2020-01-02T00:00:00+00:00")
+        self.assertEqual(stats.get_backlog("test_table"),
+                         {"file_count": 3, "bytes": 3 * len(CSV_DATA), "reason": "run max_files of 2 reached"})
+
+    def test_table_max_bytes(self, mocked_connection, mocked_stdout):
+        # the file crossing the limit is still synced
+        conn, state = self.sync(mocked_connection, table_spec={"max_bytes": len(CSV_DATA) + 1})
+
+        self.assertEqual(conn.get_file_handle.call_count, 2)
+        self.assertEqual(stats.get_backlog("test_table")["reason"], "table max_bytes of {} reached".format(len(CSV_DATA) + 1))
+
+    @mock.patch("tap_sftp.budget.time.monotonic")
+    def test_run_max_run_time(self, mocked_monotonic, mocked_connection, mocked_stdout):
+        # the run and the table start at 0, then every file takes 10 seconds
+        mocked_monotonic.side_effect = [0, 0] + list(range(10, 100, 10))
+
+        conn, state = self.sync(mocked_connection, config={"max_run_time": 35})
+
+        # the run time is checked before each file, at 10, 20, 30 and 40 seconds
+        self.assertEqual(conn.get_file_handle.call_count, 3)
+        self.assertEqual(stats.get_backlog("test_table")["file_count"], 2)
+
+    def test_files_modified_at_the_same_time(self, mocked_connection, mocked_stdout):
+        files = [{**f, "last_modified": datetime(2020, 1, 1 if i < 3 else 2, tzinfo=pytz.UTC)}
+                 for i, f in enumerate(FILES)]
+        conn = mocked_connection.return_value
+        conn.plan_files.return_value = get_plan(files)
+        conn.get_file_handle.side_effect = lambda f: io.BytesIO(CSV_DATA)
+        budget.start_run({"max_files": 2})
+        state = {}
+
+        sync.sync_stream({"start_date": "2019-01-01T00:00:00Z", "tables": json.dumps([TABLE_SPEC])},
+                         state, get_stream())
+
+        # the third file has the time of the bookmark, the next run would not sync it
+        self.assertEqual(conn.get_file_handle.call_count, 3)
+        self.assertEqual(state["bookmarks"]["test_table"]["modified_since"], "2020-01-01T00:00:00+00:00")
+        self.assertEqual(stats.get_backlog("test_table")["file_count"], 2)
+
+    def test_unlimited(self, mocked_connection, mocked_stdout):
+        conn, state = self.sync(mocked_connection)
+
+        self.assertEqual(conn.get_file_handle.call_count, 5)
+        self.assertIsNone(stats.get_backlog("test_table"))
+
+
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+class TestBudgetRuns(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+
+    def tearDown(self):
+        budget.start_run({})
+
+    @mock.patch("tap_sftp.client.connection")
+    def test_no_file_lost_across_runs(self, mocked_connection, mocked_stdout):
+        conn = client.MemoryConnection({"/root/file{}.csv".format(i): (CSV_DATA, 1577836800) for i in range(5)})
+        mocked_connection.return_value = conn
+        config = {"start_date": "2019-01-01T00:00:00Z", "tables": json.dumps([TABLE_SPEC])}
+        state = {}
+        synced = []
+        conn.get_file_handle = mock.Mock(side_effect=lambda f: synced.append(f["filepath"]) or io.BytesIO(CSV_DATA))
+
+        for _ in range(3):
+            stats.STATS.clear()
+            budget.start_run({"max_files": 2})
+            sync.sync_stream(config, state, get_stream())
+
+        self.assertEqual(sorted(synced), sorted(conn.files))
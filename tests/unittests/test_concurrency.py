@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest import mock
+from tap_sftp.concurrency import AdaptiveSemaphore, ConcurrencyController
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+@mock.patch("tap_sftp.concurrency.LOGGER.info")
+class TestConcurrencyController(unittest.TestCase):
+
+    def run_window(self, controller, clock, items, latency=0.1, failed=False):
+        # one round of operations at the current limit, taking a second
+        clock.now += 1
+        for _ in range(controller.limit):
+            controller.record(latency, items=items, failed=failed)
+
+    def test_raised_while_throughput_improves(self, mocked_logger):
+        clock = FakeClock()
+        controller = ConcurrencyController("Listing", 2, 5, clock=clock)
+
+        for _ in range(10):
+            # the server serves 100 items a second per operation in flight
+            self.run_window(controller, clock, items=100)
+
+        self.assertEqual(controller.limit, 5)
+        mocked_logger.assert_any_call("%s concurrency %s -> %s, %s", "Listing", 2, 3, "throughput improved to 200.0/s")
+
+    def test_held_when_throughput_stops_improving(self, mocked_logger):
+        clock = FakeClock()
+        controller = ConcurrencyController("Listing", 2, 10, clock=clock)
+
+        self.run_window(controller, clock, items=100)
+        for _ in range(5):
+            # the link is saturated at 300 items a second
+            self.run_window(controller, clock, items=300 / controller.limit)
+
+        self.assertEqual(controller.limit, 4)
+
+    def test_lowered_on_failures_and_latency(self, mocked_logger):
+        clock = FakeClock()
+        controller = ConcurrencyController("Listing", 1, 16, clock=clock)
+        controller.limit = 16
+
+        self.run_window(controller, clock, items=100)
+        self.run_window(controller, clock, items=100, failed=True)
+        self.assertEqual(controller.limit, 8)
+
+        self.run_window(controller, clock, items=100, latency=0.5)
+        self.assertEqual(controller.limit, 7)
+
+        for _ in range(10):
+            self.run_window(controller, clock, items=0, failed=True)
+        # never below the floor
+        self.assertEqual(controller.limit, 1)
+
+    def test_raised_again_after_failures(self, mocked_logger):
+        clock = FakeClock()
+        controller = ConcurrencyController("Listing", 1, 8, clock=clock)
+        controller.limit = 8
+
+        self.run_window(controller, clock, items=100)
+        self.run_window(controller, clock, items=100, failed=True)
+        self.assertEqual(controller.limit, 4)
+
+        for _ in range(5):
+            self.run_window(controller, clock, items=100)
+        self.assertEqual(controller.limit, 8)
+
+    def test_raised_again_after_latency_rose(self, mocked_logger):
+        clock = FakeClock()
+        controller = ConcurrencyController("Listing", 1, 8, clock=clock)
+        controller.limit = 8
+
+        self.run_window(controller, clock, items=100)
+        self.run_window(controller, clock, items=100, latency=0.5)
+        self.assertEqual(controller.limit, 7)
+
+        for _ in range(2):
+            # the server stays slower, without serving less
+            self.run_window(controller, clock, items=100, latency=0.5)
+        self.assertEqual(controller.limit, 8)
+
+class TestAdaptiveSemaphore(unittest.TestCase):
+
+    def test_limit_respected(self):
+        controller = ConcurrencyController("Listing", 3, 3)
+        peak = 0
+
+        async def operation(semaphore):
+            nonlocal peak
+            await semaphore.acquire()
+            peak = max(peak, semaphore.in_flight)
+            await asyncio.sleep(0.001)
+            await semaphore.release(0.001)
+
+        async def run():
+            semaphore = AdaptiveSemaphore(controller)
+            await asyncio.gather(*[operation(semaphore) for _ in range(20)])
+            return semaphore
+
+        semaphore = asyncio.run(run())
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(semaphore.in_flight, 0)
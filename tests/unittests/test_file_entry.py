@@ -0,0 +1,42 @@
+import random
+import unittest
+from datetime import datetime
+import pytz
+from tap_sftp import client
+
+class TestFileEntry(unittest.TestCase):
+
+    def test_read_like_file_dict(self):
+        f = client.FileEntry("/root/file.csv", 1577836800.25, 10)
+
+        self.assertEqual(f["filepath"], "/root/file.csv")
+        self.assertEqual(f["last_modified"], datetime(2020, 1, 1, 0, 0, 0, 250000, tzinfo=pytz.UTC))
+        self.assertEqual(f.get("size"), 10)
+        self.assertIsNone(f.get("missing"))
+        self.assertIn("size", f)
+        with self.assertRaises(KeyError):
+            f["missing"]
+        self.assertEqual(f, {"filepath": "/root/file.csv",
+                             "last_modified": datetime(2020, 1, 1, 0, 0, 0, 250000, tzinfo=pytz.UTC),
+                             "size": 10})
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            client.FileEntry("/root/file.csv", 1577836800, 10).__dict__
+
+    def test_from_dict(self):
+        f = client.FileEntry.from_dict({"filepath": "/root/file.csv",
+                                        "last_modified": datetime(2020, 1, 1, tzinfo=pytz.UTC)})
+
+        self.assertEqual(f.mtime, 1577836800)
+        self.assertIsNone(f.size)
+
+    def test_compares_as_bookmark_datetime(self):
+        rand = random.Random(0)
+        for _ in range(10000):
+            mtime = rand.uniform(0, 2000000000)
+            f = client.FileEntry("/root/file.csv", mtime)
+            # the bookmark is the last modified time of the last synced file
+            bookmark = f.last_modified
+            self.assertEqual(f.mtime, bookmark.timestamp())
+            self.assertFalse(client.FileEntry("/root/file.csv", mtime).mtime > bookmark.timestamp())
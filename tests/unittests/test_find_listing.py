@@ -0,0 +1,108 @@
+import io
+import socket
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from paramiko.ssh_exception import SSHException
+from tap_sftp import client, hosts
+
+FIND_OUTPUT = b"20 1577836800.5 /root/file 1.csv\x0030 1577923200.0 /root/nested/file2.csv\x00"
+
+def get_channel(output, exit_status=0, error=b""):
+    channel = mock.Mock()
+    # split the output mid entry, as it is received
+    channel.recv.side_effect = [output[:10], output[10:], b""]
+    channel.recv_exit_status.return_value = exit_status
+    channel.makefile_stderr.return_value = io.BytesIO(error)
+    return channel
+
+@mock.patch("tap_sftp.client.SFTPConnection._SFTPConnection__try_connect")
+@mock.patch("tap_sftp.client.SFTPConnection.walk_files")
+class TestFindListing(unittest.TestCase):
+
+    def get_connection(self, channel=None, open_error=None):
+        conn = client.connection({"host": "10.0.0.1", "username": "username", "port": 22,
+                                  "sftp_find_listing": "true"})
+        conn.transport = mock.Mock()
+        conn.transport.open_session.return_value = channel
+        conn.transport.open_session.side_effect = open_error
+        return conn
+
+    def test_find_listing(self, mocked_walk_files, mocked_connect):
+        channel = get_channel(FIND_OUTPUT)
+        conn = self.get_connection(channel)
+
+        files = conn.get_files("/root", r"\.csv$", datetime(2019, 12, 31, 23, 59, 59, 900000, tzinfo=pytz.UTC))
+
+        self.assertEqual(files, [
+            {"filepath": "/root/file 1.csv",
+             "last_modified": datetime(2020, 1, 1, 0, 0, 0, 500000, tzinfo=pytz.UTC),
+             "size": 20},
+            {"filepath": "/root/nested/file2.csv",
+             "last_modified": datetime(2020, 1, 2, tzinfo=pytz.UTC),
+             "size": 30}
+        ])
+        channel.exec_command.assert_called_once_with(
+            "find /root -type f -size +0c -newermt @1577836799 -printf '%s %T@ %p\\0'")
+        mocked_walk_files.assert_not_called()
+
+    def test_exec_denied(self, mocked_walk_files, mocked_connect):
+        mocked_walk_files.return_value = []
+        conn = self.get_connection(open_error=SSHException("Administratively prohibited"))
+
+        conn.get_files("/root", r"\.csv$")
+        conn.get_files("/root", r"\.csv$")
+
+        # 'find' is not tried again once it was refused
+        self.assertEqual(conn.transport.open_session.call_count, 1)
+        self.assertEqual(mocked_walk_files.call_count, 2)
+
+    def test_find_failed(self, mocked_walk_files, mocked_connect):
+        mocked_walk_files.return_value = []
+        channel = get_channel(b"", exit_status=1, error=b"This service allows sftp connections only.")
+        conn = self.get_connection(channel)
+
+        conn.get_files("/root", r"\.csv$")
+
+        mocked_walk_files.assert_called_once_with("/root", None, r"\.csv$")
+        self.assertFalse(conn.find_listing)
+        channel.close.assert_called_once()
+
+    def test_find_timed_out(self, mocked_walk_files, mocked_connect):
+        mocked_walk_files.return_value = []
+        channel = get_channel(b"")
+        # nothing printed by 'find' within the request timeout
+        channel.recv.side_effect = socket.timeout()
+        conn = self.get_connection(channel)
+
+        conn.get_files("/root", r"\.csv$")
+
+        mocked_walk_files.assert_called_once_with("/root", None, r"\.csv$")
+        self.assertFalse(conn.find_listing)
+        channel.close.assert_called_once()
+
+    def test_find_listing_disabled(self, mocked_walk_files, mocked_connect):
+        mocked_walk_files.return_value = []
+        conn = client.connection({"host": "10.0.0.1", "username": "username", "port": 22})
+        conn.transport = mock.Mock()
+
+        conn.get_files("/root", r"\.csv$")
+
+        conn.transport.open_session.assert_not_called()
+        mocked_walk_files.assert_called_once_with("/root", None, r"\.csv$")
+
+    def test_no_free_channel(self, mocked_walk_files, mocked_connect):
+        mocked_walk_files.return_value = []
+        hosts.configure({"max_channels_per_host": 1})
+        self.addCleanup(hosts.configure, {})
+        # held by the SFTP channel of the connection
+        hosts.acquire(hosts.CHANNELS, "10.0.0.1", 22)
+        conn = self.get_connection(get_channel(FIND_OUTPUT))
+
+        conn.get_files("/root", r"\.csv$")
+
+        conn.transport.open_session.assert_not_called()
+        mocked_walk_files.assert_called_once_with("/root", None, r"\.csv$")
+        # tried again once a channel is free
+        self.assertTrue(conn.find_listing)
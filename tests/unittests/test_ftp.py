@@ -0,0 +1,88 @@
+import gzip
+import io
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+import pytz
+from singer_encodings import csv
+from tap_sftp import client
+from .helpers import CSV_DATA, LocalFTPServer, write_file
+
+
+class TestFTPConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        write_file(self.root_dir.name, "export/file1.csv", CSV_DATA, mtime=1577836800)
+        write_file(self.root_dir.name, "export/nested/file2.csv.gz", gzip.compress(CSV_DATA), mtime=1577923200)
+        zip_data = io.BytesIO()
+        with zipfile.ZipFile(zip_data, "w") as zip_file:
+            zip_file.writestr("file3.csv", CSV_DATA)
+        write_file(self.root_dir.name, "export/file3.zip", zip_data.getvalue(), mtime=1578009600)
+        write_file(self.root_dir.name, "export/empty.csv", b"")
+        self.server = LocalFTPServer(self.root_dir.name).__enter__()
+        self.conn = client.connection({"protocol": "ftp",
+                                       "host": "127.0.0.1",
+                                       "port": self.server.port,
+                                       "username": "username",
+                                       "password": "password"})
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.__exit__(None, None, None)
+        self.root_dir.cleanup()
+
+    def read_rows(self, f):
+        file_handle = self.conn.get_file_handle(f)
+        rows = []
+        for reader in csv.get_row_iterators(file_handle, options={"file_name": f["filepath"]}, infer_compression=True):
+            rows += list(reader)
+        return rows
+
+    def test_get_files_by_prefix(self):
+        files = sorted(self.conn.get_files_by_prefix("/export"), key=lambda f: f["filepath"])
+
+        self.assertEqual([f["filepath"] for f in files],
+                         ["/export/file1.csv", "/export/file3.zip", "/export/nested/file2.csv.gz"])
+        self.assertEqual(files[0]["last_modified"], datetime(2020, 1, 1, tzinfo=pytz.UTC))
+        self.assertEqual(files[0]["size"], len(CSV_DATA))
+
+    def test_get_files(self):
+        files = self.conn.get_files("/export", r"\.csv", datetime(2020, 1, 1, tzinfo=pytz.UTC))
+
+        self.assertEqual([f["filepath"] for f in files], ["/export/nested/file2.csv.gz"])
+
+    def test_stat(self):
+        f = self.conn.stat("/export/file1.csv")
+
+        self.assertEqual(f, {"filepath": "/export/file1.csv",
+                             "last_modified": datetime(2020, 1, 1, tzinfo=pytz.UTC),
+                             "size": len(CSV_DATA)})
+        with self.assertRaises(FileNotFoundError):
+            self.conn.stat("/export/missing.csv")
+
+    def test_missing_directory(self):
+        with self.assertRaises(Exception) as context:
+            self.conn.get_files_by_prefix("/missing")
+
+        self.assertEqual(str(context.exception), "Directory '/missing' does not exist")
+
+    def test_read_files_on_one_control_connection(self):
+        files = sorted(self.conn.get_files_by_prefix("/export"), key=lambda f: f["filepath"])
+        control_connection = self.conn._ftp
+
+        # the handle of a file does not have to be read until the end before the next one is opened
+        self.conn.get_file_handle(files[0]).readline()
+        for f in files:
+            self.assertEqual(self.read_rows(f), [{"id": "1", "name": "a"},
+                                                 {"id": "2", "name": "b"},
+                                                 {"id": "3", "name": "c"}])
+        self.assertIs(self.conn._ftp, control_connection)
+
+    def test_unreadable_file(self):
+        with self.assertRaises(OSError):
+            self.conn.get_file_handle({"filepath": "/export/missing.csv"})
+
+        # the connection is still usable
+        self.assertEqual(len(self.conn.get_files_by_prefix("/export")), 3)
@@ -0,0 +1,106 @@
+import datetime
+import os
+import tempfile
+import unittest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from pyftpdlib.handlers import TLS_FTPHandler
+from tap_sftp import client
+from .helpers import CSV_DATA, LocalFTPServer, write_file
+
+def write_self_signed_cert(path):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+            .sign(key, hashes.SHA256()))
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+class ExplicitTLSHandler(TLS_FTPHandler):
+    tls_control_required = True
+    tls_data_required = True
+
+class ImplicitTLSHandler(ExplicitTLSHandler):
+
+    def handle(self):
+        # wrap the control connection in TLS before the welcome message
+        self.secure_connection(self.ssl_context)
+        super().handle()
+
+class TestFTPSConnection(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cert_dir = tempfile.TemporaryDirectory()
+        cls.cert_file = os.path.join(cls.cert_dir.name, "cert.pem")
+        write_self_signed_cert(cls.cert_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cert_dir.cleanup()
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        write_file(self.root_dir.name, "export/file1.csv", CSV_DATA)
+        write_file(self.root_dir.name, "export/file2.csv", CSV_DATA)
+
+    def tearDown(self):
+        self.root_dir.cleanup()
+
+    def get_connection(self, handler, **config):
+        handler.certfile = self.cert_file
+        handler.ssl_context = None
+        server = LocalFTPServer(self.root_dir.name, handler=handler).__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        conn = client.connection({"protocol": "ftps",
+                                  "host": "localhost",
+                                  "port": server.port,
+                                  "username": "username",
+                                  "password": "password",
+                                  "ftps_ca_file": self.cert_file,
+                                  **config})
+        self.addCleanup(conn.close)
+        return conn
+
+    def assert_files_read_with_session_reuse(self, conn):
+        files = sorted(conn.get_files_by_prefix("/export"), key=lambda f: f["filepath"])
+        self.assertEqual([f["filepath"] for f in files], ["/export/file1.csv", "/export/file2.csv"])
+
+        for f in files:
+            file_handle = conn.get_file_handle(f)
+            self.assertEqual(file_handle.read(), CSV_DATA)
+            self.assertTrue(file_handle.data_connection.session_reused)
+
+    def test_explicit_tls(self):
+        conn = self.get_connection(ExplicitTLSHandler)
+
+        self.assert_files_read_with_session_reuse(conn)
+
+    def test_implicit_tls(self):
+        conn = self.get_connection(ImplicitTLSHandler, ftps_implicit="true")
+
+        self.assert_files_read_with_session_reuse(conn)
+
+    def test_untrusted_certificate(self):
+        conn = self.get_connection(ExplicitTLSHandler, ftps_ca_file=None)
+
+        with self.assertRaises(client.ssl.SSLError):
+            conn.get_files_by_prefix("/export")
+
+    def test_certificate_not_verified(self):
+        conn = self.get_connection(ExplicitTLSHandler, ftps_ca_file=None, ftps_verify_certificate=False)
+
+        self.assertEqual(len(conn.get_files_by_prefix("/export")), 2)
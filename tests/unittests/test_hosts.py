@@ -0,0 +1,144 @@
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from tap_sftp import hosts
+
+class TestSlotLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.lock_dir.cleanup)
+
+    def get_limiter(self, limit):
+        return hosts.SlotLimiter(self.lock_dir.name, hosts.SESSIONS, "10.0.0.1", 22, limit)
+
+    def test_slots_shared_by_limiters(self):
+        # the limiters of two processes
+        limiter = self.get_limiter(2)
+        other_limiter = self.get_limiter(2)
+
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(other_limiter.acquire(), 0)
+        self.assertIsNone(limiter.acquire(timeout=0))
+
+        other_limiter.release()
+        self.assertEqual(limiter.acquire(timeout=0), 0)
+        self.assertEqual(limiter.acquired_count, 2)
+
+    def test_waiters_served_in_order(self):
+        # the limiters of two processes, their waiters queue together
+        limiters = [self.get_limiter(1), self.get_limiter(1)]
+        limiters[0].acquire()
+        order = []
+
+        def wait(number):
+            limiter = limiters[number % 2]
+            limiter.acquire()
+            order.append(number)
+            limiter.release()
+
+        threads = []
+        for number in range(5):
+            threads.append(threading.Thread(target=wait, args=(number,)))
+            threads[-1].start()
+            # queued one after the other
+            while len(limiters[0].get_tickets()) <= number:
+                time.sleep(0.001)
+        limiters[0].release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertEqual(limiters[0].get_tickets(), [])
+        self.assertEqual(limiters[0].waited_count + limiters[1].waited_count, 5)
+
+    def test_ticket_of_a_dead_waiter_dropped(self):
+        limiter = self.get_limiter(1)
+        # left by a process which died while waiting
+        open(limiter.queue_dir + "/00000000000000000001.1.1.ticket", "w").close()
+
+        self.assertIsNotNone(limiter.acquire(timeout=1))
+        self.assertEqual(limiter.get_tickets(), [])
+
+    def test_timeout(self):
+        limiter = self.get_limiter(1)
+        self.assertEqual(limiter.acquire(), 0)
+
+        self.assertIsNone(limiter.acquire(timeout=0))
+        self.assertIsNone(limiter.acquire(timeout=0.01))
+
+        limiter.release()
+        self.assertEqual(limiter.acquire(timeout=0), 0)
+
+    def test_slot_of_a_dead_process_freed(self):
+        limiter = self.get_limiter(1)
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import sys; from tap_sftp import hosts; "
+             "limiter = hosts.SlotLimiter(sys.argv[1], hosts.SESSIONS, '10.0.0.1', 22, 1); limiter.acquire(); "
+             "print('acquired', flush=True); sys.stdin.read()", self.lock_dir.name],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.assertEqual(process.stdout.readline(), b"acquired\n")
+
+        self.assertIsNone(limiter.acquire(timeout=0))
+        process.kill()
+        process.wait()
+        process.stdin.close()
+        process.stdout.close()
+        self.assertEqual(limiter.acquire(timeout=1), 0)
+
+@mock.patch("tap_sftp.hosts.LOGGER.info")
+class TestHostLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.lock_dir.cleanup)
+
+    def tearDown(self):
+        hosts.configure({})
+
+    def test_unlimited(self, mocked_logger):
+        hosts.configure({})
+
+        for _ in range(10):
+            self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22))
+        self.assertEqual(hosts.LIMITERS, {})
+
+    def test_limits_per_host(self, mocked_logger):
+        hosts.configure({"max_sessions_per_host": "1", "max_channels_per_host": 2,
+                         "host_limits_dir": self.lock_dir.name})
+
+        self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22))
+        self.assertFalse(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22, timeout=0))
+        # other hosts and ports have their own sessions
+        self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 2222))
+        self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.2", 22))
+        self.assertTrue(hosts.acquire(hosts.CHANNELS, "10.0.0.1", 22))
+        self.assertTrue(hosts.acquire(hosts.CHANNELS, "10.0.0.1", 22))
+        self.assertFalse(hosts.acquire(hosts.CHANNELS, "10.0.0.1", 22, timeout=0))
+
+        hosts.release(hosts.SESSIONS, "10.0.0.1", 22)
+        self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22, timeout=0))
+
+    def test_wait_time_logged(self, mocked_logger):
+        hosts.configure({"max_sessions_per_host": 1, "host_limits_dir": self.lock_dir.name})
+        hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22)
+        threading.Timer(0.05, hosts.release, (hosts.SESSIONS, "10.0.0.1", 22)).start()
+
+        self.assertTrue(hosts.acquire(hosts.SESSIONS, "10.0.0.1", 22))
+
+        wait_metrics = [c for c in mocked_logger.call_args_list
+                        if c[0][0] == 'METRIC: %s' and '"host_wait_time"' in c[0][1]]
+        self.assertEqual(len(wait_metrics), 1)
+        hosts.log_wait_summary()
+        mocked_logger.assert_any_call("\n**** Host Limits Summary:")
+
+    @mock.patch("tap_sftp.hosts.LOGGER.warning")
+    def test_no_channel_left_for_find(self, mocked_warning, mocked_logger):
+        hosts.configure({"max_channels_per_host": 1, "sftp_find_listing": "true",
+                         "host_limits_dir": self.lock_dir.name})
+
+        mocked_warning.assert_called_once()
@@ -0,0 +1,78 @@
+import random
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from tap_sftp import client, listing
+
+def get_entries(count, seed=0):
+    rand = random.Random(seed)
+    # few distinct times, so the order of the files with equal times is checked too
+    return [listing.FileEntry("/root/file_{}.csv".format(i), 1577836800 + rand.randint(0, 20), i)
+            for i in range(count)]
+
+class TestFilePlan(unittest.TestCase):
+
+    def test_sorted_in_memory(self):
+        entries = get_entries(50)
+        plan = listing.FilePlan(spill_threshold=100)
+        for f in entries:
+            plan.add(f)
+
+        self.assertEqual(list(plan), sorted(entries, key=lambda f: f.mtime))
+        self.assertEqual(plan.runs, [])
+
+    def test_spilled_to_sorted_runs(self):
+        entries = get_entries(95)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            plan = listing.FilePlan(spill_threshold=10, spill_dir=spill_dir)
+            for f in entries:
+                plan.add(f)
+
+            self.assertEqual(len(plan.runs), 9)
+            self.assertEqual(len(plan.candidates), 5)
+            self.assertEqual(len(plan), 95)
+            # same order as sorting all the files in memory, ties in listing order
+            self.assertEqual(list(plan), sorted(entries, key=lambda f: f.mtime))
+            # can be iterated again
+            self.assertEqual(len(list(plan)), 95)
+
+            plan.close()
+
+    def test_spilled_entries_kept_as_listed(self):
+        entries = [listing.FileEntry("/root/caf\xe9 \udcff\n.csv", 1577836800.123456, None),
+                   listing.FileEntry("/root/file.csv", 1577836800.5, 2 ** 40)]
+        plan = listing.FilePlan(spill_threshold=1)
+        for f in entries:
+            plan.add(f)
+
+        self.assertEqual([f.to_dict() for f in plan], [f.to_dict() for f in entries])
+        plan.close()
+
+@mock.patch("tap_sftp.client.LOGGER.info")
+class TestPlanFiles(unittest.TestCase):
+
+    def get_connection(self, file_count):
+        return client.MemoryConnection({"/root/file_{}.csv".format(i): (b"data", 1577836800 + i)
+                                        for i in range(file_count)})
+
+    def test_plan_files(self, mocked_logger):
+        conn = self.get_connection(30)
+
+        plan = conn.plan_files("/root", r"file_\d+\.csv", datetime(2020, 1, 1, 0, 0, 9, tzinfo=pytz.UTC),
+                               spill_threshold=7)
+
+        self.assertEqual([f["filepath"] for f in plan], ["/root/file_{}.csv".format(i) for i in range(10, 30)])
+        self.assertEqual(len(plan.runs), 2)
+        plan.close()
+
+    def test_found_files_summarized(self, mocked_logger):
+        conn = self.get_connection(30)
+
+        conn.get_files("/root", r"file_\d+\.csv")
+
+        found_files = [c for c in mocked_logger.call_args_list if c[0][0] == "Found file: %s"]
+        self.assertEqual(len(found_files), client.LOGGED_FILE_COUNT)
+        mocked_logger.assert_any_call('Found %s files in "%s" matching "%s"%s', 30, "/root", r"file_\d+\.csv",
+                                      ", the first 10 are listed above")
@@ -0,0 +1,101 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+import pytz
+from parameterized import parameterized
+from singer_encodings import csv
+from tap_sftp import client
+from .helpers import CSV_DATA, write_file
+
+class TestLocalConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.prefix = self.root_dir.name + "/export"
+        write_file(self.root_dir.name, "export/file1.csv", CSV_DATA, mtime=1577836800)
+        write_file(self.root_dir.name, "export/nested/file2.csv.gz", gzip.compress(CSV_DATA), mtime=1577923200)
+        zip_data = io.BytesIO()
+        with zipfile.ZipFile(zip_data, "w") as zip_file:
+            zip_file.writestr("file3.csv", CSV_DATA)
+        write_file(self.root_dir.name, "export/file3.zip", zip_data.getvalue(), mtime=1578009600)
+        write_file(self.root_dir.name, "export/empty.csv", b"")
+
+    def tearDown(self):
+        self.root_dir.cleanup()
+
+    def test_get_files_by_prefix(self):
+        conn = client.connection({"protocol": "local"})
+        files = sorted(conn.get_files_by_prefix(self.prefix), key=lambda f: f["filepath"])
+
+        self.assertEqual([f["filepath"] for f in files],
+                         [self.prefix + "/file1.csv", self.prefix + "/file3.zip", self.prefix + "/nested/file2.csv.gz"])
+        self.assertEqual(files[0]["last_modified"], datetime(2020, 1, 1, tzinfo=pytz.UTC))
+        self.assertEqual(files[0]["size"], len(CSV_DATA))
+
+    def test_get_files(self):
+        conn = client.connection({"protocol": "local"})
+        files = conn.get_files(self.prefix, r"\.csv", datetime(2020, 1, 1, tzinfo=pytz.UTC))
+
+        self.assertEqual([f["filepath"] for f in files], [self.prefix + "/nested/file2.csv.gz"])
+
+    def test_filters_applied_while_walking(self):
+        conn = client.connection({"protocol": "local"})
+
+        files = conn.iter_files(self.prefix, datetime(2020, 1, 1, tzinfo=pytz.UTC), r"\.csv")
+
+        self.assertEqual([f["filepath"] for f in files], [self.prefix + "/nested/file2.csv.gz"])
+
+    def test_directory_links_not_followed(self):
+        os.symlink(self.prefix, self.prefix + "/nested/loop")
+        conn = client.connection({"protocol": "local"})
+
+        files = conn.get_files_by_prefix(self.prefix)
+
+        self.assertEqual(len(files), 3)
+
+    def test_stat(self):
+        conn = client.connection({"protocol": "local"})
+        f = conn.stat(self.prefix + "/file1.csv")
+
+        self.assertEqual(f["last_modified"], datetime(2020, 1, 1, tzinfo=pytz.UTC))
+        self.assertEqual(f["size"], len(CSV_DATA))
+        with self.assertRaises(FileNotFoundError):
+            conn.stat(self.prefix + "/missing.csv")
+
+    def test_missing_directory(self):
+        conn = client.connection({"protocol": "local"})
+        with self.assertRaises(Exception) as context:
+            conn.get_files_by_prefix(self.prefix + "/missing")
+
+        self.assertEqual(str(context.exception), "Directory '{}/missing' does not exist".format(self.prefix))
+
+    @parameterized.expand([["buffered_reads", "false"], ["mmap", "true"]])
+    def test_read_files(self, name, use_mmap):
+        conn = client.connection({"protocol": "local", "local_use_mmap": use_mmap})
+
+        for f in conn.get_files_by_prefix(self.prefix):
+            file_handle = conn.get_file_handle(f)
+            rows = []
+            for reader in csv.get_row_iterators(file_handle, options={"file_name": f["filepath"]}, infer_compression=True):
+                rows += list(reader)
+            file_handle.close()
+
+            self.assertEqual(rows, [{"id": "1", "name": "a"},
+                                    {"id": "2", "name": "b"},
+                                    {"id": "3", "name": "c"}])
+
+    def test_mmap_empty_file(self):
+        conn = client.connection({"protocol": "local", "local_use_mmap": True})
+        file_handle = conn.get_file_handle({"filepath": self.prefix + "/empty.csv"})
+
+        self.assertEqual(file_handle.read(), b"")
+        file_handle.close()
+
+    def test_unreadable_file(self):
+        conn = client.connection({"protocol": "local"})
+        with self.assertRaises(OSError):
+            conn.get_file_handle({"filepath": self.prefix + "/missing.csv"})
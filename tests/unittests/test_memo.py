@@ -0,0 +1,81 @@
+import random
+import unittest
+from unittest import mock
+from singer import Transformer
+from singer.transform import SchemaMismatch
+from tap_sftp import memo
+
+SCHEMA = {"type": "object", "properties": {"created_at": {"type": ["null", "string"], "format": "date-time"},
+                                           "id": {"type": ["null", "integer", "string"]},
+                                           "amount": {"type": ["null", "number", "string"]},
+                                           "price": {"type": ["null", "string"], "format": "singer.decimal"},
+                                           "name": {"type": ["null", "string"]}}}
+
+def get_records(count, seed=0):
+    rand = random.Random(seed)
+    values = ["2020-01-0{}T00:00:00Z".format(i) for i in range(1, 5)] + ["", "not a date", "1,000", "1.5", "12"]
+    return [{"created_at": rand.choice(values), "id": rand.choice(values), "amount": rand.choice(values),
+             "price": rand.choice(values[6:]), "name": rand.choice(values)} for _ in range(count)]
+
+@mock.patch("tap_sftp.memo.LOGGER.info")
+class TestParseCache(unittest.TestCase):
+
+    def test_lru(self, mocked_logger):
+        cache = memo.ParseCache("stream.column (integer)", 2)
+        parse = mock.Mock(side_effect=int)
+
+        results = [cache.get(value, parse) for value in ["1", "2", "1", "3", "1", "2"]]
+
+        self.assertEqual(results, [1, 2, 1, 3, 1, 2])
+        # "2" was the least recently used when "3" was added
+        self.assertEqual([c[0][0] for c in parse.call_args_list], ["1", "2", "3", "2"])
+        self.assertEqual(cache.hits, 2)
+
+    def test_disabled_on_low_hit_rate(self, mocked_logger):
+        cache = memo.ParseCache("stream.column (integer)", 10)
+
+        for value in range(memo.HIT_RATE_WINDOW * memo.LOW_HIT_RATE_WINDOWS):
+            cache.get(str(value), int)
+
+        self.assertFalse(cache.enabled)
+        self.assertEqual(len(cache.results), 0)
+        self.assertEqual(cache.get("5", int), 5)
+
+    def test_kept_on_high_hit_rate(self, mocked_logger):
+        cache = memo.ParseCache("stream.column (integer)", 10)
+
+        for value in range(memo.HIT_RATE_WINDOW * memo.LOW_HIT_RATE_WINDOWS * 2):
+            cache.get(str(value % 10), int)
+
+        self.assertTrue(cache.enabled)
+        self.assertGreater(cache.get_hit_rate(), 0.99)
+
+@mock.patch("tap_sftp.memo.LOGGER.info")
+class TestMemoTransformer(unittest.TestCase):
+
+    def test_same_records_as_transformer(self, mocked_logger):
+        transformer = memo.MemoTransformer("stream")
+        for record in get_records(500):
+            try:
+                expected = Transformer().transform(dict(record), SCHEMA)
+            except Exception as e:
+                with self.assertRaises(type(e)):
+                    transformer.transform(dict(record), SCHEMA)
+                continue
+            self.assertEqual(transformer.transform(dict(record), SCHEMA), expected)
+
+    def test_caches_per_column(self, mocked_logger):
+        transformer = memo.MemoTransformer("stream")
+        for record in get_records(100):
+            try:
+                transformer.transform(record, SCHEMA)
+            except SchemaMismatch:
+                # invalid dates
+                pass
+
+        self.assertEqual(sorted(transformer.caches),
+                         [(("amount",), "number"), (("created_at",), "date-time"), (("id",), "integer")])
+        self.assertGreater(transformer.caches[(("created_at",), "date-time")].hits, 80)
+
+        transformer.log_cache_summary()
+        self.assertEqual(mocked_logger.call_count, 3)
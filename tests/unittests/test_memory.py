@@ -0,0 +1,56 @@
+import tracemalloc
+import unittest
+from unittest import mock
+from tap_sftp import memory, stats
+
+class TestTrackMemory(unittest.TestCase):
+
+    def test_tracking_disabled(self):
+        file_metrics = stats.new_file_metrics()
+        with memory.track_memory({}, "/root/file.csv", file_metrics):
+            data = bytearray(1024 * 1024)
+
+        self.assertIsNone(file_metrics["peak_rss"])
+        self.assertIsNone(file_metrics["peak_traced_memory"])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_tracking_enabled(self):
+        file_metrics = stats.new_file_metrics()
+        with memory.track_memory({"track_memory": "true"}, "/root/file.csv", file_metrics):
+            data = bytearray(10 * memory.MB)
+
+        self.assertGreater(file_metrics["peak_rss"], 0)
+        self.assertGreaterEqual(file_metrics["peak_traced_memory"], 10 * memory.MB)
+        self.assertTrue(any("test_memory.py" in a for a in file_metrics["top_allocations"]))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_peak_of_freed_allocation(self):
+        file_metrics = stats.new_file_metrics()
+        with memory.track_memory({"track_memory": "true"}, "/root/file.csv", file_metrics):
+            data = bytearray(10 * memory.MB)
+            del data
+
+        # the peak is recorded even though the allocation is freed before the end
+        self.assertGreaterEqual(file_metrics["peak_traced_memory"], 10 * memory.MB)
+
+    @mock.patch("tap_sftp.memory.get_rss", return_value=200 * memory.MB)
+    @mock.patch("tap_sftp.memory.LOGGER.warning")
+    def test_soft_limit(self, mocked_logger, mocked_get_rss):
+        config = {"track_memory": True, "memory_soft_limit_mb": "100"}
+        with memory.track_memory(config, "/root/file.zip", stats.new_file_metrics()):
+            pass
+
+        # only warned once for the file
+        mocked_logger.assert_called_once_with(
+            'Memory soft limit of %.1f MB exceeded (RSS %.1f MB) while processing "%s".',
+            100.0, 200.0, "/root/file.zip")
+
+    def test_table_totals_max_peaks(self):
+        table_data = {"files": {
+            "/root/file1.csv": {"row_count": 1, "peak_rss": 300, "peak_traced_memory": 30},
+            "/root/file2.csv": {"row_count": 1, "peak_rss": 200, "peak_traced_memory": 50}
+        }}
+
+        totals = stats.get_table_totals(table_data)
+        self.assertEqual(totals["peak_rss"], 300)
+        self.assertEqual(totals["peak_traced_memory"], 50)
@@ -0,0 +1,60 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+from unittest import mock
+from tap_sftp import profiling
+
+def busy_loop(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        sum(range(1000))
+
+@mock.patch("tap_sftp.profiling.LOGGER.info")
+class TestProfileStream(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        profiling.PROFILE_SUMMARIES.clear()
+
+    def tearDown(self):
+        self.profile_dir.cleanup()
+
+    def test_profiling_disabled(self, mocked_logger):
+        with profiling.profile_stream({"profile_dir": self.profile_dir.name}, "sync", "table_1"):
+            busy_loop(0.01)
+
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+        self.assertEqual(profiling.PROFILE_SUMMARIES, [])
+
+    def test_cprofile(self, mocked_logger):
+        config = {"profile": "cprofile", "profile_dir": self.profile_dir.name}
+        with profiling.profile_stream(config, "sync", "table_1"):
+            busy_loop(0.01)
+
+        path = os.path.join(self.profile_dir.name, "sync-table_1.prof")
+        self.assertTrue(pstats.Stats(path).total_calls > 0)
+        self.assertEqual(len(profiling.PROFILE_SUMMARIES), 1)
+        self.assertIn("busy_loop", profiling.PROFILE_SUMMARIES[0][2])
+
+    def test_sampling(self, mocked_logger):
+        config = {"profile": "sampling", "profile_dir": self.profile_dir.name, "profile_sample_interval": "0.001"}
+        with profiling.profile_stream(config, "discover", "table_1"):
+            busy_loop(0.2)
+
+        with open(os.path.join(self.profile_dir.name, "discover-table_1.collapsed")) as collapsed_file:
+            lines = collapsed_file.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any("busy_loop" in line for line in lines))
+
+        profiling.log_profile_summaries()
+        self.assertEqual(profiling.PROFILE_SUMMARIES, [])
+        self.assertIn("samples", mocked_logger.call_args[0][3])
+
+    def test_unknown_profiler(self, mocked_logger):
+        with self.assertRaises(Exception) as context:
+            with profiling.profile_stream({"profile": "other"}, "sync", "table_1"):
+                pass
+
+        self.assertIn("Unknown profiler - other", str(context.exception))
@@ -0,0 +1,61 @@
+import json
+import unittest
+from unittest import mock
+from tap_sftp import stats
+from tap_sftp.progress import FileProgress
+
+def get_logged_metrics(mocked_logger):
+    return [json.loads(call[0][1]) for call in mocked_logger.call_args_list if call[0][0] == 'METRIC: %s']
+
+@mock.patch("tap_sftp.progress.LOGGER.info")
+@mock.patch("tap_sftp.progress.time.time")
+class TestFileProgress(unittest.TestCase):
+
+    def test_heartbeat(self, mocked_time, mocked_logger):
+        mocked_time.return_value = 1000
+        file_metrics = stats.new_file_metrics()
+        f = {"filepath": "/root/file.csv.gz", "size": 1000}
+
+        with FileProgress("test_table", f, file_metrics, interval=10) as progress:
+            for _ in range(50):
+                progress.increment()
+            file_metrics["wire_bytes"] = 250
+            file_metrics["decompressed_bytes"] = 1000
+            mocked_time.return_value = 1010
+            progress.increment()
+
+            gauges = {m["metric"]: m["value"] for m in get_logged_metrics(mocked_logger) if m["type"] == "gauge"}
+
+        self.assertEqual(gauges["records_per_second"], 5.1)
+        self.assertEqual(gauges["wire_bytes_per_second"], 25)
+        self.assertEqual(gauges["decompressed_bytes_per_second"], 100)
+        self.assertEqual(gauges["percent_done"], 25)
+        self.assertEqual(gauges["eta_seconds"], 30)
+
+    def test_no_heartbeat_before_interval(self, mocked_time, mocked_logger):
+        mocked_time.return_value = 1000
+        f = {"filepath": "/root/file.csv", "size": 1000}
+
+        with FileProgress("test_table", f, stats.new_file_metrics(), interval=10) as progress:
+            mocked_time.return_value = 1009
+            progress.increment()
+            self.assertEqual(get_logged_metrics(mocked_logger), [])
+
+        # the record count and the file duration are emitted when the file is done
+        logged_metrics = get_logged_metrics(mocked_logger)
+        self.assertEqual([(m["type"], m["metric"]) for m in logged_metrics],
+                         [("counter", "record_count"), ("timer", "file_sync_duration")])
+        self.assertEqual(logged_metrics[0]["value"], 1)
+
+    def test_unknown_file_size(self, mocked_time, mocked_logger):
+        mocked_time.return_value = 1000
+        file_metrics = stats.new_file_metrics()
+
+        with FileProgress("test_table", {"filepath": "/root/file.csv"}, file_metrics, interval=10) as progress:
+            file_metrics["wire_bytes"] = 100
+            mocked_time.return_value = 1010
+            progress.increment()
+
+        gauges = [m["metric"] for m in get_logged_metrics(mocked_logger) if m["type"] == "gauge"]
+        self.assertNotIn("percent_done", gauges)
+        self.assertNotIn("eta_seconds", gauges)
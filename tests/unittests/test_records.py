@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import unittest
+from unittest import mock
+from singer import metadata, Transformer
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+from tap_sftp import records, sync
+from .helpers import TABLE_SPEC, get_stream
+
+CSV_DATA = "id,name,amount,name\n1,a,1.5,b\n\n2,c\n3,d,2.5,e,f,g\n"
+
+def get_reader(data=CSV_DATA):
+    return csv.DictReader(io.StringIO(data), restkey="_sdc_extra")
+
+class TestProjectRows(unittest.TestCase):
+
+    def test_same_rows_as_dict_reader(self):
+        columns = {"id", "name", "amount", "_sdc_extra"}
+
+        self.assertEqual(list(records.project_rows(get_reader(), columns)), list(get_reader()))
+
+    def test_projected(self):
+        rows = list(records.project_rows(get_reader(), {"id", "amount"}))
+
+        self.assertEqual(rows, [{"id": "1", "amount": "1.5"}, {"id": "2", "amount": None}, {"id": "3", "amount": "2.5"}])
+
+    def test_empty_file(self):
+        self.assertEqual(list(records.project_rows(get_reader(""), {"id"})), [])
+
+    def test_selected_columns(self):
+        stream = get_stream(deselected=["name", "_sdc_source_file", "id"])
+
+        columns = records.get_selected_columns(stream.schema.to_dict(), metadata.to_map(stream.metadata))
+
+        # key properties are automatic
+        self.assertEqual(columns, {"id", "amount", "_sdc_extra", "_sdc_source_lineno"})
+
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+@mock.patch("tap_sftp.stats.LOGGER.info")
+class TestSyncProjection(unittest.TestCase):
+
+    def sync_file(self, stream):
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(CSV_DATA.encode("utf-8"))
+        f = {"filepath": "/root/file.csv", "last_modified": "2020-01-01"}
+        sync.sync_file(conn, f, stream, TABLE_SPEC, "utf-8")
+
+    def test_same_records_as_transformer(self, mocked_logger, mocked_stdout):
+        stream = get_stream(deselected=["name", "_sdc_source_file"])
+
+        self.sync_file(stream)
+
+        written = [json.loads(line)["record"] for line in mocked_stdout.getvalue().splitlines()]
+        expected = []
+        with Transformer() as transformer:
+            for lineno, row in enumerate(get_reader(), 2):
+                rec = {**row, "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": lineno}
+                expected.append(transformer.transform(rec, stream.schema.to_dict(), metadata.to_map(stream.metadata)))
+        self.assertEqual(written, expected)
+        self.assertEqual(written[0], {"id": 1, "amount": 1.5, "_sdc_source_lineno": 2})
+
+    def test_written_in_batches(self, mocked_logger, mocked_stdout):
+        data = "id,name\n" + "".join("{},name {}\n".format(i, i) for i in range(5))
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(data.encode("utf-8"))
+        f = {"filepath": "/root/file.csv", "last_modified": "2020-01-01"}
+
+        with mock.patch.object(mocked_stdout, "write", wraps=mocked_stdout.write) as mocked_write:
+            rows = sync.sync_file(conn, f, get_stream(), TABLE_SPEC, "utf-8", {"record_batch_size": 2})
+
+        self.assertEqual(rows, 5)
+        self.assertEqual(mocked_write.call_count, 3)
+        written = [json.loads(line)["record"] for line in mocked_stdout.getvalue().splitlines()]
+        self.assertEqual([(r["id"], r["_sdc_source_lineno"]) for r in written], [(i, i + 2) for i in range(5)])
+
+    def test_empty_schema(self, mocked_logger, mocked_stdout):
+        # discovered for a table without files yet
+        stream = CatalogEntry(tap_stream_id="test_table", stream="test_table", schema=Schema.from_dict({}),
+                              metadata=metadata.get_standard_metadata({}, key_properties=["id"]))
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(b"id,name\n1,a\n")
+        f = {"filepath": "/root/file.csv", "last_modified": "2020-01-01"}
+
+        sync.sync_file(conn, f, stream, TABLE_SPEC, "utf-8")
+
+        written = [json.loads(line)["record"] for line in mocked_stdout.getvalue().splitlines()]
+        self.assertEqual(written, [{"id": "1", "name": "a", "_sdc_source_file": "/root/file.csv", "_sdc_source_lineno": 2}])
+
+class TestBatches(unittest.TestCase):
+
+    def test_iter_batches(self):
+        self.assertEqual(list(records.iter_batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(records.iter_batches([], 2)), [])
@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import socket
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from tap_sftp import report, stats, sync
+from .helpers import CSV_DATA, TABLE_SPEC, get_plan, get_stream
+
+FILES = [
+    {"filepath": "/root/file1.csv", "last_modified": datetime(2020, 1, 1, tzinfo=pytz.UTC), "size": len(CSV_DATA)},
+    {"filepath": "/root/file2.csv", "last_modified": datetime(2020, 1, 2, tzinfo=pytz.UTC), "size": len(CSV_DATA)},
+]
+
+def get_file_handle(f):
+    if f["filepath"] == "/root/file2.csv":
+        raise PermissionError("Permission denied")
+    return io.BytesIO(CSV_DATA)
+
+@mock.patch("time.sleep")
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+@mock.patch("tap_sftp.client.connection")
+class TestRunReport(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+        self.report_dir = tempfile.TemporaryDirectory()
+        self.config = {"start_date": "2019-01-01T00:00:00Z",
+                       "tables": json.dumps([TABLE_SPEC]),
+                       "run_report_path": os.path.join(self.report_dir.name, "report.jsonl")}
+
+    def tearDown(self):
+        report.end_run()
+        self.report_dir.cleanup()
+
+    def read_events(self):
+        with open(self.config["run_report_path"]) as report_file:
+            return [json.loads(line) for line in report_file]
+
+    def test_report_events(self, mocked_connection, mocked_stdout, mocked_sleep):
+        conn = mocked_connection.return_value
+        conn.plan_files.return_value = get_plan(FILES)
+        conn.get_file_handle.side_effect = get_file_handle
+
+        report.start_run(self.config, "sync")
+        state = {"bookmarks": {"test_table": {"modified_since": "2019-06-01T00:00:00+00:00"}}}
+        sync.sync_stream(self.config, state, get_stream())
+
+        # the events are on disk before the end of the run
+        events = self.read_events()
+        self.assertEqual([e["event"] for e in events],
+                         ["run_started", "stream_started", "file_synced", "file_skipped", "stream_completed"])
+
+        file_synced = events[2]
+        self.assertEqual(file_synced["filepath"], "/root/file1.csv")
+        self.assertEqual(file_synced["row_count"], 3)
+        self.assertEqual(file_synced["wire_bytes"], len(CSV_DATA))
+        self.assertEqual(file_synced["retries"], 0)
+        self.assertEqual(file_synced["bookmark"], "2020-01-01T00:00:00+00:00")
+
+        self.assertEqual(events[3]["filepath"], "/root/file2.csv")
+        self.assertEqual(events[3]["reason"], "Permission denied")
+
+        self.assertEqual(events[4]["bookmark_before"], "2019-06-01T00:00:00+00:00")
+        self.assertEqual(events[4]["bookmark_after"], "2020-01-02T00:00:00+00:00")
+
+        report.end_run()
+        self.assertEqual(self.read_events()[-1]["event"], "run_completed")
+
+    def test_retries_reported(self, mocked_connection, mocked_stdout, mocked_sleep):
+        conn = mocked_connection.return_value
+        conn.plan_files.return_value = get_plan(FILES[:1])
+        timing_out_handle = mock.Mock()
+        timing_out_handle.readline.side_effect = socket.timeout
+        conn.get_file_handle.side_effect = [timing_out_handle, io.BytesIO(CSV_DATA)]
+
+        report.start_run(self.config, "sync")
+        sync.sync_stream(self.config, {}, get_stream())
+
+        file_synced = [e for e in self.read_events() if e["event"] == "file_synced"][0]
+        self.assertEqual(file_synced["retries"], 1)
+
+    def test_no_report_path(self, mocked_connection, mocked_stdout, mocked_sleep):
+        report.start_run({}, "sync")
+        report.write_event("stream_started", stream="test_table")
+
+        self.assertIsNone(report.REPORT)
+        self.assertEqual(os.listdir(self.report_dir.name), [])
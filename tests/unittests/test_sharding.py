@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+from tap_sftp import client, sharding
+
+FILEPATHS = ["/root/file_{}.csv".format(i) for i in range(200)]
+
+class TestShard(unittest.TestCase):
+
+    def test_shards_partition_files(self):
+        shards = [sharding.Shard(index, 3) for index in range(3)]
+
+        shard_files = [[filepath for filepath in FILEPATHS if shard.contains(filepath)] for shard in shards]
+
+        self.assertEqual(sorted(sum(shard_files, [])), sorted(FILEPATHS))
+        self.assertTrue(all(shard_files))
+
+    def test_stable_hash(self):
+        # the same shards on every process and every run
+        self.assertEqual([index for index in range(4) if sharding.Shard(index, 4).contains("/root/file_1.csv")], [3])
+
+    def test_get_shard(self):
+        self.assertIsNone(sharding.get_shard({}))
+        shard = sharding.get_shard({"shard_count": "4", "shard_index": "3"})
+        self.assertEqual((shard.index, shard.count), (3, 4))
+        with self.assertRaises(Exception):
+            sharding.get_shard({"shard_count": "4", "shard_index": "4"})
+
+    @mock.patch("tap_sftp.client.LOGGER.info")
+    def test_plan_files_in_shard(self, mocked_logger):
+        conn = client.MemoryConnection({filepath: (b"data", 1577836800) for filepath in FILEPATHS})
+        shard = sharding.Shard(1, 2)
+
+        plan = conn.plan_files("/root", r"\.csv$", shard=shard)
+
+        self.assertEqual(sorted(f["filepath"] for f in plan), [f for f in sorted(FILEPATHS) if shard.contains(f)])
+        mocked_logger.assert_any_call('%s of them in shard %s', len(plan), shard)
+
+class TestMergeStates(unittest.TestCase):
+
+    def test_earliest_bookmark(self):
+        states = [{"bookmarks": {"table_1": {"modified_since": "2020-01-02T00:00:00+00:00"},
+                                 "table_2": {"modified_since": "2020-01-01T00:00:00+00:00"}}},
+                  {"bookmarks": {"table_1": {"modified_since": "2020-01-01T00:00:00.500000+00:00"},
+                                 "table_2": {"modified_since": "2020-01-03T00:00:00+00:00"}}}]
+
+        self.assertEqual(sharding.merge_states(states),
+                         {"bookmarks": {"table_1": {"modified_since": "2020-01-01T00:00:00.500000+00:00"},
+                                        "table_2": {"modified_since": "2020-01-01T00:00:00+00:00"}}})
+
+    def test_missing_bookmark(self):
+        # a shard without bookmark syncs the stream from the start date
+        states = [{"bookmarks": {"table_1": {"modified_since": "2020-01-02T00:00:00+00:00"}}}, {}]
+
+        self.assertEqual(sharding.merge_states(states), {"bookmarks": {}})
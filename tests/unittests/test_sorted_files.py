@@ -7,7 +7,7 @@ import time
 import pytz
 import singer
 
-@mock.patch("tap_sftp.client.SFTPConnection.get_files_by_prefix")
+@mock.patch("tap_sftp.client.SFTPConnection.iter_files")
 class TestSortedFiles(unittest.TestCase):
 
     def test_sorted_files(self, mocked_all_files):
@@ -0,0 +1,105 @@
+import gzip
+import io
+import json
+import unittest
+from unittest import mock
+from tap_sftp import stats, sync
+from .helpers import CSV_DATA, TABLE_SPEC, get_stream
+
+
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+@mock.patch("tap_sftp.stats.LOGGER.info")
+class TestFileStats(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+
+    def sync_file(self, filepath, data):
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(data)
+        f = {"filepath": filepath, "last_modified": "2020-01-01"}
+        return sync.sync_file(conn, f, get_stream(), TABLE_SPEC, "utf-8")
+
+    def test_csv_file_stats(self, mocked_logger, mocked_stdout):
+        rows = self.sync_file("/root/file.csv", CSV_DATA)
+
+        file_data = stats.STATS["test_table"]["files"]["/root/file.csv"]
+        self.assertEqual(rows, 3)
+        self.assertEqual(file_data["row_count"], 3)
+        self.assertEqual(file_data["wire_bytes"], len(CSV_DATA))
+        self.assertEqual(file_data["decompressed_bytes"], len(CSV_DATA))
+        self.assertIsNotNone(file_data["time_to_first_byte"])
+        for key in stats.STAGE_TIMINGS:
+            self.assertGreaterEqual(file_data[key], 0)
+        self.assertEqual(len(mocked_stdout.getvalue().splitlines()), 3)
+
+    def test_gzip_file_stats(self, mocked_logger, mocked_stdout):
+        csv_data = b"id,name\n" + b"1,a\n" * 300
+        data = gzip.compress(csv_data)
+        rows = self.sync_file("/root/file.csv.gz", data)
+
+        file_data = stats.STATS["test_table"]["files"]["/root/file.csv.gz"]
+        self.assertEqual(rows, 300)
+        self.assertEqual(file_data["wire_bytes"], len(data))
+        self.assertEqual(file_data["decompressed_bytes"], len(csv_data))
+
+    def test_file_metrics_logged(self, mocked_logger, mocked_stdout):
+        self.sync_file("/root/file.csv", CSV_DATA)
+
+        logged_metrics = [json.loads(call[0][1]) for call in mocked_logger.call_args_list if call[0][0] == 'METRIC: %s']
+        file_metrics = [m for m in logged_metrics if m["metric"] in stats.FILE_METRICS]
+        # memory peaks are only logged when memory is tracked
+        self.assertEqual(len(file_metrics), len(stats.FILE_METRICS) - len(stats.MEMORY_PEAKS))
+        self.assertTrue(all(m["tags"]["file"] == "/root/file.csv" for m in file_metrics))
+
+    def test_table_totals(self, mocked_logger, mocked_stdout):
+        self.sync_file("/root/file1.csv", CSV_DATA)
+        self.sync_file("/root/file2.csv", CSV_DATA)
+
+        totals = stats.get_table_totals(stats.STATS["test_table"])
+        self.assertEqual(totals["file_count"], 2)
+        self.assertEqual(totals["row_count"], 6)
+        self.assertEqual(totals["wire_bytes"], 2 * len(CSV_DATA))
+
+@mock.patch("tap_sftp.stats.log_file_metrics")
+class TestAggregateStats(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+        stats.configure({"stats_mode": "aggregate", "stats_top_files": "2"})
+
+    def tearDown(self):
+        stats.configure({})
+
+    def add_file(self, filepath, wire_bytes, download_time):
+        file_metrics = stats.new_file_metrics()
+        file_metrics.update(wire_bytes=wire_bytes, download_time=download_time)
+        stats.add_file_data(TABLE_SPEC, filepath, "2020-01-01", 10, file_metrics)
+
+    def test_top_files_kept(self, mocked_log_file_metrics):
+        for i in range(20):
+            # file_19 is the largest, file_0 the slowest
+            self.add_file("/root/file_{}.csv".format(i), wire_bytes=i, download_time=20 - i)
+
+        table_data = stats.STATS["test_table"]
+        self.assertEqual(sorted(table_data["files"]),
+                         ["/root/file_0.csv", "/root/file_1.csv", "/root/file_18.csv", "/root/file_19.csv"])
+        totals = stats.get_table_totals(table_data)
+        self.assertEqual(totals["file_count"], 20)
+        self.assertEqual(totals["row_count"], 200)
+        self.assertEqual(totals["wire_bytes"], sum(range(20)))
+        self.assertEqual(totals["download_time"], sum(range(1, 21)))
+
+    def test_last_file_reported(self, mocked_log_file_metrics):
+        self.add_file("/root/file_0.csv", wire_bytes=10, download_time=10)
+        self.add_file("/root/file_1.csv", wire_bytes=10, download_time=10)
+        self.add_file("/root/file_2.csv", wire_bytes=1, download_time=1)
+
+        self.assertNotIn("/root/file_2.csv", stats.STATS["test_table"]["files"])
+        self.assertEqual(stats.get_file_data("test_table", "/root/file_2.csv")["wire_bytes"], 1)
+
+    def test_unknown_mode(self, mocked_log_file_metrics):
+        with self.assertRaises(Exception) as e:
+            stats.configure({"stats_mode": "sampled"})
+
+        self.assertEqual(str(e.exception), "Unknown stats mode - sampled. Enter one of ['full', 'aggregate']")
@@ -0,0 +1,98 @@
+import stat
+import unittest
+from datetime import datetime
+from unittest import mock
+import paramiko
+import pytz
+from tap_sftp import client
+
+def get_attr(filename, size=10, mtime=1577836800, directory=False):
+    attr = paramiko.SFTPAttributes()
+    attr.filename = filename
+    attr.st_size = size
+    attr.st_mtime = mtime
+    attr.st_mode = (stat.S_IFDIR if directory else stat.S_IFREG) | 0o644
+    return attr
+
+DIRECTORIES = {
+    "/root": [get_attr("file1.csv"),
+              get_attr("nested", directory=True),
+              get_attr("file2.txt"),
+              get_attr("empty.csv", size=0),
+              get_attr("old.csv", mtime=1546300800)],
+    "/root/nested": [get_attr("file3.csv", mtime=1577923200)],
+}
+
+def listdir_iter(path):
+    if path not in DIRECTORIES:
+        raise FileNotFoundError(path)
+    yield from DIRECTORIES[path]
+
+@mock.patch("tap_sftp.client.SFTPConnection.sftp")
+class TestWalkFiles(unittest.TestCase):
+
+    def test_walk_files(self, mocked_sftp):
+        mocked_sftp.listdir_iter.side_effect = listdir_iter
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = sorted(conn.walk_files("/root"), key=lambda f: f["filepath"])
+
+        self.assertEqual([f["filepath"] for f in files],
+                         ["/root/file1.csv", "/root/file2.txt", "/root/nested/file3.csv", "/root/old.csv"])
+        self.assertEqual(files[0], {"filepath": "/root/file1.csv",
+                                    "last_modified": datetime(2020, 1, 1, tzinfo=pytz.UTC),
+                                    "size": 10})
+
+    def test_filters_applied_while_walking(self, mocked_sftp):
+        mocked_sftp.listdir_iter.side_effect = listdir_iter
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = conn.walk_files("/root", datetime(2019, 6, 1, tzinfo=pytz.UTC), r"\.csv$")
+
+        self.assertEqual(sorted(f["filepath"] for f in files), ["/root/file1.csv", "/root/nested/file3.csv"])
+
+    def test_sub_directory_listed_after_its_parent(self, mocked_sftp):
+        listed = []
+        def listdir_iter_logged(path):
+            listed.append(("start", path))
+            yield from listdir_iter(path)
+            listed.append(("end", path))
+        mocked_sftp.listdir_iter.side_effect = listdir_iter_logged
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        list(conn.walk_files("/root"))
+
+        # the read ahead pages of a directory are not interleaved with the requests of another one
+        self.assertEqual(listed, [("start", "/root"), ("end", "/root"),
+                                  ("start", "/root/nested"), ("end", "/root/nested")])
+
+    @mock.patch("tap_sftp.client.LOGGER.warning")
+    @mock.patch("tap_sftp.client.LOGGER.info")
+    def test_no_new_files(self, mocked_info, mocked_warning, mocked_sftp):
+        mocked_sftp.listdir_iter.side_effect = listdir_iter
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+        modified_since = datetime(2020, 6, 1, tzinfo=pytz.UTC)
+
+        self.assertEqual(conn.get_files("/root", r"\.csv$", modified_since), [])
+
+        # the walk left out the old files, which is not worth a warning
+        mocked_warning.assert_not_called()
+        mocked_info.assert_any_call('Found no files%s on specified %s server at "%s"',
+                                    " modified since 2020-06-01 00:00:00+00:00", "SFTP", "/root")
+
+    def test_get_files_sorted(self, mocked_sftp):
+        mocked_sftp.listdir_iter.side_effect = listdir_iter
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        files = conn.get_files("/root", r"\.csv$", datetime(2019, 6, 1, tzinfo=pytz.UTC))
+
+        self.assertEqual([f["filepath"] for f in files], ["/root/file1.csv", "/root/nested/file3.csv"])
+
+    def test_missing_directory(self, mocked_sftp):
+        mocked_sftp.listdir_iter.side_effect = listdir_iter
+        conn = client.SFTPConnection("10.0.0.1", "username", port="22")
+
+        with self.assertRaises(Exception) as context:
+            list(conn.walk_files("/missing"))
+
+        self.assertEqual(str(context.exception), "Directory '/missing' does not exist")
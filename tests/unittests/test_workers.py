@@ -0,0 +1,68 @@
+import io
+import json
+import unittest
+from unittest import mock
+from tap_sftp import stats, sync, workers
+from .helpers import TABLE_SPEC, get_stream
+
+CSV_DATA = ("id,name,amount\n" + "".join("{},name {},{}.5\n".format(i, i, i % 7) for i in range(50))).encode("utf-8")
+
+@mock.patch("sys.stdout", new_callable=io.StringIO)
+@mock.patch("tap_sftp.stats.LOGGER.info")
+class TestTransformPool(unittest.TestCase):
+
+    def setUp(self):
+        stats.STATS.clear()
+
+    def sync_file(self, stream, data, pool=None):
+        conn = mock.Mock()
+        conn.get_file_handle.return_value = io.BytesIO(data)
+        f = {"filepath": "/root/file.csv", "last_modified": "2020-01-01"}
+        return sync.sync_file(conn, f, stream, TABLE_SPEC, "utf-8", {"record_batch_size": 3}, pool=pool)
+
+    def test_same_output_as_serial(self, mocked_logger, mocked_stdout):
+        stream = get_stream(deselected=["name"])
+        self.sync_file(stream, CSV_DATA)
+        serial_output = mocked_stdout.getvalue()
+        mocked_stdout.seek(0)
+        mocked_stdout.truncate()
+
+        pool = workers.get_transform_pool({"transform_workers": 2}, stream)
+        try:
+            rows = self.sync_file(stream, CSV_DATA, pool)
+        finally:
+            pool.close()
+
+        self.assertEqual(rows, 50)
+        self.assertEqual(mocked_stdout.getvalue(), serial_output)
+        written = [json.loads(line)["record"] for line in mocked_stdout.getvalue().splitlines()]
+        self.assertEqual([r["_sdc_source_lineno"] for r in written], list(range(2, 52)))
+        self.assertGreater(stats.STATS["test_table"]["files"]["/root/file.csv"]["transform_time"], 0)
+
+    def test_cache_summary(self, mocked_logger, mocked_stdout):
+        pool = workers.get_transform_pool({"transform_workers": 2}, get_stream(deselected=["name"]))
+        try:
+            self.sync_file(get_stream(deselected=["name"]), CSV_DATA, pool)
+        finally:
+            pool.close()
+
+        pool.log_cache_summary()
+
+        # the lookups of all the workers, each of them has its own caches
+        mocked_logger.assert_any_call("Parse cache of %s: %s lookups, %.1f%% hits%s",
+                                      "test_table.amount (number)", 50, mock.ANY, "")
+
+    def test_transform_error(self, mocked_logger, mocked_stdout):
+        stream = get_stream()
+        stream.schema.properties["amount"].type = ["integer"]
+        pool = workers.get_transform_pool({"transform_workers": 1}, stream)
+        try:
+            with self.assertRaises(Exception) as e:
+                self.sync_file(stream, CSV_DATA, pool)
+        finally:
+            pool.close()
+
+        self.assertIn("Errors during transform", str(e.exception))
+
+    def test_disabled(self, mocked_logger, mocked_stdout):
+        self.assertIsNone(workers.get_transform_pool({}, get_stream()))